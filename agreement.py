@@ -0,0 +1,84 @@
+import re
+import math
+import unicodedata
+from collections import Counter
+from retrieval import tokenize
+
+# 可选：NumPy 用于向量化计算相似度矩阵，缺失时退回纯 Python 的稀疏向量实现
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Markdown 标记、分隔线与引用编号：不影响回答的含义，比较前去掉
+_MARKUP_RE = re.compile(r'[`*_#>|~=]+|-{2,}|\[\d+\]|〔[^〕]*〕')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_answer(text):
+    """比较前的规范化：全角转半角、统一小写、去掉 Markdown 标记与多余空白"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _MARKUP_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def cosine_matrix(texts):
+    """
+    各文本两两之间的 TF-IDF 余弦相似度（n×n 嵌套列表）
+    词频取 1 + log(tf)；idf 为平滑形式 log((1 + n) / (1 + df)) + 1，所有回答都出现的词仍保留权重
+    """
+    counts = [Counter(tokenize(normalize_answer(t))) for t in texts]
+    n = len(counts)
+    df = Counter(t for c in counts for t in c)
+    idf = {t: math.log((1 + n) / (1 + d)) + 1 for t, d in df.items()}
+    if HAS_NUMPY:
+        vocab = {t: i for i, t in enumerate(idf)}
+        m = np.zeros((n, len(vocab)), dtype=np.float32)
+        for row, c in enumerate(counts):
+            if c:
+                cols = np.fromiter((vocab[t] for t in c), dtype=np.int64, count=len(c))
+                tfs = np.fromiter(c.values(), dtype=np.float32, count=len(c))
+                m[row, cols] = 1 + np.log(tfs)
+        m *= np.fromiter(idf.values(), dtype=np.float32, count=len(idf))
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        m /= np.where(norms > 0, norms, 1)
+        return np.clip(m @ m.T, 0.0, 1.0).tolist()
+
+    vectors = []
+    for c in counts:
+        vec = {t: (1 + math.log(tf)) * idf[t] for t, tf in c.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        vectors.append({t: v / norm for t, v in vec.items()})
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        matrix[i][i] = 1.0 if vectors[i] else 0.0
+        for j in range(i + 1, n):
+            small, large = sorted((vectors[i], vectors[j]), key=len)
+            sim = min(1.0, sum((v * large.get(t, 0.0) for t, v in small.items()), 0.0))
+            matrix[i][j] = matrix[j][i] = sim
+    return matrix
+
+
+def measure_agreement(answers):
+    """
+    answers: {模型名: 回答}（调用方应先去掉失败的记录）；少于两个回答时返回 None
+    返回 {"score": 最不一致的两份回答之间的相似度, "mean": 两两相似度均值,
+          "representative": 与其余回答平均最相似的模型（共识回答的代表）, "pairs": {"A | B": 相似度}}
+    """
+    names = sorted(answers)
+    if len(names) < 2:
+        return None
+    matrix = cosine_matrix([answers[name] for name in names])
+    pairs = {}
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            pairs[f"{names[i]} | {names[j]}"] = round(matrix[i][j], 4)
+    values = list(pairs.values())
+    centrality = [sum(row) - row[i] for i, row in enumerate(matrix)]
+    return {
+        "score": min(values),
+        "mean": round(sum(values) / len(values), 4),
+        "representative": names[max(range(len(names)), key=lambda i: centrality[i])],
+        "pairs": pairs
+    }
@@ -0,0 +1,330 @@
+import re
+import time
+import asyncio
+import threading
+from llm_client import LLMClient
+from search_tool import SearchTool
+from executor import TaskExecutor
+from cancel_token import CancelToken
+from judge_prompt import JudgePrompt
+from judge_compress import JudgeCompressor
+from agreement import measure_agreement
+from tracing import Tracer, traced
+
+# 分组评审结果第一行：“胜出：模型名”
+_WINNER_RE = re.compile(r'胜出\s*[:：]\s*\[?([^\]\n]+?)\]?\s*$', re.MULTILINE)
+
+class ArenaEngine:
+    """
+    不依赖 PyQt6 的对战核心：搜索 → 各选手并发回答 → 裁判
+    图形界面的各 Worker、批处理与服务共用这里的调用逻辑
+
+    用法:
+        engine = ArenaEngine(key_scheduler=ks, stream=True)
+        async for event in engine.run("问题", ["模型A", "模型B"], judge="裁判模型", search=True):
+            ...
+    或在普通线程中调用 run_sync(..., on_event=回调)，返回整轮结果
+
+    事件为字典，"type" 取值:
+        search_done  {"context"}                         搜索完成
+        model_delta  {"model", "text"}                   选手流式增量（仅 stream=True）
+        model_done   {"model", "content" | "error", "response"}
+        judge_delta  {"text"}                            裁判流式增量（仅 stream=True）
+        judge_done   {"model", "content" | "error", "response"}
+        run_done     {"result"}                          整轮结束（被取消时 result["cancelled"] 为 True）
+    """
+    SEARCH_DONE = "search_done"
+    MODEL_DELTA = "model_delta"
+    MODEL_DONE = "model_done"
+    JUDGE_DELTA = "judge_delta"
+    JUDGE_DONE = "judge_done"
+    RUN_DONE = "run_done"
+
+    # 淘汰赛裁判：选手较多时先分组并发评审，各组的融合答案逐轮合并，最后一轮给出总结论
+    # fan_out 为每组回答数；max_depth 为串行裁判调用的最多轮数（含最后的总评）
+    TOURNAMENT = {"enabled": False, "fan_out": 4, "max_depth": 3, "min_contestants": 6, "group_max_tokens": 2048}
+
+    # 回答趋同时的裁判捷径：各回答两两 TF-IDF 余弦相似度的最小值达到 threshold 时，
+    # mode 为 skip 直接采用共识回答，为 brief 改用简短的确认提示词（输出上限 brief_max_tokens）
+    SHORTCUT = {"enabled": False, "threshold": 0.9, "mode": "brief", "brief_max_tokens": 512}
+    # 界面把调用失败的选手记为以此开头的文本；计算一致度时排除
+    ERROR_PREFIX = "[Error]"
+
+    @staticmethod
+    def configure_tournament(**opts):
+        ArenaEngine.TOURNAMENT = dict(ArenaEngine.TOURNAMENT, **opts)
+
+    @staticmethod
+    def configure_shortcut(**opts):
+        ArenaEngine.SHORTCUT = dict(ArenaEngine.SHORTCUT, **opts)
+
+    def __init__(self, api_key="", key_scheduler=None, vision_models=None, stream=False, use_cache=True,
+                 search_results=5, cookie="", judge_prompt=None, judge_params=None, labels=None):
+        self.api_key = api_key
+        self.key_scheduler = key_scheduler
+        self.vision_models = list(vision_models or [])
+        self.stream = stream
+        self.use_cache = use_cache
+        self.search_results = search_results
+        self.cookie = cookie
+        self.judge_prompt = judge_prompt or JudgePrompt.DEFAULT_SYSTEM_PROMPT
+        self.judge_params = dict(JudgePrompt.DEFAULT_PARAMS, **(judge_params or {}))
+        self.labels = dict(labels or {})
+        self._search_lock = threading.Condition()
+        self._search_cache = {}  # 搜索词 -> 结果；进行中的搜索为 None
+
+    # --- 单步调用（各 Worker 直接使用） ---
+    def search(self, query, cancel_token=None):
+        """同一引擎实例上相同的搜索词只搜索一次；并发的同一查询等待第一次的结果"""
+        with self._search_lock:
+            while query in self._search_cache and self._search_cache[query] is None:
+                self._search_lock.wait()
+            if query in self._search_cache:
+                return self._search_cache[query]
+            self._search_cache[query] = None
+        result = ""
+        try:
+            result = SearchTool.search(query, self.search_results, self.cookie, cancel_token=cancel_token)
+        finally:
+            with self._search_lock:
+                if cancel_token is not None and cancel_token.cancelled:
+                    self._search_cache.pop(query, None)  # 被取消的结果不缓存
+                else:
+                    self._search_cache[query] = result
+                self._search_lock.notify_all()
+        return result
+
+    def contestant(self, model_conf, prompt, attachments=None, search_context="", on_delta=None,
+                   cancel_token=None, labels=None):
+        """调用一个选手；model_conf 为模型名或 {"name": 模型名, 其余为调用参数}"""
+        params = dict(model_conf) if isinstance(model_conf, dict) else {"name": model_conf}
+        name = params.pop("name")
+        effective_name = params.pop("custom_model_name", None) or name
+        return LLMClient.chat_completion(
+            self.api_key, effective_name, [{"role": "user", "content": prompt}],
+            file_paths=attachments or [], vision_models=self.vision_models,
+            stream=self.stream, on_delta=on_delta, use_cache=self.use_cache,
+            key_scheduler=self.key_scheduler, search_context=search_context, cancel_token=cancel_token,
+            labels={**self.labels, **(labels or {}), "role": "contestant"}, **params)
+
+    def judge(self, judge_model, prompt, answers, judge_prompt=None, judge_params=None, on_delta=None,
+              cancel_token=None, labels=None):
+        """
+        用裁判模型评审 answers ({模型名: 回答})
+        各回答高度一致时按 SHORTCUT 跳过裁判或只做简短确认；结果的 "agreement" 中给出一致度
+        开启淘汰赛且回答数较多时，先分组评审若干轮，最后一轮只评审各组的融合答案
+        """
+        params = dict(self.judge_params, **(judge_params or {}))
+        effective_name = params.pop("custom_model_name", None) or judge_model
+        token = cancel_token or CancelToken()
+        report, rounds = [], []
+        agreement = measure_agreement(self.real_answers(answers))
+        action = self.shortcut_action(agreement)
+        if agreement:
+            report.append(self.describe_agreement(agreement, action))
+        if action == "skip":
+            rep = agreement["representative"]
+            response = {"content": JudgePrompt.consensus_text(rep, answers[rep], agreement["score"])}
+            if on_delta:
+                on_delta(response["content"])
+        elif action == "brief":
+            brief_params = dict(params, max_tokens=min(int(params.get("max_tokens") or 4096),
+                                                       int(self.SHORTCUT.get("brief_max_tokens", 512))))
+            response = self._judge_call(effective_name, prompt, answers, JudgePrompt.BRIEF_SYSTEM_PROMPT,
+                                        brief_params, self.stream, on_delta, token, labels, report)
+        else:
+            opts = self.TOURNAMENT
+            if opts.get("enabled") and len(answers) >= opts.get("min_contestants", 0):
+                answers = self.tournament_rounds(effective_name, prompt, answers, params, token, labels, rounds,
+                                                 report)
+                if token.cancelled:
+                    return dict(LLMClient.CANCELLED_RESULT)
+            response = self._judge_call(effective_name, prompt, answers, judge_prompt or self.judge_prompt, params,
+                                        self.stream, on_delta, token, labels, report)
+        if agreement:
+            response["agreement"] = {"score": round(agreement["score"], 4), "mean": agreement["mean"],
+                                     "representative": agreement["representative"], "action": action}
+        if report:
+            response["judge_input_report"] = report
+        if rounds:
+            response["tournament"] = rounds
+        return response
+
+    @classmethod
+    def real_answers(cls, answers):
+        """去掉空回答与调用失败的记录：相同的报错文本不能算作“回答一致”"""
+        return {m: a for m, a in answers.items()
+                if isinstance(a, str) and a.strip() and not a.lstrip().startswith(cls.ERROR_PREFIX)}
+
+    @classmethod
+    def shortcut_action(cls, agreement):
+        """按一致度决定裁判方式：judge（完整评审）/ brief（简短确认）/ skip（不调用裁判）"""
+        opts = cls.SHORTCUT
+        if not agreement or not opts.get("enabled") or agreement["score"] < float(opts.get("threshold", 0.9)):
+            return "judge"
+        return "skip" if opts.get("mode") == "skip" else "brief"
+
+    @classmethod
+    def describe_agreement(cls, agreement, action):
+        text = f"回答一致度 {agreement['score']:.2f}（两两相似度最低值，均值 {agreement['mean']:.2f}）"
+        if action == "skip":
+            return f"{text}：达到阈值 {cls.SHORTCUT.get('threshold')}，已跳过裁判，采用 {agreement['representative']} 的回答"
+        if action == "brief":
+            return f"{text}：达到阈值 {cls.SHORTCUT.get('threshold')}，裁判改为简短确认"
+        return text
+
+    def _judge_call(self, judge_model, prompt, answers, system_prompt, params, stream, on_delta, token, labels,
+                    report):
+        messages = JudgePrompt.build_messages(system_prompt, prompt, answers, judge_model=judge_model,
+                                              max_tokens=params.get("max_tokens"), report=report)
+        return LLMClient.chat_completion(
+            self.api_key, judge_model, messages, file_paths=None,
+            stream=stream, on_delta=on_delta, use_cache=self.use_cache,
+            key_scheduler=self.key_scheduler, cancel_token=token,
+            labels={**self.labels, **(labels or {}), "role": "judge"}, **params)
+
+    def tournament_rounds(self, judge_model, prompt, answers, params, token, labels=None, rounds=None, report=None):
+        """
+        淘汰赛的分组轮次：每轮把回答均分为不超过 fan_out 个一组，各组并发评审，
+        每组产出一个融合答案进入下一轮；剩余回答不超过 fan_out 或达到 max_depth - 1 轮时停止
+        返回交给最后一轮总评的 {名称: 回答}；rounds / report 为列表时追加每组记录与说明
+        """
+        opts = self.TOURNAMENT
+        fan_out = max(2, int(opts.get("fan_out", 4)))
+        max_depth = max(1, int(opts.get("max_depth", 3)))
+        group_params = dict(params, max_tokens=min(int(params.get("max_tokens") or 4096),
+                                                  int(opts.get("group_max_tokens", 2048))))
+        pool = TaskExecutor.shared()
+        level = 1
+        while len(answers) > fan_out and level < max_depth and not token.cancelled:
+            names = sorted(answers)
+            count = -(-len(names) // fan_out)
+            size = -(-len(names) // count)  # 尽量均分，避免最后一组只剩一两个
+            groups = [names[i:i + size] for i in range(0, len(names), size)]
+            handles = [pool.submit(self._judge_group, judge_model, prompt, {n: answers[n] for n in group},
+                                   group_params, token, dict(labels or {}, judge_round=level),
+                                   priority=TaskExecutor.PRIORITY_JUDGE) if len(group) > 1 else None
+                       for group in groups]
+            advanced = {}
+            with Tracer.span("judge.round", round=level, groups=len(groups)):
+                for i, (group, handle) in enumerate(zip(groups, handles), 1):
+                    if handle is None:
+                        advanced[group[0]] = answers[group[0]]  # 单独一个：直接晋级
+                        continue
+                    response = pool.run_inline(handle) or {"error": f"任务异常: {handle.exception}"}
+                    record = {"round": level, "group": i, "members": group}
+                    if "error" in response:
+                        # 本组评审失败：成员原样晋级，由下一轮继续比较
+                        record["error"] = response["error"]
+                        advanced.update((n, answers[n]) for n in group)
+                    else:
+                        match = _WINNER_RE.search(response.get("content", ""))
+                        record["winner"] = match.group(1).strip() if match else None
+                        members = "、".join(JudgeCompressor.short_name(n) for n in group)
+                        advanced[f"第{level}轮第{i}组"] = f"[本组成员: {members}]\n{response.get('content', '')}"
+                    if rounds is not None:
+                        rounds.append(record)
+            if token.cancelled:
+                break
+            if report is not None:
+                report.append(f"淘汰赛: 第 {level} 轮 {len(names)} 个回答分 {len(groups)} 组并发评审，"
+                              f"{len(advanced)} 个进入下一轮")
+            if len(advanced) >= len(answers):
+                break  # 全部分组失败，继续分组不会缩小规模
+            answers = advanced
+            level += 1
+        return answers
+
+    def _judge_group(self, judge_model, prompt, answers, params, token, labels):
+        return self._judge_call(judge_model, prompt, answers, JudgePrompt.GROUP_SYSTEM_PROMPT, params,
+                                False, None, token, labels, None)
+
+    # --- 整轮 ---
+    @traced("arena.run")
+    def run_sync(self, prompt, models, judge=None, attachments=None, search=False, on_event=None,
+                 cancel_token=None, judge_prompt=None, judge_params=None, labels=None):
+        """
+        在当前线程中执行一整轮并阻塞到结束；选手调用提交到共享线程池并发执行
+        （因此不要在共享线程池的任务中调用本方法，否则池满时会互相等待）
+        on_event 在池线程中被调用，需自行保证线程安全
+        """
+        emit = on_event or (lambda event: None)
+        token = cancel_token or CancelToken()
+        started = time.monotonic()
+        Tracer.annotate(contestants=len(models), judge=judge or "")
+        result = {"prompt": prompt, "search_context": "", "results": {}, "judge": None}
+
+        if search:
+            with Tracer.span("phase.search"):
+                result["search_context"] = self.search(prompt, token)
+            if not token.cancelled:
+                emit({"type": self.SEARCH_DONE, "context": result["search_context"]})
+
+        handles = {}
+        for model_conf in models:
+            name = model_conf["name"] if isinstance(model_conf, dict) else model_conf
+            handles[name] = TaskExecutor.shared().submit(
+                self._run_contestant, name, model_conf, prompt, attachments, result["search_context"],
+                emit, token, labels)
+        for name, handle in handles.items():
+            handle.wait()
+            result["results"][name] = handle.result or {"error": f"任务异常: {handle.exception}"}
+
+        answers = {m: JudgePrompt.judge_answer(r["content"], r.get("reasoning"))
+                   for m, r in result["results"].items() if "error" not in r}
+        if judge and answers and not token.cancelled:
+            on_delta = (lambda text: emit({"type": self.JUDGE_DELTA, "text": text})) if self.stream else None
+            with Tracer.span("phase.judge", model=judge, contestants=len(answers)):
+                response = self.judge(judge, prompt, answers, judge_prompt, judge_params, on_delta, token, labels)
+            result["judge"] = dict(response, model=judge)
+            if not token.cancelled:
+                emit(self._done_event(self.JUDGE_DONE, judge, response))
+
+        result["cancelled"] = token.cancelled
+        result["elapsed"] = time.monotonic() - started
+        emit({"type": self.RUN_DONE, "result": result})
+        return result
+
+    def _run_contestant(self, name, model_conf, prompt, attachments, search_context, emit, token, labels):
+        on_delta = (lambda text: emit({"type": self.MODEL_DELTA, "model": name, "text": text})) if self.stream else None
+        with Tracer.span("phase.contestant", model=name):
+            response = self.contestant(model_conf, prompt, attachments, search_context, on_delta, token, labels)
+        if not token.cancelled:
+            emit(self._done_event(self.MODEL_DONE, name, response))
+        return response
+
+    @staticmethod
+    def _done_event(kind, model, response):
+        event = {"type": kind, "model": model, "response": response}
+        if "error" in response:
+            event["error"] = response["error"]
+        else:
+            event["content"] = response.get("content", "")
+        return event
+
+    async def run(self, prompt, models, judge=None, attachments=None, search=False, cancel_token=None, **kwargs):
+        """
+        异步接口：逐个产出事件，最后一个为 run_done
+        调用方提前结束迭代（break / 任务被取消）时自动取消在途请求
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        token = cancel_token or CancelToken()
+        emit = lambda event: loop.call_soon_threadsafe(queue.put_nowait, event)
+        future = loop.run_in_executor(None, lambda: self.run_sync(
+            prompt, models, judge, attachments, search, on_event=emit, cancel_token=token, **kwargs))
+        try:
+            while True:
+                get = asyncio.ensure_future(queue.get())
+                await asyncio.wait([get, future], return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    future.result()  # run_sync 异常退出：在此抛出
+                    continue
+                event = get.result()
+                yield event
+                if event["type"] == self.RUN_DONE:
+                    break
+        finally:
+            if not future.done():
+                token.cancel()
@@ -0,0 +1,596 @@
+"""
+本地 REST 服务：把“多个模型回答 + 裁判”作为任务提供给其他工具调用，不需要图形界面（不依赖 PyQt6）
+
+    python arena_server.py --port 8788 --models deepseek-ai/DeepSeek-V3,Qwen/Qwen2.5-72B-Instruct \
+        --judge deepseek-ai/DeepSeek-V3 --concurrency 4 --max-queue 32
+
+接口:
+    POST   /v1/arena/jobs              提交任务 {"prompt", "models"?, "judge"?, "attachments"?, "search"?,
+                                       "judge_prompt"?, "judge_params"?, "params"?, "stream"?, "use_cache"?}
+                                       返回 202 与任务 id；队列已满时返回 429 与 Retry-After
+                                       attachments 只接受 --upload-dir 目录内的文件（相对该目录的路径）
+                                       models / params / judge_params 只接受采样参数，其他字段返回 400
+所有 POST 请求体须为 Content-Type: application/json，否则返回 415
+    GET    /v1/arena/jobs/<id>         任务状态与结果（?wait=秒 可等待完成）
+    GET    /v1/arena/jobs/<id>/events  SSE 进度：先补发已有事件，再实时推送，run_done 后结束
+    DELETE /v1/arena/jobs/<id>         取消任务
+    POST   /v1/chat/completions        OpenAI 兼容：model 为 "arena"（使用默认选手）或逗号分隔的选手列表，
+                                       返回裁判结论；请求体中的 "arena" 对象可指定 models / judge / search
+    GET    /metrics                    队列深度、排队与运行耗时分位数、各模型调用统计
+    GET    /healthz
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import argparse
+import threading
+import urllib.parse
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from arena_engine import ArenaEngine
+from llm_client import LLMClient
+from executor import TaskExecutor
+from cancel_token import CancelToken
+from config_manager import ConfigManager
+from telemetry import Telemetry
+from runtime import Runtime
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class ArenaJob:
+    """一个排队 / 运行中的对战任务；事件按顺序保存，供 SSE 补发与实时推送"""
+    def __init__(self, spec):
+        self.id = uuid.uuid4().hex[:16]
+        self.spec = spec
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self.cancel_token = CancelToken()
+        self._cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ("done", "error", "cancelled")
+
+    def emit(self, event):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def finish(self, status, result=None, error=None):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            self._cond.notify_all()
+
+    def wait_events(self, index, timeout):
+        """返回 index 之后的事件；没有新事件时最多等待 timeout 秒"""
+        with self._cond:
+            if len(self.events) <= index and not self.done:
+                self._cond.wait(timeout)
+            return self.events[index:], self.done
+
+    def wait_done(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return self.done
+
+    def to_dict(self, include_result=True):
+        data = {"id": self.id, "status": self.status, "created": self.created,
+                "started": self.started, "finished": self.finished, "prompt": self.spec["prompt"],
+                "models": [m["name"] if isinstance(m, dict) else m for m in self.spec["models"]],
+                "judge": self.spec.get("judge"), "events": len(self.events)}
+        if self.error:
+            data["error"] = self.error
+        if include_result and self.result is not None:
+            data["result"] = self.result
+        return data
+
+
+class JobQueue:
+    """
+    有界任务队列：最多 concurrency 个任务同时运行，排队数达到 max_queue 时拒绝新任务（背压）
+    已结束的任务保留最近 keep 个供查询
+    """
+    def __init__(self, cfg_mgr, key_scheduler, concurrency=4, max_queue=32, keep=200):
+        self.cfg_mgr = cfg_mgr
+        self.key_scheduler = key_scheduler
+        self.concurrency = max(1, int(concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.keep = keep
+        # 任务本身在独立的池中运行；其中的模型调用提交到共享线程池，两者不会互相占满
+        self.pool = TaskExecutor(self.concurrency, name="arena-jobs")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._counts = {"submitted": 0, "rejected": 0, "done": 0, "error": 0, "cancelled": 0}
+        self._queue_wait = deque(maxlen=500)
+        self._run_time = deque(maxlen=500)
+
+    def submit(self, spec):
+        """提交任务；队列已满时返回 None"""
+        job = ArenaJob(spec)
+        with self._lock:
+            # 空闲的运行槽位会立刻取走排队任务，因此按“排队 + 运行”总数判断
+            if self._queued + self._running >= self.concurrency + self.max_queue:
+                self._counts["rejected"] += 1
+                return None
+            self._queued += 1
+            self._counts["submitted"] += 1
+            self._jobs[job.id] = job
+            self._evict()
+        self.pool.submit(self._run, job)
+        return job
+
+    def _evict(self):
+        finished = [jid for jid, j in self._jobs.items() if j.done]
+        for jid in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[jid]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel_token.cancel()
+        return job
+
+    def retry_after(self):
+        """按近期平均运行时间估算排到的等待秒数"""
+        with self._lock:
+            avg = sum(self._run_time) / len(self._run_time) if self._run_time else 10.0
+            return max(1, math.ceil(avg * (self._queued + 1) / self.concurrency))
+
+    def _run(self, job):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._queue_wait.append(time.time() - job.created)
+        job.started = time.time()
+        if job.cancel_token.cancelled:
+            status, result, error = "cancelled", None, None
+        else:
+            job.status = "running"
+            status, result, error = self._execute(job)
+        job.finish(status, result, error)
+        with self._lock:
+            self._running -= 1
+            self._counts[status] += 1
+            if status == "done":
+                self._run_time.append(job.finished - job.started)
+
+    def _execute(self, job):
+        spec = job.spec
+        engine = ArenaEngine(key_scheduler=self.key_scheduler, vision_models=self.cfg_mgr.get_vision_models(),
+                             stream=spec.get("stream", True), use_cache=spec.get("use_cache", True),
+                             search_results=spec.get("search_results", 5), cookie=self.cfg_mgr.get_bing_cookie(),
+                             judge_prompt=spec.get("judge_prompt"))
+        try:
+            result = engine.run_sync(
+                spec["prompt"], spec["models"], judge=spec.get("judge"), attachments=spec.get("attachments"),
+                search=spec.get("search", False), on_event=job.emit, cancel_token=job.cancel_token,
+                judge_params=spec.get("judge_params"), labels={"job": job.id})
+        except Exception as e:
+            job.emit({"type": "error", "error": str(e)})
+            return "error", None, str(e)
+        if result["cancelled"]:
+            return "cancelled", result, None
+        return "done", result, None
+
+    def metrics(self):
+        with self._lock:
+            waits, runs = list(self._queue_wait), list(self._run_time)
+            data = {"queued": self._queued, "running": self._running, "concurrency": self.concurrency,
+                    "max_queue": self.max_queue, "jobs": dict(self._counts)}
+        data["queue_wait"] = {f"p{int(q * 100)}": _percentile(waits, q) for q in (0.5, 0.95, 0.99)}
+        data["run_time"] = {f"p{int(q * 100)}": _percentile(runs, q) for q in (0.5, 0.95, 0.99)}
+        data["request_pool"] = TaskExecutor.shared().stats()
+        data["models"] = Telemetry.shared().summary()
+        return data
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel_token.cancel()
+        self.pool.shutdown()
+
+
+class ArenaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    # --- 基础 ---
+    def authorized(self):
+        token = self.server.token
+        if not token or self.headers.get("Authorization", "") == f"Bearer {token}":
+            return True
+        self.send_json(401, {"error": "未授权"})
+        return False
+
+    def read_json(self):
+        # 只接受 JSON：浏览器跨站表单 / text/plain 请求无法携带该类型而不触发预检
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self.close_connection = True
+            self.send_json(415, {"error": "请求体须为 application/json"})
+            return None
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_json(400, {"error": "请求体不是有效的 JSON"})
+            return None
+        if not isinstance(body, dict):
+            self.send_json(400, {"error": "请求体必须是 JSON 对象"})
+            return None
+        return body
+
+    def send_json(self, status, obj, headers=None):
+        body = json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.write(body)
+
+    def start_sse(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_sse(self, data, event=None):
+        text = (f"event: {event}\n" if event else "") + f"data: {data}\n\n"
+        chunk = text.encode("utf-8")
+        return self.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+
+    def end_sse(self):
+        self.write(b"0\r\n\r\n")
+
+    def write(self, data):
+        try:
+            self.wfile.write(data)
+            self.wfile.flush()
+            return True
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            self.close_connection = True
+            return False
+
+    def reject_full(self):
+        retry = self.server.jobs.retry_after()
+        self.send_json(429, {"error": "任务队列已满，请稍后重试", "retry_after": retry}, {"Retry-After": str(retry)})
+
+    # --- 路由 ---
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        parts = [p for p in parsed.path.split("/") if p]
+        if parsed.path == "/healthz":
+            return self.send_json(200, {"ok": True})
+        if not self.authorized():
+            return
+        if parsed.path == "/metrics":
+            return self.send_json(200, self.server.jobs.metrics())
+        if parsed.path == "/v1/models":
+            return self.send_json(200, {"object": "list", "data": [{"id": "arena", "object": "model"}]})
+        if parts[:3] == ["v1", "arena", "jobs"] and len(parts) in (4, 5):
+            job = self.server.jobs.get(parts[3])
+            if job is None:
+                return self.send_json(404, {"error": "任务不存在"})
+            if len(parts) == 5 and parts[4] == "events":
+                return self.stream_events(job)
+            query = urllib.parse.parse_qs(parsed.query)
+            try:
+                wait = float(query.get("wait", ["0"])[0] or 0)
+            except ValueError:
+                return self.send_json(400, {"error": "wait 应为秒数"})
+            if wait > 0:
+                job.wait_done(min(wait, 600))
+            return self.send_json(200, job.to_dict())
+        self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        if not self.authorized():
+            return
+        body = self.read_json()
+        if body is None:
+            return
+        if path == "/v1/arena/jobs":
+            spec, error = self.server.make_spec(body)
+            if error:
+                return self.send_json(400, {"error": error})
+            job = self.server.jobs.submit(spec)
+            if job is None:
+                return self.reject_full()
+            return self.send_json(202, job.to_dict(include_result=False),
+                                  {"Location": f"/v1/arena/jobs/{job.id}"})
+        if path == "/v1/chat/completions":
+            return self.chat_completions(body)
+        self.send_json(404, {"error": "not found"})
+
+    def do_DELETE(self):
+        parts = [p for p in urllib.parse.urlparse(self.path).path.split("/") if p]
+        if not self.authorized():
+            return
+        if parts[:3] == ["v1", "arena", "jobs"] and len(parts) == 4:
+            job = self.server.jobs.cancel(parts[3])
+            if job is None:
+                return self.send_json(404, {"error": "任务不存在"})
+            return self.send_json(200, job.to_dict(include_result=False))
+        self.send_json(404, {"error": "not found"})
+
+    # --- SSE 进度 ---
+    def stream_events(self, job):
+        self.start_sse()
+        index = 0
+        while True:
+            events, done = job.wait_events(index, 15)
+            if not events and not done:
+                if not self.write(b"2\r\n:\n\r\n"):  # 心跳注释行，检测客户端是否已断开
+                    return
+                continue
+            for event in events:
+                if not self.write_sse(json.dumps(event, ensure_ascii=False, default=str), event["type"]):
+                    return
+            index += len(events)
+            if done and index >= len(job.events):
+                break
+        self.write_sse(json.dumps({"id": job.id, "status": job.status}), "end")
+        self.end_sse()
+
+    # --- OpenAI 兼容 ---
+    def chat_completions(self, body):
+        messages, model, arena = body.get("messages") or [], body.get("model") or "arena", body.get("arena") or {}
+        if (not isinstance(messages, list) or not all(isinstance(m, dict) for m in messages)
+                or not isinstance(model, str) or not isinstance(arena, dict)):
+            return self.send_json(400, {"error": {"message": "messages 应为对象列表，model 应为字符串，arena 应为对象",
+                                                  "type": "invalid_request_error"}})
+        prompt = ""
+        for msg in messages:
+            if msg.get("role") == "user":
+                content = msg.get("content")
+                if isinstance(content, list):
+                    content = "\n".join(str(p.get("text", "")) for p in content
+                                         if isinstance(p, dict) and p.get("type") == "text")
+                prompt = content if isinstance(content, str) else ""
+        spec_body = dict(arena, prompt=prompt, stream=bool(body.get("stream")))
+        if model != "arena" and "models" not in spec_body:
+            spec_body["models"] = [m.strip() for m in model.split(",") if m.strip()]
+        spec, error = self.server.make_spec(spec_body)
+        if error:
+            return self.send_json(400, {"error": {"message": error, "type": "invalid_request_error"}})
+        job = self.server.jobs.submit(spec)
+        if job is None:
+            return self.reject_full()
+        created = int(job.created)
+        if not spec["stream"]:
+            while not job.wait_done(5):
+                pass
+            result = job.result or {}
+            return self.send_json(200, {
+                "id": f"arena-{job.id}", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.final_text(result)},
+                             "finish_reason": "stop" if job.status == "done" else job.status}],
+                "usage": self.total_usage(result), "arena": result})
+
+        # 流式：有裁判时转发裁判的增量，否则按模型依次输出完整回答
+        self.start_sse()
+        def chunk(delta, finish=None):
+            return json.dumps({"id": f"arena-{job.id}", "object": "chat.completion.chunk", "created": created,
+                               "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]},
+                              ensure_ascii=False)
+        index, streamed = 0, False
+        while True:
+            events, done = job.wait_events(index, 15)
+            index += len(events)
+            for event in events:
+                text = None
+                if event["type"] == "judge_delta":
+                    text, streamed = event["text"], True
+                elif event["type"] == "model_done" and not spec.get("judge"):
+                    text = f"=== {event['model']} ===\n{event.get('content', '[Error] ' + str(event.get('error')))}\n\n"
+                elif event["type"] == "judge_done" and not streamed:
+                    text = event.get("content") or f"[裁判出错] {event.get('error')}"
+                if text and not self.write_sse(chunk({"content": text})):
+                    job.cancel_token.cancel()  # 客户端已断开：不再继续消耗 Token
+                    return
+            if done and index >= len(job.events):
+                break
+        self.write_sse(chunk({}, "stop" if job.status == "done" else job.status))
+        self.write_sse("[DONE]")
+        self.end_sse()
+
+    @staticmethod
+    def final_text(result):
+        judge = result.get("judge")
+        if judge:
+            return judge.get("content") or f"[裁判出错] {judge.get('error')}"
+        return "\n\n".join(f"=== {m} ===\n{r.get('content', '[Error] ' + str(r.get('error')))}"
+                           for m, r in (result.get("results") or {}).items())
+
+    @staticmethod
+    def total_usage(result):
+        total = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        responses = list((result.get("results") or {}).values()) + [result.get("judge") or {}]
+        for response in responses:
+            for key in total:
+                total[key] += (response.get("usage") or {}).get(key) or 0
+        return total
+
+
+class ArenaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, jobs, default_models=None, default_judge=None, token="", verbose=False,
+                 upload_dir=None):
+        super().__init__(address, ArenaHandler)
+        self.jobs = jobs
+        self.default_models = list(default_models or [])
+        self.default_judge = default_judge
+        self.token = token
+        self.verbose = verbose
+        # 附件会被读取并上传给远端模型：只允许该目录内的文件，未设置时不接受附件
+        self.upload_dir = os.path.realpath(upload_dir) if upload_dir else None
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError, ConnectionAbortedError)):
+            return
+        super().handle_error(request, client_address)
+
+    def resolve_attachments(self, attachments):
+        """附件路径解析到上传目录内；返回 (绝对路径列表, 错误信息)"""
+        if not isinstance(attachments, list) or not all(isinstance(p, str) and p for p in attachments):
+            return None, "attachments 应为文件路径列表"
+        if attachments and not self.upload_dir:
+            return None, "服务未开启附件（启动时用 --upload-dir 指定上传目录）"
+        paths = []
+        for p in attachments:
+            path = os.path.realpath(os.path.join(self.upload_dir, p))
+            if os.path.commonpath([path, self.upload_dir]) != self.upload_dir or not os.path.isfile(path):
+                return None, f"附件不在上传目录内或不存在: {p}"
+            paths.append(path)
+        return paths, None
+
+    @staticmethod
+    def check_params(params, what, allow_model_fields=False):
+        """
+        只接受采样参数（数值）；模型对象还可带 name / custom_model_name（字符串）
+        其余字段一律拒绝，避免经由参数覆盖 stream、messages、file_paths 等请求字段
+        """
+        for key, value in params.items():
+            if allow_model_fields and key in ("name", "custom_model_name"):
+                if not isinstance(value, str) or not value:
+                    return f"{what} 中的 {key} 应为非空字符串"
+            elif key not in LLMClient.SAMPLING_PARAMS:
+                allowed = ", ".join(LLMClient.SAMPLING_PARAMS)
+                return f"{what} 不支持参数 {key}（可用: {allowed}）"
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                return f"{what} 中的 {key} 应为数值"
+        return None
+
+    def make_spec(self, body):
+        """校验并补全任务描述；返回 (spec, 错误信息)"""
+        prompt = body.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            return None, "缺少 prompt"
+        models = body.get("models") or self.default_models
+        if not isinstance(models, list) or not models:
+            return None, "缺少 models（请求中给出或启动服务时用 --models 指定默认值）"
+        if any(not (isinstance(m, str) and m) and not (isinstance(m, dict) and isinstance(m.get("name"), str)
+                                                        and m["name"]) for m in models):
+            return None, "models 中每项应为模型名或包含 name 的对象"
+        params, judge_params = body.get("params") or {}, body.get("judge_params") or {}
+        if not isinstance(params, dict) or not all(isinstance(v, dict) for v in params.values()):
+            return None, "params 应为 {模型名: 参数对象}"
+        if not isinstance(judge_params, dict):
+            return None, "judge_params 应为对象"
+        for m in models:
+            error = self.check_params(m, "models", allow_model_fields=True) if isinstance(m, dict) else None
+            if error:
+                return None, error
+        for name, p in params.items():
+            error = self.check_params(p, f"params[{name}]", allow_model_fields=True)
+            if error or "name" in p:
+                return None, error or f"params[{name}] 中不能指定 name"
+        error = self.check_params(judge_params, "judge_params")
+        if error:
+            return None, error
+        judge, judge_prompt = body.get("judge", self.default_judge) or None, body.get("judge_prompt")
+        if not isinstance(judge, (str, type(None))) or not isinstance(judge_prompt, (str, type(None))):
+            return None, "judge 与 judge_prompt 应为字符串"
+        try:
+            search_results = int(body.get("search_results", 5))
+        except (TypeError, ValueError):
+            return None, "search_results 应为整数"
+        if not 1 <= search_results <= 50:
+            return None, "search_results 应在 1 到 50 之间"
+        attachments, error = self.resolve_attachments(body.get("attachments") or [])
+        if error:
+            return None, error
+        spec = {
+            "prompt": prompt.strip(),
+            "models": [m if isinstance(m, dict) else dict(params.get(m, {}), name=m) for m in models],
+            "judge": judge,
+            "attachments": attachments,
+            "search": bool(body.get("search", False)),
+            "search_results": search_results,
+            "judge_prompt": judge_prompt,
+            "judge_params": judge_params,
+            "stream": bool(body.get("stream", True)),
+            "use_cache": bool(body.get("use_cache", True)),
+        }
+        return spec, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Arena 本地 REST 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--models", default="", help="默认参赛模型，逗号分隔")
+    parser.add_argument("--judge", default="", help="默认裁判模型")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时运行的任务数")
+    parser.add_argument("--max-queue", type=int, default=32, help="排队任务上限，超过时返回 429")
+    parser.add_argument("--token", default="", help="设置后要求 Authorization: Bearer <token>")
+    parser.add_argument("--api-key", action="append", default=[], help="额外的 API Key，可重复")
+    parser.add_argument("--upload-dir", default="", help="允许作为附件的文件所在目录（须同时设置 --token）")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if args.upload_dir and not args.token:
+        parser.error("开启附件 (--upload-dir) 时必须设置 --token")
+    if args.upload_dir and not os.path.isdir(args.upload_dir):
+        parser.error(f"上传目录不存在: {args.upload_dir}")
+
+    cfg_mgr = ConfigManager()
+    Runtime.configure(cfg_mgr)
+    key_scheduler = Runtime.make_key_scheduler(cfg_mgr, args.api_key)
+    if not key_scheduler.keys():
+        parser.error("未配置 API Key：请在 config.json、环境变量 SILICONFLOW_API_KEYS 或 --api-key 中提供")
+    jobs = JobQueue(cfg_mgr, key_scheduler, args.concurrency, args.max_queue)
+    server = ArenaServer((args.host, args.port), jobs,
+                         default_models=[m.strip() for m in args.models.split(",") if m.strip()],
+                         default_judge=args.judge or None, token=args.token, verbose=args.verbose,
+                         upload_dir=args.upload_dir or None)
+    host, port = server.server_address[:2]
+    print(f"AI Arena 服务已启动: http://{host}:{port}  (并发 {jobs.concurrency}，排队上限 {jobs.max_queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        jobs.shutdown()
+        server.server_close()
+        Runtime.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+class AttachmentCache:
+    """
+    附件预处理缓存（进程级、线程安全、LRU 淘汰）
+    键为 (绝对路径, mtime, 文件大小)，文件未变化时跨多轮竞技复用；
+    同一附件被多个选手线程同时请求时只会预处理一次，结果以只读方式共享
+    """
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+    DEFAULT_MAX_ENTRIES = 64
+
+    _lock = threading.Lock()
+    _entries = OrderedDict()   # key -> 预处理结果 dict
+    _inflight = {}             # key -> threading.Event，正在预处理中的附件
+    _total_bytes = 0
+    _max_bytes = DEFAULT_MAX_BYTES
+    _max_entries = DEFAULT_MAX_ENTRIES
+
+    @staticmethod
+    def make_key(file_path, variant=""):
+        """返回缓存键；文件不存在时返回 None。variant 用于区分不同的预处理参数"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return (os.path.abspath(file_path), st.st_mtime_ns, st.st_size, variant)
+
+    @staticmethod
+    def file_digest(file_path, chunk_size=1024 * 1024):
+        """流式计算文件内容的 SHA-256"""
+        h = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    @staticmethod
+    def entry_size(entry):
+        if "nbytes" in entry:
+            return int(entry["nbytes"])
+        size = 0
+        for v in entry.values():
+            if isinstance(v, str):
+                size += len(v)
+        return size
+
+    @classmethod
+    def configure(cls, max_bytes=None, max_entries=None):
+        with cls._lock:
+            if max_bytes is not None:
+                cls._max_bytes = max(0, int(max_bytes))
+            if max_entries is not None:
+                cls._max_entries = max(1, int(max_entries))
+            cls._evict_locked()
+
+    @classmethod
+    def _evict_locked(cls):
+        while cls._entries and (cls._total_bytes > cls._max_bytes or len(cls._entries) > cls._max_entries):
+            _, old = cls._entries.popitem(last=False)
+            cls._total_bytes -= cls.entry_size(old)
+
+    @classmethod
+    def get_or_prepare(cls, file_path, prepare_func, variant=""):
+        """
+        取出附件的预处理结果；未命中时调用 prepare_func(file_path) 生成并缓存
+        返回的 dict 由所有调用方共享，请勿修改
+        """
+        key = cls.make_key(file_path, variant)
+        if key is None:
+            return None
+
+        while True:
+            with cls._lock:
+                entry = cls._entries.get(key)
+                if entry is not None:
+                    cls._entries.move_to_end(key)
+                    return entry
+                event = cls._inflight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    cls._inflight[key] = event
+                    break
+            # 其他线程正在处理同一附件，等待其完成后重新查表
+            event.wait()
+
+        entry = None
+        try:
+            entry = prepare_func(file_path)
+        finally:
+            with cls._lock:
+                if entry is not None:
+                    cls._entries[key] = entry
+                    cls._total_bytes += cls.entry_size(entry)
+                    cls._evict_locked()
+                cls._inflight.pop(key, None)
+            event.set()
+        return entry
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._total_bytes = 0
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return {"entries": len(cls._entries), "bytes": cls._total_bytes}
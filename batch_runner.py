@@ -0,0 +1,297 @@
+"""
+无界面批处理：读取 JSONL 问题文件，按有限并发执行 搜索 → 多模型回答 → 裁判，结果逐行写入 JSONL
+
+    python batch_runner.py prompts.jsonl -o results.jsonl --models deepseek-ai/DeepSeek-V3,Qwen/Qwen2.5-72B-Instruct \
+        --judge deepseek-ai/DeepSeek-V3 --concurrency 4 --search
+
+输入每行一个 JSON 对象:
+    {"id": "q1", "prompt": "...", "models": [...], "attachments": ["a.png"], "judge": "模型名" 或 false,
+     "judge_prompt": "...", "search": true, "params": {"模型名": {"temperature": 0.7}}}
+除 prompt 外均可省略，省略时使用命令行给出的默认值；没有 id 时以行号作为 id
+
+输出文件同时是断点：重新运行同一命令会跳过已完成的行（--retry-failed 时重跑出错的行）
+完全相同的任务只执行一次，其余行直接复用结果；相同问题的联网搜索只做一次
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from arena_engine import ArenaEngine
+from executor import TaskExecutor
+from cancel_token import CancelToken
+from config_manager import ConfigManager
+from judge_prompt import JudgePrompt
+from runtime import Runtime
+
+
+class BatchRunner:
+    FSYNC_EVERY = 20
+
+    def __init__(self, cfg_mgr, output_path, key_scheduler, models=None, judge=None, judge_prompt=None,
+                 concurrency=4, search=False, search_results=5, use_cache=True, retry_failed=False):
+        self.cfg_mgr = cfg_mgr
+        self.output_path = output_path
+        self.key_scheduler = key_scheduler
+        self.default_models = list(models or [])
+        self.default_judge = judge
+        self.default_judge_prompt = judge_prompt or JudgePrompt.DEFAULT_SYSTEM_PROMPT
+        self.concurrency = max(1, int(concurrency))
+        self.default_search = search
+        self.retry_failed = retry_failed
+        self.cancel_token = CancelToken()
+        # 同一引擎实例：相同问题的联网搜索在整个批次内只做一次
+        self.engine = ArenaEngine(key_scheduler=key_scheduler, vision_models=cfg_mgr.get_vision_models(),
+                                  use_cache=use_cache, search_results=search_results,
+                                  cookie=cfg_mgr.get_bing_cookie(), judge_prompt=self.default_judge_prompt)
+
+        self._lock = threading.Lock()
+        self._out = None
+        self._unsynced = 0
+        self._done_ids = set()
+        self._done_by_key = {}     # 去重键 -> 已完成的记录
+        self._pending = {}         # 去重键 -> 等待同一结果的行 [(row_id, line_no)]
+        self.stats = {"done": 0, "skipped": 0, "duplicates": 0, "failed": 0}
+        self.total = 0
+
+    # --- 断点 ---
+    def load_checkpoint(self):
+        """读取已有输出：同一 id 以最后一条为准"""
+        if not os.path.exists(self.output_path):
+            return
+        latest = {}
+        with open(self.output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 中断时可能留下半行
+                latest[record.get("id")] = record
+        for row_id, record in latest.items():
+            if record.get("status") == "ok" or not self.retry_failed:
+                self._done_ids.add(row_id)
+                if record.get("status") == "ok" and record.get("dedupe_key"):
+                    self._done_by_key.setdefault(record["dedupe_key"], record)
+
+    # --- 任务描述 ---
+    def make_job(self, row, line_no, base_dir):
+        if isinstance(row, str):
+            row = {"prompt": row}
+        prompt = (row.get("prompt") or "").strip()
+        judge = row.get("judge", self.default_judge)
+        job = {
+            "id": str(row.get("id", f"line-{line_no}")),
+            "line": line_no,
+            "prompt": prompt,
+            "models": list(row.get("models") or self.default_models),
+            "attachments": [p if os.path.isabs(p) else os.path.join(base_dir, p) for p in row.get("attachments", [])],
+            "judge": judge or None,
+            "judge_prompt": row.get("judge_prompt") or self.default_judge_prompt,
+            "search": bool(row.get("search", self.default_search)),
+            "params": row.get("params") or {},
+            "judge_params": row.get("judge_params") or {},
+        }
+        canonical = {k: v for k, v in job.items() if k not in ("id", "line")}
+        job["dedupe_key"] = hashlib.sha256(
+            json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return job
+
+    # --- 执行 ---
+    @staticmethod
+    def summarize(response):
+        if "error" in response:
+            return {"error": response["error"]}
+        out = {"content": response.get("content", "")}
+        for key in ("reasoning", "usage", "cached", "budget_report", "judge_input_report", "tournament",
+                    "agreement"):
+            if response.get(key):
+                out[key] = response[key]
+        if response.get("metrics"):
+            out["latency"] = round(response["metrics"].get("latency") or 0, 3)
+        return out
+
+    @staticmethod
+    def error_record(job, message):
+        return {"id": job["id"], "line": job["line"], "prompt": job["prompt"], "dedupe_key": job["dedupe_key"],
+                "status": "error", "error": message, "elapsed": 0.0}
+
+    def run_job(self, job):
+        if not job["models"]:
+            return self.error_record(job, "未指定参赛模型（行内 models 或命令行 --models）")
+        record = {"id": job["id"], "line": job["line"], "prompt": job["prompt"], "dedupe_key": job["dedupe_key"]}
+        models = [dict(job["params"].get(m, {}), name=m) for m in job["models"]]
+        result = self.engine.run_sync(
+            job["prompt"], models, judge=job["judge"], attachments=job["attachments"], search=job["search"],
+            cancel_token=self.cancel_token, judge_prompt=job["judge_prompt"], judge_params=job["judge_params"],
+            labels={"batch_row": job["id"]})
+        if result["cancelled"]:
+            return None
+        if job["search"]:
+            record["search_context"] = result["search_context"]
+        record["results"] = {m: self.summarize(r) for m, r in result["results"].items()}
+        answers = [m for m, r in result["results"].items() if "error" not in r]
+        if result["judge"] is not None:
+            record["judge"] = dict(self.summarize(result["judge"]), model=job["judge"])
+
+        failed = len(answers) < len(job["models"]) or "error" in record.get("judge", {})
+        record["status"] = "ok" if not failed else ("error" if not answers else "partial")
+        record["elapsed"] = round(result["elapsed"], 3)
+        return record
+
+    # --- 输出 ---
+    def write(self, record):
+        with self._lock:
+            if self._out is None or self._out.closed:
+                print(f"{record['id']} 未写入：输出文件已关闭", file=sys.stderr)
+                return
+            self._out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._out.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.FSYNC_EVERY:
+                os.fsync(self._out.fileno())
+                self._unsynced = 0
+
+    def process(self, job, slots):
+        try:
+            try:
+                record = self.run_job(job)
+            except Exception as e:
+                print(f"{job['id']} 处理异常: {e}", file=sys.stderr)
+                # 写出错误记录（连同等待同一结果的重复行），--retry-failed 时会重跑
+                record = self.error_record(job, f"处理异常: {e}")
+            self.finish(job, record)
+        except Exception as e:
+            print(f"{job['id']} 写出结果失败: {e}", file=sys.stderr)
+        finally:
+            slots.release()
+
+    def finish(self, job, record):
+        if record is None:
+            return  # 已中止：不写入，下次运行时重跑
+        with self._lock:
+            waiters = self._pending.pop(job["dedupe_key"], [])
+            if record["status"] == "ok":
+                self._done_by_key[job["dedupe_key"]] = record
+            self.stats["done"] += 1
+            if record["status"] != "ok":
+                self.stats["failed"] += 1
+        self.write(record)
+        for row_id, line_no in waiters:
+            self.write(dict(record, id=row_id, line=line_no, duplicate_of=job["id"]))
+        self.report_progress(record)
+
+    def report_progress(self, record):
+        s = self.stats
+        print(f"[{s['done'] + s['duplicates'] + s['skipped']}/{self.total}] {record['id']} {record['status']} "
+              f"{record['elapsed']:.1f}s", file=sys.stderr)
+
+    def iter_rows(self, input_path):
+        with open(input_path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    print(f"第 {line_no} 行不是有效的 JSON，已跳过", file=sys.stderr)
+                    continue
+                if not isinstance(row, (dict, str)):
+                    print(f"第 {line_no} 行应为 JSON 对象或字符串，已跳过", file=sys.stderr)
+                    continue
+                yield line_no, row
+
+    def run(self, input_path):
+        self.load_checkpoint()
+        base_dir = os.path.dirname(os.path.abspath(input_path))
+        with open(input_path, "r", encoding="utf-8") as f:
+            self.total = sum(1 for line in f if line.strip())
+        pool = TaskExecutor(self.concurrency, name="batch")
+        # 在途的行数有上限：输入很大时不会一次性把所有任务放进队列
+        slots = threading.Semaphore(self.concurrency * 2)
+        self._out = open(self.output_path, "a", encoding="utf-8")
+        handles = []
+        try:
+            for line_no, row in self.iter_rows(input_path):
+                job = self.make_job(row, line_no, base_dir)
+                if job["id"] in self._done_ids:
+                    self.stats["skipped"] += 1
+                    continue
+                if not job["prompt"]:
+                    continue
+                with self._lock:
+                    done = self._done_by_key.get(job["dedupe_key"])
+                    if done is None and job["dedupe_key"] in self._pending:
+                        self._pending[job["dedupe_key"]].append((job["id"], line_no))
+                        self.stats["duplicates"] += 1
+                        continue
+                    if done is None:
+                        self._pending[job["dedupe_key"]] = []
+                if done is not None:
+                    self.stats["duplicates"] += 1
+                    self.write(dict(done, id=job["id"], line=line_no, duplicate_of=done["id"]))
+                    continue
+                slots.acquire()
+                handles = [h for h in handles if not h.done()]
+                handles.append(pool.submit(self.process, job, slots))
+            # 等待所有在途任务
+            for _ in range(self.concurrency * 2):
+                slots.acquire()
+        except KeyboardInterrupt:
+            print("已中断：正在取消在途请求，已完成的结果已保存，重新运行即可继续", file=sys.stderr)
+            self.cancel_token.cancel()
+            pool.shutdown()
+            # 等在途任务结束再关闭文件：已完成的结果仍会写入
+            for handle in handles:
+                handle.wait()
+        finally:
+            with self._lock:
+                self._out.flush()
+                os.fsync(self._out.fileno())
+                self._out.close()
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Arena 无界面批处理")
+    parser.add_argument("input", help="输入 JSONL 文件")
+    parser.add_argument("-o", "--output", required=True, help="输出 JSONL 文件（同时作为断点）")
+    parser.add_argument("--models", default="", help="默认参赛模型，逗号分隔")
+    parser.add_argument("--judge", default="", help="默认裁判模型；留空则不裁判")
+    parser.add_argument("--judge-prompt", default="", help="裁判系统提示词")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时处理的问题数")
+    parser.add_argument("--max-requests", type=int, default=0, help="同时进行的模型请求上限（默认取配置）")
+    parser.add_argument("--search", action="store_true", help="默认先联网搜索")
+    parser.add_argument("--search-results", type=int, default=5)
+    parser.add_argument("--no-cache", action="store_true", help="不读写回答缓存")
+    parser.add_argument("--retry-failed", action="store_true", help="重跑断点中出错或不完整的行")
+    parser.add_argument("--api-key", action="append", default=[], help="额外的 API Key，可重复")
+    args = parser.parse_args()
+
+    cfg_mgr = ConfigManager()
+    Runtime.configure(cfg_mgr)
+    if args.max_requests:
+        TaskExecutor.shared().set_max_workers(args.max_requests)
+    key_scheduler = Runtime.make_key_scheduler(cfg_mgr, args.api_key)
+    if not key_scheduler.keys():
+        parser.error("未配置 API Key：请在 config.json、环境变量 SILICONFLOW_API_KEYS 或 --api-key 中提供")
+
+    runner = BatchRunner(
+        cfg_mgr, args.output, key_scheduler,
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        judge=args.judge or None, judge_prompt=args.judge_prompt or None,
+        concurrency=args.concurrency, search=args.search, search_results=args.search_results,
+        use_cache=not args.no_cache, retry_failed=args.retry_failed)
+    started = time.monotonic()
+    try:
+        stats = runner.run(args.input)
+    finally:
+        Runtime.shutdown()
+    print(f"完成 {stats['done']} 行（失败 {stats['failed']}），复用重复 {stats['duplicates']} 行，"
+          f"跳过已完成 {stats['skipped']} 行，用时 {time.monotonic() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import socket
+import threading
+
+class CancelToken:
+    """
+    跨线程的取消令牌：界面线程调用 cancel()，工作线程在读取循环 / 退避等待中检查它
+    register() 注册的回调会在取消时立即执行，用于关闭正在读取的连接
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        for cb in callbacks:
+            try:
+                cb()
+            except Exception as e:
+                print(f"取消回调执行失败: {e}")
+
+    def wait(self, timeout):
+        """可被取消打断的 sleep；返回 True 表示已取消"""
+        return self._event.wait(timeout)
+
+    def register(self, callback):
+        """注册取消回调；若已取消则立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def unregister(self, callback):
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
+
+def abort_response(response):
+    """
+    强制中断一个 requests 流式响应：shutdown 底层 socket 以唤醒阻塞中的读取，
+    服务端随之感知断开并停止生成
+    """
+    raw = getattr(response, "raw", None)
+    sock = None
+    for path in (("_connection", "sock"), ("_fp", "fp", "raw", "_sock")):
+        obj = raw
+        for attr in path:
+            obj = getattr(obj, attr, None)
+            if obj is None:
+                break
+        if obj is not None:
+            sock = obj
+            break
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    try:
+        response.close()
+    except Exception:
+        pass
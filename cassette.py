@@ -0,0 +1,240 @@
+import os
+import json
+import gzip
+import time
+import hashlib
+import threading
+import urllib.parse
+from collections import deque
+
+class ReplayResponse:
+    """
+    回放用的响应对象，只实现 LLMClient / SearchTool 用到的 requests.Response 接口
+    按录制时的时间间隔（乘以 time_scale）逐行 / 逐块吐出数据；close() 可随时打断
+    """
+    def __init__(self, entry, time_scale=1.0):
+        self.status_code = entry.get("status", 200)
+        self.headers = entry.get("headers", {})
+        self.encoding = "utf-8"
+        self.raw = None
+        self._entry = entry
+        self._scale = max(0.0, float(time_scale))
+        self._closed = threading.Event()
+        self._sleep(entry.get("ttfb", 0))  # 模拟等待响应头
+
+    def _sleep(self, seconds):
+        if seconds > 0 and self._scale > 0:
+            self._closed.wait(seconds * self._scale)
+
+    def iter_lines(self, decode_unicode=False, **kwargs):
+        for delay, line in self._entry.get("lines", []):
+            self._sleep(delay)
+            if self._closed.is_set():
+                return
+            yield line if decode_unicode else line.encode("utf-8")
+
+    def iter_content(self, chunk_size=16384, **kwargs):
+        self._sleep(self._entry.get("body_delay", 0))
+        data = self.text.encode("utf-8")
+        for i in range(0, len(data), chunk_size):
+            if self._closed.is_set():
+                return
+            yield data[i:i + chunk_size]
+
+    @property
+    def text(self):
+        if "lines" in self._entry:
+            return "\n".join(line for _, line in self._entry["lines"])
+        return self._entry.get("body", "")
+
+    def json(self):
+        self._sleep(self._entry.get("body_delay", 0))
+        return json.loads(self.text)
+
+    def close(self):
+        self._closed.set()
+
+
+class RecordingResponse:
+    """
+    包装真实响应：透传所有读取操作，同时记下每行 / 正文及其到达时间，
+    读取完毕（或关闭）时写入磁带；流式读取被中途取消的交换不录制
+    """
+    def __init__(self, response, key, kind, started):
+        self._response = response
+        self._key = key
+        self._kind = kind
+        self._last = time.monotonic()
+        self._entry = {"key": key, "kind": kind, "status": response.status_code,
+                       "headers": {k: v for k, v in response.headers.items()
+                                   if k.lower() in ("retry-after", "content-type")},
+                       "ttfb": round(self._last - started, 4)}
+        self._partial = False
+        self._saved = False
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def _elapsed(self):
+        now = time.monotonic()
+        delay, self._last = now - self._last, now
+        return round(delay, 4)
+
+    def iter_lines(self, decode_unicode=False, **kwargs):
+        lines = self._entry.setdefault("lines", [])
+        self._partial = True
+        for line in self._response.iter_lines(decode_unicode=decode_unicode, **kwargs):
+            text = line.decode("utf-8", errors="replace") if isinstance(line, bytes) else line
+            lines.append([self._elapsed(), text])
+            if text.strip() == "data: [DONE]":
+                # SSE 结束标记：调用方读到这里就会停止迭代，此时交换已完整
+                self._partial = False
+                self._save()
+            yield line
+        self._partial = False
+        self._save()
+
+    def iter_content(self, chunk_size=16384, **kwargs):
+        body = []
+        self._partial = True
+        for block in self._response.iter_content(chunk_size=chunk_size, **kwargs):
+            body.append(block)
+            yield block
+        self._partial = False
+        self._entry["body_delay"] = self._elapsed()
+        self._entry["body"] = b"".join(body).decode(self._response.encoding or "utf-8", errors="replace")
+        self._save()
+
+    @property
+    def text(self):
+        text = self._response.text
+        if "body" not in self._entry:
+            self._entry["body_delay"] = self._elapsed()
+            self._entry["body"] = text
+            self._save()
+        return text
+
+    def json(self):
+        self.text  # 记录正文
+        return self._response.json()
+
+    def close(self):
+        if not self._partial and "body" not in self._entry and "lines" not in self._entry:
+            self._entry["body"] = ""  # 错误响应未读取正文
+        if not self._partial:
+            self._save()
+        self._response.close()
+
+    def _save(self):
+        if not self._saved:
+            self._saved = True
+            Cassette.append(self._entry)
+
+
+class Cassette:
+    """
+    HTTP 交换录制 / 回放（磁带模式），用于离线复现真实的对战过程做性能回归
+    - record: 真实请求照常发送，每次交换（请求哈希、状态码、流式各行及到达间隔、正文）追加到磁带文件
+    - replay: 不访问网络，按请求哈希从磁带取出响应，以原始或压缩后的时间间隔回放
+    磁带为 JSON Lines，每行一次交换；文件名以 .gz 结尾时 gzip 压缩
+    同一请求录制多次时按顺序依次回放，用完后重复最后一次
+    """
+    _lock = threading.Lock()
+    _mode = "off"
+    _path = None
+    _time_scale = 1.0
+    _allow_live = False
+    _entries = {}
+
+    @classmethod
+    def configure(cls, mode="off", path=None, time_scale=1.0, allow_live=False):
+        mode = (mode or "off").lower()
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"未知的磁带模式: {mode}")
+        if mode != "off" and not path:
+            raise ValueError("录制 / 回放需要指定磁带文件路径")
+        with cls._lock:
+            cls._mode = mode
+            cls._path = path
+            cls._time_scale = max(0.0, float(time_scale))
+            cls._allow_live = bool(allow_live)
+            cls._entries = {}
+        if mode == "replay":
+            cls.load(path)
+
+    @classmethod
+    def mode(cls):
+        return cls._mode
+
+    @staticmethod
+    def _open(path, mode):
+        if path.endswith(".gz"):
+            return gzip.open(path, mode + "t", encoding="utf-8")
+        return open(path, mode, encoding="utf-8")
+
+    @classmethod
+    def load(cls, path):
+        entries = {}
+        if os.path.exists(path):
+            with cls._open(path, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries.setdefault(entry["key"], deque()).append(entry)
+        else:
+            print(f"磁带文件不存在: {path}")
+        with cls._lock:
+            cls._entries = entries
+        return sum(len(q) for q in entries.values())
+
+    @classmethod
+    def append(cls, entry):
+        with cls._lock:
+            if cls._mode != "record" or not cls._path:
+                return
+            try:
+                os.makedirs(os.path.dirname(cls._path) or ".", exist_ok=True)
+                with cls._open(cls._path, "a") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+            except OSError as e:
+                print(f"写入磁带失败: {e}")
+
+    @staticmethod
+    def make_key(method, url, data=None):
+        """请求哈希：方法 + 路径与查询串（不含主机，真实服务与模拟服务可互换）+ 请求体"""
+        parts = urllib.parse.urlsplit(url)
+        h = hashlib.sha256(f"{method.upper()} {parts.path}?{parts.query}\n".encode("utf-8"))
+        if data:
+            h.update(data if isinstance(data, bytes) else str(data).encode("utf-8"))
+        return h.hexdigest()
+
+    @classmethod
+    def _take(cls, key):
+        with cls._lock:
+            queue = cls._entries.get(key)
+            if not queue:
+                return None
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+    @classmethod
+    def request(cls, session, method, url, data=None, **kwargs):
+        """替代 session.request()：按当前模式直接发送、录制或回放"""
+        if cls._mode == "off":
+            return session.request(method, url, data=data, **kwargs)
+        key = cls.make_key(method, url, data)
+        kind = f"{method.upper()} {urllib.parse.urlsplit(url).path}"
+        if cls._mode == "replay":
+            entry = cls._take(key)
+            if entry is not None:
+                return ReplayResponse(entry, cls._time_scale)
+            if not cls._allow_live:
+                return ReplayResponse({"status": 404, "body": f"回放磁带中没有该请求 ({kind}, {key[:12]})"})
+            return session.request(method, url, data=data, **kwargs)
+        started = time.monotonic()
+        response = session.request(method, url, data=data, **kwargs)
+        return RecordingResponse(response, key, kind, started)
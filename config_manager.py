@@ -14,6 +14,64 @@ class ConfigManager:
             "api_keys": [],     # 变更为列表
             "current_key_index": 0, # 记录当前选中的是第几个
             "bing_cookie": "", 
+            "api_base_url": "",     # 兼容 SiliconFlow 的接口地址，留空使用官方地址
+            "search_url": "",       # 搜索页地址，留空使用 cn.bing.com
+            "stream_output": True,  # 流式输出：边生成边显示
+            "http_pool_size": 16,   # 每个主机的 HTTP 连接池大小
+            "max_concurrency": 8,   # 同时进行的模型/搜索调用上限（共享线程池大小）
+            "attachment_cache_mb": 256,  # 附件预处理缓存上限 (MB)
+            "key_limits": {             # 每个 Key 的初始限流（收到 429 后自动下调）
+                "rpm": 1000,
+                "tpm": 50000
+            },
+            "retrieval": {              # 大文本附件检索模式
+                "enabled": True,
+                "min_chars": 30000,
+                "chunk_chars": 1500,
+                "top_k": 8
+            },
+            "response_cache": {         # 模型回答磁盘缓存
+                "enabled": True,
+                "max_mb": 200,
+                "max_age_days": 7
+            },
+            "latency": {                # 按历史延迟自适应超时 / 对冲慢请求
+                "adaptive_timeout": True,
+                "hedge_requests": True
+            },
+            "cassette": {               # 录制 / 回放真实 HTTP 交换，用于离线复现与性能回归
+                "mode": "off",          # off / record / replay
+                "path": "cassettes/arena.jsonl.gz",
+                "time_scale": 1.0       # 回放时间倍率：1 为原速，0 为不等待
+            },
+            "trace_runs": False,        # 每轮运行写出 Chrome Trace 文件 (traces/ 目录)
+            "judge_include_reasoning": False,  # 思考模型的推理过程是否一并交给裁判（默认只给正文）
+            "judge_compression": {      # 裁判输入压缩：跨回答去重、每个回答的 Token 预算、超长回答抽取式摘要
+                "enabled": True,
+                "dedupe": True,
+                "similarity": 0.7,      # 段落 MinHash 相似度达到该值视为重复
+                "per_answer_tokens": 4000,
+                "summarize": True
+            },
+            "judge_tournament": {       # 淘汰赛裁判：选手较多时分组并发评审，逐轮合并后再做总评
+                "enabled": False,
+                "fan_out": 4,           # 每组回答数
+                "max_depth": 3,         # 串行裁判调用的最多轮数（含最后的总评）
+                "min_contestants": 6,   # 回答数达到该值才启用
+                "group_max_tokens": 2048
+            },
+            "judge_shortcut": {         # 各回答高度一致时跳过裁判或改为简短确认
+                "enabled": False,
+                "threshold": 0.9,       # 两两 TF-IDF 余弦相似度的最低值达到该值视为一致
+                "mode": "brief",        # brief: 简短确认；skip: 不调用裁判，直接采用共识回答
+                "brief_max_tokens": 512
+            },
+            "image_upload": {           # 图片上传前压缩
+                "max_edge": 2048,
+                "quality": 85,
+                "format": "JPEG",
+                "max_kb": 1536
+            },
             "theme": {
                 "background_color": "#2b2b2b",
                 "text_color": "#ffffff",
@@ -93,6 +151,94 @@ class ConfigManager:
         self.config["bing_cookie"] = cookie_str.strip()
         self.save_config()
 
+    def get_api_base_url(self): return self.config.get("api_base_url", "")
+    def set_api_base_url(self, url):
+        self.config["api_base_url"] = url.strip()
+        self.save_config()
+    def get_search_url(self): return self.config.get("search_url", "")
+
+    def get_stream_output(self): return bool(self.config.get("stream_output", True))
+    def set_stream_output(self, enabled):
+        self.config["stream_output"] = bool(enabled)
+        self.save_config()
+
+    def get_trace_runs(self): return bool(self.config.get("trace_runs", False))
+    def set_trace_runs(self, enabled):
+        self.config["trace_runs"] = bool(enabled)
+        self.save_config()
+
+    def get_judge_include_reasoning(self): return bool(self.config.get("judge_include_reasoning", False))
+    def set_judge_include_reasoning(self, enabled):
+        self.config["judge_include_reasoning"] = bool(enabled)
+        self.save_config()
+
+    def get_http_pool_size(self): return int(self.config.get("http_pool_size", 16))
+    def get_max_concurrency(self): return max(1, int(self.config.get("max_concurrency", 8)))
+    def set_max_concurrency(self, n):
+        self.config["max_concurrency"] = max(1, int(n))
+        self.save_config()
+    def get_attachment_cache_mb(self): return int(self.config.get("attachment_cache_mb", 256))
+
+    def get_key_limits(self):
+        opts = dict(self.default_config["key_limits"])
+        opts.update(self.config.get("key_limits", {}))
+        return opts
+
+    def get_retrieval(self):
+        opts = dict(self.default_config["retrieval"])
+        opts.update(self.config.get("retrieval", {}))
+        return opts
+
+    def get_response_cache(self):
+        opts = dict(self.default_config["response_cache"])
+        opts.update(self.config.get("response_cache", {}))
+        return opts
+
+    def get_latency(self):
+        opts = dict(self.default_config["latency"])
+        opts.update(self.config.get("latency", {}))
+        return opts
+
+    def get_cassette(self):
+        opts = dict(self.default_config["cassette"])
+        opts.update(self.config.get("cassette", {}))
+        return opts
+
+    def get_judge_compression(self):
+        opts = dict(self.default_config["judge_compression"])
+        opts.update(self.config.get("judge_compression", {}))
+        return opts
+
+    def get_judge_tournament(self):
+        opts = dict(self.default_config["judge_tournament"])
+        opts.update(self.config.get("judge_tournament", {}))
+        return opts
+
+    def set_judge_tournament(self, enabled, fan_out, max_depth):
+        opts = self.get_judge_tournament()
+        opts.update(enabled=bool(enabled), fan_out=int(fan_out), max_depth=int(max_depth))
+        self.config["judge_tournament"] = opts
+        self.save_config()
+
+    def get_judge_shortcut(self):
+        opts = dict(self.default_config["judge_shortcut"])
+        opts.update(self.config.get("judge_shortcut", {}))
+        return opts
+
+    def set_judge_shortcut(self, enabled, threshold, mode):
+        opts = self.get_judge_shortcut()
+        opts.update(enabled=bool(enabled), threshold=float(threshold), mode=mode)
+        self.config["judge_shortcut"] = opts
+        self.save_config()
+
+    def get_image_upload(self):
+        opts = dict(self.default_config["image_upload"])
+        opts.update(self.config.get("image_upload", {}))
+        return opts
+    def set_image_upload(self, max_edge, quality, fmt, max_kb):
+        self.config["image_upload"] = {"max_edge": max_edge, "quality": quality, "format": fmt, "max_kb": max_kb}
+        self.save_config()
+
     def get_theme(self): return self.config.get("theme", self.default_config["theme"])
     def set_theme(self, bg, fg, size):
         self.config["theme"] = {"background_color": bg, "text_color": fg, "font_size": size}
@@ -0,0 +1,168 @@
+import heapq
+import itertools
+import threading
+
+class TaskHandle:
+    """提交到 TaskExecutor 的任务句柄：可查询状态、等待结果、取消尚未开始的任务"""
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.exception = None
+        self.cancelled = False
+        self.started = False
+        self._executor = None   # 所属 TaskExecutor；状态在其锁内变更，避免与工作线程取任务竞争
+        self._done = threading.Event()
+
+    def cancel(self):
+        """取消排队中的任务；已开始运行的任务需由任务自身响应取消令牌"""
+        if self._executor is None:
+            return self._cancel_locked()
+        with self._executor._cond:
+            return self._cancel_locked()
+
+    def _cancel_locked(self):
+        if not self.started and not self.cancelled:
+            self.cancelled = True
+            if self._executor is not None:
+                self._executor._remove_queued(self)
+            self._done.set()
+        return self.cancelled
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class TaskExecutor:
+    """
+    有界优先级线程池：所有选手、裁判、搜索调用共用固定数量的线程
+    priority 越小越先执行，同优先级按提交顺序；并发上限可在运行时调整
+    """
+    PRIORITY_HIGH = 0      # 搜索：阻塞后续所有阶段
+    PRIORITY_JUDGE = 5     # 裁判：尽快结束已有结果的一轮
+    PRIORITY_NORMAL = 10   # 选手
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_workers=8, name="arena-pool"):
+        self.name = name
+        self._max_workers = max(1, int(max_workers))
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._threads = set()
+        self._idle = 0
+        self._running = 0
+        self._shutdown = False
+
+    @classmethod
+    def shared(cls):
+        """进程级共享实例"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    def set_max_workers(self, n):
+        with self._cond:
+            self._max_workers = max(1, int(n))
+            self._cond.notify_all()  # 多余的空闲线程会自行退出
+
+    def submit(self, fn, *args, priority=PRIORITY_NORMAL, **kwargs):
+        handle = TaskHandle(fn, args, kwargs)
+        handle._executor = self
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("TaskExecutor 已关闭")
+            heapq.heappush(self._queue, (priority, next(self._seq), handle))
+            # 排队任务多于空闲线程且未达上限时才新建线程
+            if len(self._queue) > self._idle and len(self._threads) < self._max_workers:
+                t = threading.Thread(target=self._worker_loop, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                self._threads.add(t)
+                t.start()
+            else:
+                self._cond.notify()
+        return handle
+
+    def _worker_loop(self):
+        me = threading.current_thread()
+        while True:
+            with self._cond:
+                while not self._queue and not self._shutdown and len(self._threads) <= self._max_workers:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                if self._shutdown or len(self._threads) > self._max_workers or not self._queue:
+                    self._threads.discard(me)
+                    return
+                _, _, handle = heapq.heappop(self._queue)
+                if handle.cancelled or handle.started:
+                    continue  # 已取消，或已由提交方在 run_inline 中执行
+                handle.started = True
+                self._running += 1
+            try:
+                handle.result = handle.fn(*handle.args, **handle.kwargs)
+            except BaseException as e:
+                handle.exception = e
+                print(f"后台任务异常: {e}")
+            finally:
+                with self._cond:
+                    self._running -= 1
+                handle._done.set()
+
+    def _remove_queued(self, handle):
+        """从队列中移除已取消的任务（调用方持有 self._cond）"""
+        for i, entry in enumerate(self._queue):
+            if entry[2] is handle:
+                self._queue[i] = self._queue[-1]
+                self._queue.pop()
+                heapq.heapify(self._queue)
+                return
+
+    def run_inline(self, handle):
+        """
+        等待任务完成；任务仍在排队时由调用线程直接执行
+        池线程中的任务等待自己提交的子任务时使用，避免线程全部被占满时互相等待
+        """
+        with self._cond:
+            steal = not handle.started and not handle.cancelled
+            if steal:
+                handle.started = True
+        if not steal:
+            handle.wait()
+            return handle.result
+        try:
+            handle.result = handle.fn(*handle.args, **handle.kwargs)
+        except BaseException as e:
+            handle.exception = e
+            print(f"后台任务异常: {e}")
+        finally:
+            handle._done.set()
+        return handle.result
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": sum(1 for _, _, h in self._queue if not h.cancelled),
+                "running": self._running,
+                "threads": len(self._threads),
+                "max_workers": self._max_workers
+            }
+
+    def shutdown(self, cancel_pending=True):
+        with self._cond:
+            self._shutdown = True
+            if cancel_pending:
+                for _, _, handle in list(self._queue):
+                    handle.cancel()
+                self._queue.clear()
+            self._cond.notify_all()
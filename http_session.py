@@ -0,0 +1,158 @@
+import socket
+import threading
+import contextlib
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_local = threading.local()
+
+
+class InflightConnection:
+    """
+    记录当前线程一次请求实际使用的连接，供其他线程中断（见 HttpSessionPool.track）
+    在响应头到达之前 requests 不暴露连接，只能在连接池取出连接时登记
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.aborted = False
+
+    def attach(self, conn):
+        with self._lock:
+            self._conn = conn
+            aborted = self.aborted
+        if aborted:
+            self._shutdown(conn)
+
+    def abort(self):
+        """shutdown 连接的 socket：唤醒阻塞在发送或等待响应头上的线程，服务端随之感知断开"""
+        with self._lock:
+            self.aborted = True
+            conn = self._conn
+        if conn is not None:
+            self._shutdown(conn)
+
+    @staticmethod
+    def _shutdown(conn):
+        sock = getattr(conn, "sock", None)
+        if sock is None:
+            return  # 尚未连上：连接阶段受连接超时限制，完成后由调用方检查取消状态
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class _TrackingPoolMixin:
+    """从连接池取出连接时，登记到当前线程正在跟踪的 InflightConnection"""
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        inflight = getattr(_local, "inflight", None)
+        if inflight is not None:
+            inflight.attach(conn)
+        return conn
+
+
+class _TrackingHTTPConnectionPool(_TrackingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _TrackingHTTPSConnectionPool(_TrackingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _TrackingAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TrackingHTTPConnectionPool,
+            "https": _TrackingHTTPSConnectionPool,
+        }
+
+
+class HttpSessionPool:
+    """
+    进程级共享的 HTTP 连接池：每个主机一个 requests.Session，复用 TCP+TLS 连接 (keep-alive)
+    所有选手、裁判、搜索线程都从这里取 Session，避免每次请求重新握手
+    """
+    DEFAULT_POOL_SIZE = 16
+
+    _lock = threading.Lock()
+    _sessions = {}
+    _pool_size = DEFAULT_POOL_SIZE
+
+    @staticmethod
+    def _host_key(url):
+        parts = urllib.parse.urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    @classmethod
+    def configure(cls, pool_size):
+        """设置每个主机的连接池大小；已创建的 Session 会被关闭并按新大小重建"""
+        pool_size = max(1, int(pool_size))
+        with cls._lock:
+            if pool_size == cls._pool_size:
+                return
+            cls._pool_size = pool_size
+            old_sessions = list(cls._sessions.values())
+            cls._sessions = {}
+        for session in old_sessions:
+            session.close()
+
+    @classmethod
+    def get_session(cls, url):
+        """按 URL 的主机返回共享 Session（线程安全，惰性创建）"""
+        key = cls._host_key(url)
+        session = cls._sessions.get(key)
+        if session is not None:
+            return session
+        with cls._lock:
+            session = cls._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = _TrackingAdapter(pool_connections=1, pool_maxsize=cls._pool_size, pool_block=False)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls._sessions[key] = session
+            return session
+
+    @staticmethod
+    @contextlib.contextmanager
+    def track():
+        """
+        跟踪块内当前线程发出的请求所用的连接，返回 InflightConnection
+        其他线程调用它的 abort() 即可中断仍在等待响应头的请求（取消按钮）
+        """
+        inflight = InflightConnection()
+        previous = getattr(_local, "inflight", None)
+        _local.inflight = inflight
+        try:
+            yield inflight
+        finally:
+            _local.inflight = previous
+
+    @classmethod
+    def prewarm(cls, urls, timeout=5):
+        """预热：提前建立到各主机的连接，失败静默忽略"""
+        for url in urls:
+            try:
+                cls.get_session(url).head(cls._host_key(url), timeout=timeout)
+            except Exception as e:
+                print(f"连接预热失败 ({url}): {e}")
+
+    @classmethod
+    def prewarm_async(cls, urls):
+        """在后台线程中预热，不阻塞界面启动"""
+        t = threading.Thread(target=cls.prewarm, args=(list(urls),), daemon=True)
+        t.start()
+        return t
+
+    @classmethod
+    def close_all(cls):
+        with cls._lock:
+            sessions = list(cls._sessions.values())
+            cls._sessions = {}
+        for session in sessions:
+            session.close()
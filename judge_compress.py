@@ -0,0 +1,231 @@
+import re
+import math
+import zlib
+import heapq
+from collections import Counter
+from retrieval import tokenize
+from prompt_budget import PromptBudgeter
+
+_FENCE_RE = re.compile(r'^\s*(```|~~~)')
+# 结论性段落：摘要时优先保留
+_CONCLUSION_RE = re.compile(r'(总结|结论|综上|总之|因此|建议|summary|conclusion|in short|tl;dr)', re.IGNORECASE)
+
+
+def split_paragraphs(text):
+    """按空行分段；代码块（``` 包围的部分）整体作为一段，不在中间切开"""
+    paragraphs, buf, in_code = [], [], False
+    for line in text.splitlines():
+        if _FENCE_RE.match(line):
+            in_code = not in_code
+        if not line.strip() and not in_code:
+            if buf:
+                paragraphs.append("\n".join(buf))
+                buf = []
+            continue
+        buf.append(line)
+    if buf:
+        paragraphs.append("\n".join(buf))
+    return paragraphs
+
+
+class TokenIds(dict):
+    """词 -> CRC32 整数的缓存（同一批回答中的词大量重复）"""
+    def __missing__(self, token):
+        value = self[token] = zlib.crc32(token.encode("utf-8"))
+        return value
+
+
+def shingles(tokens, size=3, token_ids=None):
+    """
+    词级 shingle 集合（tokens 来自 retrieval.tokenize，中文为二字词）
+    词先映射为 CRC32 整数，再对整数元组取 hash()：整数元组的哈希不受 PYTHONHASHSEED 影响，结果与进程无关
+    """
+    ids = list(map((token_ids if token_ids is not None else TokenIds()).__getitem__, tokens))
+    if len(ids) <= size:
+        return {hash(tuple(ids))} if ids else set()
+    return set(map(hash, zip(*(ids[i:] for i in range(size)))))
+
+
+class MinHashSketch:
+    """
+    bottom-k MinHash：只保留 shingle 哈希中最小的 k 个
+    两段的相似度 = 并集的最小 k 个哈希中同时出现在两段里的比例，估计 Jaccard 相似度（集合小于 k 时为精确值）
+    """
+    def __init__(self, shingle_set, k=64):
+        self.k = k
+        self.values = heapq.nsmallest(k, shingle_set)
+        self.members = set(self.values)
+
+    def similarity(self, other):
+        union = sorted(self.members | other.members)[:self.k]
+        if not union:
+            return 0.0
+        both = sum(1 for v in union if v in self.members and v in other.members)
+        return both / len(union)
+
+
+class JudgeCompressor:
+    """
+    裁判输入压缩：
+    1. 跨选手检测近似重复的段落（shingle + MinHash），共有内容只保留一份并注明出自哪些模型，
+       各回答中原位置替换为引用标记
+    2. 每个回答按 Token 预算保留；超出时做抽取式摘要（保留开头、结论与信息量最高的段落），
+       不开启摘要时保留开头与结尾，而不是只截取开头
+    """
+    MAX_POSTING = 32
+
+    def __init__(self, similarity=0.7, dedupe=True, summarize=True, shingle_size=3, sketch_size=64,
+                 min_dedupe_tokens=20):
+        self.similarity = similarity
+        self.dedupe = dedupe
+        self.summarize = summarize
+        self.shingle_size = shingle_size
+        self.sketch_size = sketch_size
+        self.min_dedupe_tokens = min_dedupe_tokens
+
+    @staticmethod
+    def short_name(name):
+        return name.split("/")[-1]
+
+    def find_shared(self, paragraphs, tokens):
+        """
+        paragraphs: {模型名: [段落]}；tokens: {模型名: [各段的词列表]}
+        返回重复段落组 [[(模型名, 段落下标), ...]]，每组至少出现两处
+        """
+        groups = []          # 每组的成员
+        sketches = []        # 每组代表段落的 sketch
+        index = {}           # 哈希值 -> 含有该值的组下标（倒排，用于快速找候选）
+        token_ids = TokenIds()
+        for name in sorted(paragraphs):
+            for i, para in enumerate(paragraphs[name]):
+                if len(tokens[name][i]) < self.min_dedupe_tokens:
+                    continue
+                sketch = MinHashSketch(shingles(tokens[name][i], self.shingle_size, token_ids), self.sketch_size)
+                # 出现在大量段落中的哈希（常见短语）区分度低，不参与找候选，避免倒排表过长拖慢比较
+                candidates, skipped = Counter(), 0
+                for v in sketch.values:
+                    posting = index.get(v)
+                    if posting and len(posting) > self.MAX_POSTING:
+                        skipped += 1
+                    elif posting:
+                        candidates.update(posting)
+                best, best_sim = None, 0.0
+                for g, shared_values in candidates.most_common(8):
+                    # 共有的最小哈希个数是相似度估计的上界，不可能达到阈值的候选直接跳过
+                    if shared_values + skipped < self.similarity * max(len(sketch.values), len(sketches[g].values)):
+                        break
+                    sim = sketch.similarity(sketches[g])
+                    if sim > best_sim:
+                        best, best_sim = g, sim
+                if best is not None and best_sim >= self.similarity:
+                    groups[best].append((name, i))
+                    continue
+                groups.append([(name, i)])
+                sketches.append(sketch)
+                for v in sketch.values:
+                    index.setdefault(v, []).append(len(groups) - 1)
+        return [g for g in groups if len(g) > 1]
+
+    def summarize_paragraphs(self, paragraphs, para_tokens, budget, weights):
+        """抽取式摘要：在预算内按得分选段，按原顺序输出，并标出省略的段数"""
+        costs = [PromptBudgeter.estimate_tokens(p) for p in paragraphs]
+        scores = []
+        for i, para in enumerate(paragraphs):
+            terms = set(para_tokens[i])
+            score = sum(weights.get(t, 0.0) for t in terms) / math.sqrt(max(1, costs[i]))
+            if _CONCLUSION_RE.search(para):
+                score *= 2
+            scores.append(score)
+        # 开头（通常是直接回答）与结尾（通常是结论）优先
+        order = [0, len(paragraphs) - 1] + sorted(range(1, len(paragraphs) - 1), key=lambda i: -scores[i])
+        chosen, used = set(), 0
+        for i in order:
+            if i in chosen:
+                continue
+            if used + costs[i] <= budget:
+                chosen.add(i)
+                used += costs[i]
+            elif i in (0, len(paragraphs) - 1) and budget - used > PromptBudgeter.MIN_KEEP_TOKENS // 2:
+                # 首尾段本身超长：截取其开头保留
+                paragraphs = list(paragraphs)
+                paragraphs[i] = PromptBudgeter.truncate_to_tokens(paragraphs[i], budget - used - 10) + "…"
+                chosen.add(i)
+                used = budget
+        out, skipped = [], 0
+        for i, para in enumerate(paragraphs):
+            if i in chosen:
+                if skipped:
+                    out.append(f"…(省略 {skipped} 段)…")
+                    skipped = 0
+                out.append(para)
+            else:
+                skipped += 1
+        if skipped:
+            out.append(f"…(省略 {skipped} 段)…")
+        return out
+
+    @staticmethod
+    def term_weights(tokens, query):
+        """词权重：在多少个回答中出现（越多越可能是要点），与问题相关的词加倍"""
+        df = Counter(t for paras in tokens.values() for t in set(t for p in paras for t in p))
+        query_terms = set(tokenize(query))
+        return {t: math.log(1 + n) * (2.0 if t in query_terms else 1.0) for t, n in df.items()}
+
+    @staticmethod
+    def head_tail(text, budget):
+        """不做摘要时保留开头约 70% 与结尾约 30%，避免丢掉结论"""
+        tail_budget = budget * 3 // 10
+        head = PromptBudgeter.truncate_to_tokens(text, budget - tail_budget)
+        reversed_tail = PromptBudgeter.truncate_to_tokens(text[::-1], tail_budget)
+        return f"{head}\n…(中间已省略)…\n{reversed_tail[::-1]}"
+
+    def compress(self, model_results, total_budget, per_answer_tokens=0, query=""):
+        """
+        model_results: {模型名: 回答}；total_budget: 所有回答可用的 Token 总数
+        返回 (共有内容段落列表 [(标签, 出处模型列表, 文本)], {模型名: 压缩后的文本}, 报告行列表)
+        """
+        names = sorted(model_results)
+        paragraphs = {name: split_paragraphs(model_results[name] or "") for name in names}
+        tokens = {name: [tokenize(p) for p in paras] for name, paras in paragraphs.items()}
+        report = []
+
+        shared = []
+        texts = {name: list(paras) for name, paras in paragraphs.items()}
+        if self.dedupe and len(names) > 1:
+            clusters = self.find_shared(paragraphs, tokens)
+            saved = 0
+            for c, members in enumerate(clusters):
+                label = f"S{c + 1}"
+                sources = sorted({self.short_name(n) for n, _ in members})
+                # 代表文本取组内最长的一段，保留信息最全的表述
+                rep = max((paragraphs[n][i] for n, i in members), key=len)
+                shared.append((label, sources, rep))
+                for n, i in members:
+                    saved += PromptBudgeter.estimate_tokens(paragraphs[n][i])
+                    texts[n][i] = f"〔同共有内容 {label}〕"
+                saved -= PromptBudgeter.estimate_tokens(rep)
+            if clusters:
+                report.append(f"去重: {len(clusters)} 组段落在多个回答中重复，合并后约节省 {max(0, saved)} tokens")
+
+        shared_tokens = sum(PromptBudgeter.estimate_tokens(t) for _, _, t in shared)
+        budget = max(PromptBudgeter.MIN_KEEP_TOKENS, (total_budget - shared_tokens) // max(1, len(names)))
+        if per_answer_tokens:
+            budget = min(budget, int(per_answer_tokens))
+
+        weights = None
+        out = {}
+        for name in names:
+            text = "\n\n".join(texts[name])
+            cost = PromptBudgeter.estimate_tokens(text)
+            if cost > budget:
+                if self.summarize and len(texts[name]) > 2:
+                    if weights is None:
+                        weights = self.term_weights(tokens, query)
+                    text = "\n\n".join(self.summarize_paragraphs(texts[name], tokens[name], budget, weights))
+                    action = "摘要"
+                else:
+                    text = self.head_tail(text, budget)
+                    action = "截取首尾"
+                report.append(f"{self.short_name(name)}: {action} {cost} → {PromptBudgeter.estimate_tokens(text)} tokens")
+            out[name] = text
+        return shared, out, report
@@ -0,0 +1,84 @@
+from judge_compress import JudgeCompressor
+from prompt_budget import PromptBudgeter
+
+class JudgePrompt:
+    """
+    裁判提示词组装（不依赖 Qt，可单独做基准测试或在无界面环境中使用）
+    """
+    DEFAULT_SYSTEM_PROMPT = "你是一个公正的AI裁判。请对比各模型回答，详细指出它们的优缺点，最后整合生成一个最完美的答案。"
+    # 淘汰赛分组评审：只需选出本组最佳并融合，输出尽量精简，供下一轮继续比较
+    GROUP_SYSTEM_PROMPT = ("你是一个公正的AI裁判，正在进行分组初评。请比较本组各模型的回答，"
+                           "第一行写“胜出：模型名”，随后以胜出回答为基础，补充其他回答中正确且有价值的内容，"
+                           "给出本组的融合答案。不要逐条点评，也不要省略关键细节。")
+    # 各回答高度一致时的简短确认：不再逐一对比，只核对共识并给出最终答案
+    BRIEF_SYSTEM_PROMPT = ("你是一个公正的AI裁判。各模型的回答已高度一致，请不要逐一点评，"
+                           "只需核对共识是否正确，简要指出个别差异（如有），然后给出最终答案。")
+    DEFAULT_PARAMS = {"temperature": 0.2, "max_tokens": 4096}  # 稍微调大token，因为不再是紧凑的json
+    # 关闭压缩时的旧行为：每个回答按字符数截断
+    MAX_CHAR_PER_MODEL = 6000
+    # 裁判输入压缩：跨回答去重 + 每个回答的 Token 预算 + 超长回答抽取式摘要
+    COMPRESSION = {"enabled": True, "dedupe": True, "similarity": 0.7, "per_answer_tokens": 4000, "summarize": True}
+
+    # 思考模型的推理过程默认不交给裁判：它往往比正文长得多，只会占用裁判的输入预算
+    INCLUDE_REASONING = False
+
+    @staticmethod
+    def judge_answer(content, reasoning=None):
+        """选手回答中交给裁判的部分"""
+        if JudgePrompt.INCLUDE_REASONING and reasoning:
+            return f"[推理过程]\n{reasoning}\n\n[正式回答]\n{content}"
+        return content
+
+    @staticmethod
+    def consensus_text(model_name, answer, score):
+        """跳过裁判时展示的共识结论"""
+        return (f"[各模型回答高度一致（一致度 {score:.2f}），未调用裁判]\n"
+                f"以下为最具代表性的回答（出自 {model_name}）：\n\n{answer}")
+
+    @staticmethod
+    def configure_compression(**opts):
+        JudgePrompt.COMPRESSION = dict(JudgePrompt.COMPRESSION, **opts)
+
+    @staticmethod
+    def build_messages(judge_system_prompt, user_prompt, model_results, max_chars=None, judge_model=None,
+                       max_tokens=None, report=None):
+        """
+        返回发送给裁判模型的 messages；model_results 为 {模型名: 回答}
+        开启压缩时，回答总量按裁判模型的上下文窗口（扣除输出预留 max_tokens）分配；report 为列表时追加压缩说明
+        """
+        sections = []
+        opts = JudgePrompt.COMPRESSION
+        if opts.get("enabled", True) and not max_chars:
+            fixed = PromptBudgeter.estimate_tokens(judge_system_prompt) + PromptBudgeter.estimate_tokens(user_prompt) + 200
+            compressor = JudgeCompressor(similarity=opts.get("similarity", 0.7), dedupe=opts.get("dedupe", True),
+                                         summarize=opts.get("summarize", True))
+            shared, texts, lines = compressor.compress(
+                model_results, PromptBudgeter.input_budget(judge_model, max_tokens, fixed),
+                opts.get("per_answer_tokens", 0), query=user_prompt)
+            if report is not None:
+                report.extend(lines)
+            if shared:
+                sections.append("\n=== 多个模型共有的内容（各回答中以〔同共有内容 Sx〕标出） ===\n")
+                for label, sources, text in shared:
+                    sections.append(f"[{label}] 出自 {'、'.join(sources)}：\n{text}\n\n")
+            for name in sorted(texts):
+                sections.append(f"\n=== 模型 [{name}] 的回答 ===\n{texts[name]}\n")
+        else:
+            max_chars = max_chars or JudgePrompt.MAX_CHAR_PER_MODEL
+            # 按模型名排序：提示词与到达顺序无关，便于缓存与磁带回放命中
+            for name, text in sorted(model_results.items()):
+                if len(text) > max_chars:
+                    display_text = text[:max_chars] + "\n...(已截断)..."
+                else:
+                    display_text = text
+                sections.append(f"\n=== 模型 [{name}] 的回答 ===\n{display_text}\n")
+
+        final_user_content = (
+            f"用户原始问题：\n{user_prompt}\n\n"
+            f"以下是各参赛模型的回答，请根据 System Prompt 的要求进行评审、对比优缺点，并给出一个最佳的融合答案：\n"
+            f"{''.join(sections)}"
+        )
+        return [
+            {"role": "system", "content": judge_system_prompt},
+            {"role": "user", "content": final_user_content}
+        ]
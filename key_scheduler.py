@@ -0,0 +1,207 @@
+import time
+import random
+import threading
+from prompt_budget import PromptBudgeter
+
+class TokenBucket:
+    """令牌桶：按 rate_per_sec 匀速补充，最多存 capacity 个"""
+    def __init__(self, rate_per_sec, capacity):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount, now):
+        """还需等待多少秒才能取出 amount 个令牌（超过容量的按容量计）"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount  # 允许透支，后续请求自然等待
+
+    def set_limit(self, per_minute):
+        """调整速率（每分钟），保持当前存量不超过新容量"""
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = min(self.tokens, self.capacity)
+
+
+class KeyScheduler:
+    """
+    多 API Key 调度：在所有已配置的 Key 之间分摊选手与裁判请求
+    - 每个 Key 维护请求数 (RPM) 与 Token 数 (TPM) 两个令牌桶
+    - 收到 429 时按 Retry-After 冷却该 Key，并下调其学习到的速率上限；TPM 桶按接口返回的实际用量修正
+    - 401/402（Key 失效或余额不足）时长时间移出轮换；403 可能只针对某个模型，只对该模型移出
+    - 最后一个可用的 Key 不移出轮换：此时等待没有意义，请求直接返回鉴权错误
+    """
+    EXHAUSTED_COOLDOWN = 600.0
+    DEFAULT_RATE_LIMIT_COOLDOWN = 20.0
+
+    def __init__(self, keys=None, rpm=1000, tpm=50000):
+        self.default_rpm = rpm
+        self.default_tpm = tpm
+        self._lock = threading.Lock()
+        self._states = {}
+        self._order = []
+        self.set_keys(keys or [])
+
+    def _new_state(self):
+        return {
+            "rpm": self.default_rpm,
+            "tpm": self.default_tpm,
+            "req_bucket": TokenBucket(self.default_rpm / 60.0, self.default_rpm),
+            "tok_bucket": TokenBucket(self.default_tpm / 60.0, self.default_tpm),
+            "cooldown_until": 0.0,     # 429 冷却
+            "exhausted_until": 0.0,    # 401/402：整个 Key 移出轮换
+            "model_blocked": {},       # 403：模型名 -> 移出轮换截止时刻
+            "inflight": 0
+        }
+
+    @staticmethod
+    def _usable(st, model, now):
+        return st["exhausted_until"] <= now and st["model_blocked"].get(model, 0.0) <= now
+
+    def set_keys(self, keys):
+        """更新 Key 列表；已有 Key 的学习状态保留"""
+        with self._lock:
+            keys = [k for k in keys if k]
+            self._states = {k: self._states.get(k) or self._new_state() for k in keys}
+            self._order = keys
+
+    def keys(self):
+        with self._lock:
+            return list(self._order)
+
+    @staticmethod
+    def estimate_tokens(payload):
+        """粗略估计一次请求消耗的 Token（输入本地估算，输出按 max_tokens 的一半计）"""
+        tokens = 0
+        for msg in payload.get("messages", []):
+            content = msg.get("content")
+            if isinstance(content, str):
+                tokens += PromptBudgeter.estimate_tokens(content)
+            elif isinstance(content, list):
+                for item in content:
+                    if item.get("type") == "text":
+                        tokens += PromptBudgeter.estimate_tokens(item.get("text", ""))
+                    else:
+                        tokens += 1000  # 图片按固定开销估算
+        return tokens + min(int(payload.get("max_tokens") or 1024), 2048) // 2
+
+    def acquire(self, estimated_tokens=0, max_wait=60.0, cancel_check=None, model=None):
+        """
+        选出一个可用的 Key 并扣减配额；所有 Key 都受限时等待最近的可用时刻
+        已失效（对 model 失效）的 Key 不参与选择，也不为它们等待
+        超过 max_wait 仍不可用则返回等待时间最短的 Key；没有 Key 时返回 None
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                if not self._order:
+                    return None
+                now = time.monotonic()
+                best_key, best_wait = None, None
+                # 全部失效时仍返回一个 Key，由接口直接给出鉴权错误
+                candidates = [k for k in self._order if self._usable(self._states[k], model, now)] or list(self._order)
+                random.shuffle(candidates)  # 同等条件下随机，避免总是压在第一个 Key 上
+                for key in candidates:
+                    st = self._states[key]
+                    wait = max(
+                        st["cooldown_until"] - now,
+                        st["req_bucket"].wait_time(1, now),
+                        st["tok_bucket"].wait_time(estimated_tokens, now)
+                    )
+                    if (best_wait is None or wait < best_wait
+                            or (wait == best_wait and st["inflight"] < self._states[best_key]["inflight"])):
+                        best_key, best_wait = key, wait
+                if best_wait <= 0 or now >= deadline:
+                    st = self._states[best_key]
+                    st["req_bucket"].consume(1, now)
+                    st["tok_bucket"].consume(estimated_tokens, now)
+                    st["inflight"] += 1
+                    return best_key
+                sleep_for = min(best_wait, deadline - now, 1.0)
+            if cancel_check and cancel_check():
+                return None
+            time.sleep(max(0.01, sleep_for))
+
+    def release(self, key, used_tokens=None, estimated_tokens=0):
+        """请求结束：归还并发计数，并用实际用量修正 Token 桶"""
+        with self._lock:
+            st = self._states.get(key)
+            if not st:
+                return
+            st["inflight"] = max(0, st["inflight"] - 1)
+            if used_tokens is not None:
+                st["tok_bucket"].consume(used_tokens - estimated_tokens, time.monotonic())
+
+    def report_success(self, key):
+        """成功后缓慢恢复被下调的速率 (加性增)"""
+        with self._lock:
+            st = self._states.get(key)
+            if not st:
+                return
+            if st["rpm"] < self.default_rpm:
+                st["rpm"] = min(self.default_rpm, st["rpm"] + 1)
+                st["req_bucket"].set_limit(st["rpm"])
+            if st["tpm"] < self.default_tpm:
+                st["tpm"] = min(self.default_tpm, st["tpm"] + max(1, self.default_tpm // 100))
+                st["tok_bucket"].set_limit(st["tpm"])
+
+    def report_rate_limited(self, key, retry_after=None):
+        """429：冷却该 Key，并将其 RPM 上限下调到 80% (乘性减)"""
+        with self._lock:
+            st = self._states.get(key)
+            if not st:
+                return
+            cooldown = retry_after if retry_after is not None else self.DEFAULT_RATE_LIMIT_COOLDOWN
+            st["cooldown_until"] = max(st["cooldown_until"], time.monotonic() + cooldown)
+            st["rpm"] = max(1, int(st["rpm"] * 0.8))
+            st["req_bucket"].set_limit(st["rpm"])
+            # Token 桶已接近用尽时，限流更可能来自 TPM：同样下调学习到的 TPM 上限
+            if st["tok_bucket"].tokens < st["tok_bucket"].capacity * 0.2:
+                st["tpm"] = max(1000, int(st["tpm"] * 0.8))
+                st["tok_bucket"].set_limit(st["tpm"])
+
+    def report_exhausted(self, key, model=None):
+        """
+        Key 无效或余额不足：较长时间移出轮换；给出 model 时（403）只对该模型移出
+        该 Key 是最后一个可用的 Key 时保持不变并返回 False，调用方应直接返回错误而不是换 Key 重试
+        """
+        with self._lock:
+            st = self._states.get(key)
+            if not st:
+                return False
+            now = time.monotonic()
+            others = [k for k in self._order if k != key and self._usable(self._states[k], model, now)]
+            if not others:
+                return False
+            if model:
+                st["model_blocked"][model] = now + self.EXHAUSTED_COOLDOWN
+            else:
+                st["exhausted_until"] = now + self.EXHAUSTED_COOLDOWN
+            return True
+
+    def snapshot(self):
+        """各 Key 当前状态，供界面展示"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                key: {
+                    "rpm": st["rpm"],
+                    "inflight": st["inflight"],
+                    "tpm": st["tpm"],
+                    "cooldown": max(0.0, st["cooldown_until"] - now, st["exhausted_until"] - now)
+                }
+                for key, st in self._states.items()
+            }
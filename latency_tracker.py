@@ -0,0 +1,123 @@
+import os
+import json
+import threading
+from collections import deque
+
+class LatencyTracker:
+    """
+    按模型记录历史延迟（首字节时间 TTFB 与总耗时），并据此给出：
+    - 自适应超时：按历史高分位数设置每个模型的读超时，而不是统一 300 秒
+    - 对冲阈值：超过 p95 首字节时间仍无响应时发起对冲请求
+    样本不足时返回默认值；可选持久化到 JSON 文件，跨会话累积
+    """
+    MAX_SAMPLES = 200
+    MIN_SAMPLES = 10            # 样本数不足时不做自适应
+    DEFAULT_TIMEOUT = 300.0
+    MIN_TIMEOUT = 30.0
+    MAX_TIMEOUT = 600.0
+    TIMEOUT_FACTOR = 2.0        # 超时 = 高分位数 × 系数
+    SAVE_EVERY = 10
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._samples = {}      # model -> {"ttfb": deque, "total": deque}
+        self._path = None
+        self._unsaved = 0
+        if path:
+            self.configure(path)
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def configure(self, path):
+        """设置持久化文件并载入已有样本"""
+        self._path = path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"延迟历史加载失败: {e}")
+            return
+        with self._lock:
+            for model, metrics in data.items():
+                entry = self._entry(model)
+                for metric in ("ttfb", "total"):
+                    entry[metric].extend(float(v) for v in metrics.get(metric, []))
+
+    def _entry(self, model):
+        entry = self._samples.get(model)
+        if entry is None:
+            entry = {"ttfb": deque(maxlen=self.MAX_SAMPLES), "total": deque(maxlen=self.MAX_SAMPLES)}
+            self._samples[model] = entry
+        return entry
+
+    def record(self, model, ttfb, total):
+        with self._lock:
+            entry = self._entry(model)
+            if ttfb is not None:
+                entry["ttfb"].append(float(ttfb))
+            if total is not None:
+                entry["total"].append(float(total))
+            self._unsaved += 1
+            need_save = self._path and self._unsaved >= self.SAVE_EVERY
+        if need_save:
+            self.save()
+
+    def percentile(self, model, metric, p):
+        """返回 p 分位数 (0-100)；样本不足时返回 None"""
+        with self._lock:
+            entry = self._samples.get(model)
+            values = sorted(entry[metric]) if entry else []
+        if len(values) < self.MIN_SAMPLES:
+            return None
+        k = (len(values) - 1) * p / 100.0
+        lo = int(k)
+        hi = min(lo + 1, len(values) - 1)
+        return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+    def timeout_for(self, model, stream=False):
+        """
+        该模型的读超时：流式看首字节 p99，非流式看总耗时 p99
+        （流式时服务端持续推送，读超时只需覆盖首字节等待）
+        """
+        p99 = self.percentile(model, "ttfb" if stream else "total", 99)
+        if p99 is None:
+            return self.DEFAULT_TIMEOUT
+        return min(self.MAX_TIMEOUT, max(self.MIN_TIMEOUT, p99 * self.TIMEOUT_FACTOR))
+
+    def hedge_delay(self, model):
+        """超过该时间仍无首字节则发起对冲请求；样本不足返回 None（不对冲）"""
+        return self.percentile(model, "ttfb", 95)
+
+    def summary(self, model):
+        return {
+            "samples": len(self._samples.get(model, {}).get("total", [])),
+            "ttfb_p50": self.percentile(model, "ttfb", 50),
+            "ttfb_p95": self.percentile(model, "ttfb", 95),
+            "total_p50": self.percentile(model, "total", 50),
+            "total_p95": self.percentile(model, "total", 95),
+        }
+
+    def save(self):
+        if not self._path:
+            return
+        with self._lock:
+            data = {m: {k: list(v) for k, v in e.items()} for m, e in self._samples.items()}
+            self._unsaved = 0
+        tmp_path = f"{self._path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            print(f"延迟历史保存失败: {e}")
@@ -1,10 +1,25 @@
-import requests
 import json
 import base64
+import io
 import os
 import mimetypes
+import hashlib
 import time  # 【新增】用于重试延迟
+import threading
 from requests.exceptions import RequestException, Timeout, ConnectionError # 【新增】捕获异常
+from http_session import HttpSessionPool
+from attachment_cache import AttachmentCache
+from response_cache import ResponseCache
+from retry_policy import RetryPolicy, CircuitBreaker
+from key_scheduler import KeyScheduler
+from prompt_budget import PromptBudgeter
+from retrieval import BM25Index, iter_file_chunks, chunk_text
+from cancel_token import CancelToken, abort_response
+from latency_tracker import LatencyTracker
+from telemetry import Telemetry, normalize_usage
+from tracing import Tracer, traced
+from cassette import Cassette
+from reasoning import split_think, ThinkStreamSplitter
 
 # 仅尝试导入 docx 解析库，移除 pypdf, pandas, pptx
 try:
@@ -13,10 +28,194 @@ try:
 except ImportError:
     HAS_DOCX = False
 
+# 可选：Pillow 用于上传前压缩图片，缺失时按原图上传
+try:
+    from PIL import Image, ImageOps
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
 class LLMClient:
-    BASE_URL = "https://api.siliconflow.cn/v1/chat/completions"
+    DEFAULT_BASE_URL = "https://api.siliconflow.cn/v1/chat/completions"
+    BASE_URL = DEFAULT_BASE_URL
+    TIMEOUT_SECONDS = 300  # 单次请求超时 (5分钟)
+    IMAGE_TOKEN_ESTIMATE = 1000  # 上下文预算中每张图片的估算开销
+    CANCELLED_RESULT = {"error": "请求已取消", "cancelled": True}
+    CONNECT_TIMEOUT = 10
+    ADAPTIVE_TIMEOUTS = True   # 按历史延迟为每个模型设置读超时
+    HEDGING_ENABLED = True     # 超过 p95 首字节时间仍无响应时发起对冲请求
+    # 只属于某一次调用的字段：不写入回答缓存，命中缓存时也不沿用
+    PER_CALL_FIELDS = ("metrics", "usage", "cached", "cached_usage", "hedged", "hedge_winner", "budget_report",
+                       "cancelled")
+    # 允许透传给接口的采样参数；其余字段（stream、messages 等）只能由客户端自己构造
+    SAMPLING_PARAMS = ("temperature", "top_p", "max_tokens", "frequency_penalty")
+
+    # 共享的重试策略与按模型熔断器
+    RETRY_POLICY = RetryPolicy(max_retries=3, base_delay=1.0, max_delay=30.0)
+    CIRCUIT_BREAKER = CircuitBreaker(failure_threshold=3, cooldown_seconds=60.0)
+
+    # 图片上传前的预处理参数 (见 configure_images)
+    IMAGE_OPTIONS = {
+        "max_edge": 2048,          # 最长边像素，超过则等比缩小
+        "quality": 85,             # JPEG/WebP 初始质量
+        "format": "JPEG",          # 重新编码格式: JPEG / WEBP
+        "max_bytes": 1536 * 1024   # 单张图片编码后的字节上限
+    }
+
+    # 大文本附件的检索模式：分块建 BM25 索引，只发送与问题最相关的 top_k 块
+    RETRIEVAL_OPTIONS = {
+        "enabled": True,
+        "min_chars": 30000,     # 文本附件超过该大小 (字节) 才启用检索
+        "chunk_chars": 1500,
+        "top_k": 8
+    }
+    RETRIEVAL_EXTS = ('.txt', '.md', '.py', '.docx')
+
+    @staticmethod
+    def configure_endpoint(base_url=None):
+        """
+        设置 chat/completions 接口地址（本地模拟服务、代理或其他兼容服务），为空时恢复 SiliconFlow
+        只给出 ".../v1" 之类的前缀时自动补全 "/chat/completions"
+        """
+        url = (base_url or "").strip().rstrip("/")
+        if not url:
+            url = LLMClient.DEFAULT_BASE_URL
+        elif not url.endswith("/chat/completions"):
+            url += "/chat/completions"
+        LLMClient.BASE_URL = url
+        return url
+
+    @staticmethod
+    def configure_retrieval(enabled=None, min_chars=None, chunk_chars=None, top_k=None):
+        opts = dict(LLMClient.RETRIEVAL_OPTIONS)
+        if enabled is not None: opts["enabled"] = bool(enabled)
+        if min_chars is not None: opts["min_chars"] = max(1000, int(min_chars))
+        if chunk_chars is not None: opts["chunk_chars"] = max(200, int(chunk_chars))
+        if top_k is not None: opts["top_k"] = max(1, int(top_k))
+        LLMClient.RETRIEVAL_OPTIONS = opts
+
+    @staticmethod
+    def use_retrieval(fpath):
+        """是否对该附件使用检索模式（.docx 一律建索引，短文档会被原样完整返回）"""
+        opts = LLMClient.RETRIEVAL_OPTIONS
+        ext = os.path.splitext(fpath)[1].lower()
+        if not opts["enabled"] or ext not in LLMClient.RETRIEVAL_EXTS:
+            return False
+        if ext == '.docx':
+            return True
+        try:
+            return os.path.getsize(fpath) >= opts["min_chars"]
+        except OSError:
+            return False
+
+    @staticmethod
+    @traced("attachment.build_index")
+    def build_retrieval_index(fpath):
+        """分块并建立 BM25 索引，结果供 AttachmentCache 缓存（多个选手共享）"""
+        if not os.path.exists(fpath): return None
+        chunk_chars = LLMClient.RETRIEVAL_OPTIONS["chunk_chars"]
+        ext = os.path.splitext(fpath)[1].lower()
+        if ext == '.docx':
+            chunks = chunk_text(LLMClient.parse_document(fpath), chunk_chars)
+        else:
+            chunks = iter_file_chunks(fpath, chunk_chars)
+        index = BM25Index(chunks)
+        return {
+            "kind": "index",
+            "name": os.path.basename(fpath),
+            "is_doc": ext == '.docx',
+            "digest": AttachmentCache.file_digest(fpath),
+            "index": index,
+            "nbytes": index.size_bytes()
+        }
+
+    @staticmethod
+    def retrieve_attachment(entry, query):
+        """按问题从索引中取出最相关的块，拼成附件文本；文档较短时原样返回全文"""
+        opts = LLMClient.RETRIEVAL_OPTIONS
+        index = entry["index"]
+        label = "附件文档" if entry["is_doc"] else "附件文本"
+        total_chars = sum(len(c) for c in index.chunks)
+        if total_chars < opts["min_chars"]:
+            return f"\n\n[{label}: {entry['name']}]:\n{''.join(index.chunks).strip()}"
+        picked = index.top_k(query, opts["top_k"])
+        body = "\n...\n".join(f"[第 {i + 1} 段]\n{index.chunks[i].strip()}" for i in picked)
+        return (f"\n\n[{label}: {entry['name']}] (检索模式：全文共 {index.n_docs} 段，"
+                f"以下为与问题最相关的 {len(picked)} 段):\n{body}")
+
+    @staticmethod
+    def configure_images(max_edge=None, quality=None, fmt=None, max_bytes=None):
+        """更新图片压缩参数；参数变化后缓存键随之变化，旧结果自然失效"""
+        opts = dict(LLMClient.IMAGE_OPTIONS)
+        if max_edge is not None: opts["max_edge"] = max(64, int(max_edge))
+        if quality is not None: opts["quality"] = min(95, max(20, int(quality)))
+        if fmt: opts["format"] = "WEBP" if str(fmt).upper() == "WEBP" else "JPEG"
+        if max_bytes is not None: opts["max_bytes"] = max(16 * 1024, int(max_bytes))
+        LLMClient.IMAGE_OPTIONS = opts
+
+    @staticmethod
+    def image_options_key():
+        o = LLMClient.IMAGE_OPTIONS
+        return f"{o['max_edge']}|{o['quality']}|{o['format']}|{o['max_bytes']}"
 
     @staticmethod
+    @traced("image.compress")
+    def compress_image(raw, mime_type, options=None):
+        """
+        缩放并重新编码图片，返回 (bytes, mime_type)
+        原图已足够小、不支持的格式或未安装 Pillow 时原样返回
+        """
+        if not HAS_PIL:
+            return raw, mime_type
+        opts = options or LLMClient.IMAGE_OPTIONS
+        max_edge, max_bytes = opts["max_edge"], opts["max_bytes"]
+        fmt = opts["format"]
+        out_mime = "image/webp" if fmt == "WEBP" else "image/jpeg"
+
+        try:
+            img = Image.open(io.BytesIO(raw))
+            if getattr(img, "is_animated", False):
+                return raw, mime_type  # 动图保持原样
+            if max(img.size) <= max_edge and len(raw) <= max_bytes:
+                return raw, mime_type  # 无需处理，避免二次有损压缩
+
+            img = ImageOps.exif_transpose(img)
+            if max(img.size) > max_edge:
+                img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            # JPEG 不支持透明通道：铺白底
+            if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                rgba = img.convert("RGBA")
+                bg = Image.new("RGB", rgba.size, (255, 255, 255))
+                bg.paste(rgba, mask=rgba.split()[-1])
+                img = bg
+            elif img.mode not in ("RGB", "RGBA", "L"):
+                img = img.convert("RGBA")
+
+            # 先降质量，仍超限再逐步缩小尺寸
+            quality = opts["quality"]
+            while True:
+                buf = io.BytesIO()
+                img.save(buf, format=fmt, quality=quality, optimize=True)
+                data = buf.getvalue()
+                if len(data) <= max_bytes:
+                    break
+                if quality > 50:
+                    quality -= 10
+                    continue
+                if max(img.size) <= 256:
+                    break
+                img = img.resize((max(1, int(img.width * 0.75)), max(1, int(img.height * 0.75))), Image.LANCZOS)
+
+            if len(data) >= len(raw):
+                return raw, mime_type
+            return data, out_mime
+        except Exception as e:
+            print(f"图片压缩失败，按原图上传: {e}")
+            return raw, mime_type
+
+    @staticmethod
+    @traced("image.encode_base64")
     def encode_image(image_path):
         """将图片文件转换为 Base64 字符串"""
         if not os.path.exists(image_path):
@@ -25,6 +224,7 @@ class LLMClient:
             return base64.b64encode(image_file.read()).decode('utf-8')
 
     @staticmethod
+    @traced("document.parse")
     def parse_document(file_path):
         """
         解析本地文档为纯文本
@@ -47,22 +247,179 @@ class LLMClient:
             return f"[文件解析失败: {str(e)}]"
 
     @staticmethod
-    def chat_completion(api_key, model_name, messages, file_paths=None, vision_models=None, **kwargs):
+    @traced("attachment.prepare")
+    def prepare_attachment(fpath):
         """
-        发送请求到 SiliconFlow API
+        预处理单个附件（读取 / Base64 编码 / 文档解析），结果供 AttachmentCache 缓存
+        返回 {"kind": "image"|"text", "name", "digest", "data_url" 或 "text"}
         """
-        if not api_key:
-            return {"error": "API Key 未设置。"}
+        if not os.path.exists(fpath): return None
+        
+        # 猜测 MIME 类型
+        mime_type, _ = mimetypes.guess_type(fpath)
+        if not mime_type: mime_type = "application/octet-stream"
+        ext = os.path.splitext(fpath)[1].lower()
+        fname = os.path.basename(fpath)
+        Tracer.annotate(file=fname, mime=mime_type)
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
+        # A. 图片处理 (SiliconFlow 原生支持)
+        if mime_type.startswith('image/'):
+            with open(fpath, "rb") as image_file:
+                raw = image_file.read()
+            # 上传前缩放/重新编码，显著减小请求体
+            raw, mime_type = LLMClient.compress_image(raw, mime_type)
+            with Tracer.span("image.encode_base64", bytes=len(raw)):
+                b64 = base64.b64encode(raw).decode('utf-8')
+            return {
+                "kind": "image",
+                "name": fname,
+                "digest": hashlib.sha256(raw).hexdigest(),
+                "data_url": f"data:{mime_type};base64,{b64}"
+            }
+        
+        # B. Word 文档处理 (本地解析)
+        if ext == '.docx':
+            parsed_text = LLMClient.parse_document(fpath)
+            return {
+                "kind": "text",
+                "name": fname,
+                "digest": AttachmentCache.file_digest(fpath),
+                "text": f"\n\n[附件文档: {fname}]:\n{parsed_text}"
+            }
+        
+        # C. 纯文本处理 (代码、TXT、Markdown等)
+        try:
+            with open(fpath, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return {
+                "kind": "text", "name": fname, "digest": "",
+                "text": f"\n\n[系统提示: 文件 {fname} 无法读取(非文本或编码不支持)]"
+            }
+        # 尝试以 UTF-8 解码，失败则退回 Latin-1
+        try:
+            raw_text = raw.decode('utf-8')
+        except UnicodeDecodeError:
+            raw_text = raw.decode('latin-1')
+        raw_text = raw_text.replace('\r\n', '\n').replace('\r', '\n')
+        return {
+            "kind": "text",
+            "name": fname,
+            "digest": hashlib.sha256(raw).hexdigest(),
+            "text": f"\n\n[附件文本: {fname}]:\n{raw_text}"
         }
 
+    @staticmethod
+    def iter_sse_chunks(response):
+        """
+        逐条解析 SSE 流 (data: {...})，遇到 [DONE] 结束
+        SSE 固定为 UTF-8：按字节读取后自行解码，避免响应头未声明 charset 时被 requests 按 ISO-8859-1 解码
+        """
+        for raw_line in response.iter_lines():
+            if not raw_line:
+                continue
+            if isinstance(raw_line, bytes):
+                raw_line = raw_line.decode('utf-8', errors='replace')
+            if not raw_line.startswith("data:"):
+                continue
+            data_str = raw_line[5:].strip()
+            if data_str == "[DONE]":
+                break
+            try:
+                yield json.loads(data_str)
+            except ValueError:
+                continue
+
+    @staticmethod
+    @traced("llm.read_stream")
+    def read_stream(response, on_delta=None, cancel_token=None, on_first_chunk=None, stats=None):
+        """
+        读取流式响应，逐段回调 on_delta(text)，返回拼接后的完整内容
+        推理内容（reasoning_content 字段与开头的 <think> 块）不回调 on_delta，单独放在结果的 "reasoning" 中
+        cancel_token 被取消时立即断开连接并返回取消结果；收到首个数据块时回调 on_first_chunk()
+        stats 不为空时写入接口返回的 usage 与推理内容的估算 Token 数
+        """
+        parts = []
+        reasoning_parts = []
+        splitter = ThinkStreamSplitter()
+        for chunk in LLMClient.iter_sse_chunks(response):
+            if on_first_chunk:
+                on_first_chunk()
+                on_first_chunk = None
+            if cancel_token and cancel_token.cancelled:
+                return dict(LLMClient.CANCELLED_RESULT)
+            if 'error' in chunk:
+                return {"error": f"流式响应异常: {chunk['error']}"}
+            if stats is not None and chunk.get('usage'):
+                stats["usage"] = chunk['usage']  # 用量通常在最后一个数据块中给出
+            choices = chunk.get('choices') or []
+            if not choices:
+                continue
+            delta = choices[0].get('delta') or {}
+            if delta.get('reasoning_content'):
+                reasoning_parts.append(delta['reasoning_content'])
+                splitter.mark_reasoning_model()
+            text = delta.get('content')
+            if text:
+                parts.append(text)
+                visible = splitter.feed(text)
+                if visible and on_delta:
+                    on_delta(visible)
+        if cancel_token and cancel_token.cancelled:
+            return dict(LLMClient.CANCELLED_RESULT)
+        tail = splitter.flush()
+        if tail and on_delta:
+            on_delta(tail)
+        return LLMClient.make_result("".join(parts), "".join(reasoning_parts), stats, splitter.reasoning_model)
+
+    @staticmethod
+    def make_result(content, reasoning_content="", stats=None, reasoning_model=False):
+        """
+        正文与推理分开存放：reasoning_content 字段加上正文开头的 <think> 块
+        reasoning_model: 接口表明是推理模型时，正文中只有闭标签的 ...</think> 也作为推理分隔（见 split_think）
+        """
+        content, think = split_think(content or "", reasoning_model)
+        reasoning = "\n\n".join(r for r in (reasoning_content.strip(), think) if r)
+        if stats is not None:
+            stats["reasoning_text_tokens"] = PromptBudgeter.estimate_tokens(reasoning)
+        result = {"content": content}
+        if reasoning:
+            result["reasoning"] = reasoning
+        return result
+
+    @staticmethod
+    def cache_key_messages(messages, image_digests):
+        """缓存键用的消息副本：图片的 Base64 数据替换为其内容摘要"""
+        digests = iter(image_digests)
+        key_messages = []
+        for msg in messages:
+            content = msg.get('content')
+            if isinstance(content, list):
+                parts = []
+                for item in content:
+                    if item.get('type') == 'image_url':
+                        parts.append({"type": "image_url", "digest": next(digests, "")})
+                    else:
+                        parts.append(item)
+                msg = {"role": msg.get('role'), "content": parts}
+            key_messages.append(msg)
+        return key_messages
+
+    @staticmethod
+    @traced("llm.build_messages")
+    def build_messages(model_name, messages, file_paths=None, vision_models=None, search_context="",
+                       max_tokens=None):
+        """
+        组装发送给模型的消息：附件预处理（走 AttachmentCache）、视觉能力检查、上下文预算裁剪
+        返回 (final_messages, image_digests, budget_report)；不涉及网络，可单独用于基准测试
+        """
         final_messages = messages
+        image_digests = []
         
-        # --- 处理多文件逻辑 ---
-        if file_paths and isinstance(file_paths, list) and len(file_paths) > 0:
+        # --- 处理多文件 / 联网搜索资料 ---
+        has_files = bool(file_paths and isinstance(file_paths, list) and len(file_paths) > 0)
+        budget_report = []
+        if has_files or search_context:
             user_content_str = ""
             # 获取用户输入的文本内容
             if isinstance(messages[0]['content'], str):
@@ -74,47 +431,33 @@ class LLMClient:
             
             text_attachments = []
             image_objects = []
+            image_digests = []
 
-            for fpath in file_paths:
-                if not os.path.exists(fpath): continue
-                
-                # 猜测 MIME 类型
-                mime_type, _ = mimetypes.guess_type(fpath)
-                if not mime_type: mime_type = "application/octet-stream"
-                ext = os.path.splitext(fpath)[1].lower()
-                fname = os.path.basename(fpath)
-
-                # A. 图片处理 (SiliconFlow 原生支持)
-                if mime_type.startswith('image/'):
-                    b64 = LLMClient.encode_image(fpath)
-                    if b64:
-                        image_objects.append({
-                            "type": "image_url",
-                            "image_url": {"url": f"data:{mime_type};base64,{b64}"}
-                        })
-                
-                # B. Word 文档处理 (本地解析)
-                elif ext == '.docx':
-                    parsed_text = LLMClient.parse_document(fpath)
-                    text_attachments.append(f"\n\n[附件文档: {fname}]:\n{parsed_text}")
-                
-                # C. 纯文本处理 (代码、TXT、Markdown等)
-                else: 
-                    # 尝试以 UTF-8 读取
-                    try:
-                        with open(fpath, 'r', encoding='utf-8') as f:
-                            raw_text = f.read()
-                        text_attachments.append(f"\n\n[附件文本: {fname}]:\n{raw_text}")
-                    except:
-                        # 尝试 Latin-1 或跳过
-                        try:
-                            with open(fpath, 'r', encoding='latin-1') as f:
-                                raw_text = f.read()
-                            text_attachments.append(f"\n\n[附件文本: {fname}]:\n{raw_text}")
-                        except:
-                            text_attachments.append(f"\n\n[系统提示: 文件 {fname} 无法读取(非文本或编码不支持)]")
-
-            full_text_prompt = user_content_str + "".join(text_attachments)
+            for fpath in (file_paths if has_files else []):
+                # 大文本附件：检索模式，只取与问题相关的片段
+                if LLMClient.use_retrieval(fpath):
+                    opts = LLMClient.RETRIEVAL_OPTIONS
+                    entry = AttachmentCache.get_or_prepare(
+                        fpath, LLMClient.build_retrieval_index, variant=f"bm25|{opts['chunk_chars']}")
+                    if entry is None: continue
+                    text_attachments.append({
+                        "name": entry["name"],
+                        "digest": entry["digest"],
+                        "text": LLMClient.retrieve_attachment(entry, user_content_str)
+                    })
+                    continue
+                # 同一附件在多个选手间只预处理一次，文件未变化时跨轮次复用
+                attachment = AttachmentCache.get_or_prepare(
+                    fpath, LLMClient.prepare_attachment, variant=LLMClient.image_options_key())
+                if attachment is None: continue
+                if attachment["kind"] == "image":
+                    image_objects.append({
+                        "type": "image_url",
+                        "image_url": {"url": attachment["data_url"]}
+                    })
+                    image_digests.append(attachment["digest"])
+                else:
+                    text_attachments.append(attachment)
 
             # --- 模型视觉能力检查 ---
             is_vision_supported = False
@@ -123,6 +466,18 @@ class LLMClient:
                     if v_model in model_name: 
                         is_vision_supported = True
                         break
+
+            # --- 上下文预算：超出模型窗口时按优先级截断/省略 (附件 < 搜索资料 < 用户问题) ---
+            parts = [{"name": "用户问题", "text": user_content_str, "priority": 3}]
+            if search_context:
+                parts.append({"name": "联网搜索资料",
+                              "text": f"\n\n【联网搜索参考资料】\n{search_context}", "priority": 2})
+            for att in text_attachments:
+                parts.append({"name": f"附件 {att['name']}", "text": att["text"], "priority": 1})
+            image_tokens = LLMClient.IMAGE_TOKEN_ESTIMATE * len(image_objects) if is_vision_supported else 0
+            budget = PromptBudgeter.input_budget(model_name, max_tokens, image_tokens)
+            texts, budget_report = PromptBudgeter.fit(parts, budget)
+            full_text_prompt = "".join(texts)
             
             # 构造最终的消息体
             if is_vision_supported and len(image_objects) > 0:
@@ -134,54 +489,385 @@ class LLMClient:
                 if len(image_objects) > 0 and not is_vision_supported:
                     full_text_prompt += "\n\n[系统提示: 检测到图片附件，但当前模型不支持视觉输入，已自动忽略图片。]"
                 final_messages = [{"role": "user", "content": full_text_prompt}]
+        return final_messages, image_digests, budget_report
+
+    @staticmethod
+    @traced("llm.chat_completion")
+    def chat_completion(api_key, model_name, messages, file_paths=None, vision_models=None,
+                        stream=False, on_delta=None, use_cache=True, key_scheduler=None,
+                        search_context="", cancel_token=None, labels=None, **kwargs):
+        """
+        发送请求到 SiliconFlow API
+        stream=True 时按 SSE 流式读取，每收到一段文本即回调 on_delta(text)；
+        两种模式的返回值格式一致
+        use_cache=False 时跳过磁盘回答缓存（本次既不读也不写）
+        key_scheduler 不为空时，每次尝试从调度器取 Key（多 Key 分摊限流），api_key 仅作后备
+        search_context 为联网搜索资料，与附件一起参与上下文预算；被裁剪的内容记录在返回值的 "budget_report" 中
+        cancel_token 不为空时请求可被真正取消：底层改用流式读取，取消时断开连接，服务端随之停止生成
+        返回值的 "usage" / "metrics" 为本次调用的 Token 用量与延迟，同时记入 Telemetry（附带 labels 标签）
+        """
+        if not api_key and not (key_scheduler and key_scheduler.keys()):
+            return {"error": "API Key 未设置。"}
+        call_started = time.monotonic()
+        Tracer.annotate(model=model_name, stream=bool(stream), files=len(file_paths or []))
+
+        final_messages, image_digests, budget_report = LLMClient.build_messages(
+            model_name, messages, file_paths, vision_models, search_context, kwargs.get("max_tokens"))
 
         payload = {
             "model": model_name,
             "messages": final_messages,
-            "stream": False
+            "stream": bool(stream)
         }
 
-        allowed_params = ["temperature", "top_p", "max_tokens", "frequency_penalty"]
         for key, value in kwargs.items():
-            if key in allowed_params and value is not None:
+            if key in LLMClient.SAMPLING_PARAMS and value is not None:
                 if key == "max_tokens":
                     payload[key] = int(value)
                 else:
                     payload[key] = value
 
-        # 【修改重点】增加重试机制和延长超时时间
-        MAX_RETRIES = 2  # 最大重试次数
-        TIMEOUT_SECONDS = 300  # 超时时间设置为 300秒 (5分钟)
+        # --- 回答缓存：输入完全相同时直接复用 ---
+        cache_key = None
+        if use_cache and ResponseCache.is_enabled():
+            sent_params = {k: v for k, v in payload.items() if k not in ("messages", "stream")}
+            cache_key = ResponseCache.make_key(
+                model_name, LLMClient.cache_key_messages(final_messages, image_digests),
+                image_digests, sent_params, endpoint=LLMClient.BASE_URL)
+            with Tracer.span("cache.lookup"):
+                cached = ResponseCache.get(cache_key)
+            if cached and cached.get("content"):
+                result = {k: v for k, v in cached.items() if k not in LLMClient.PER_CALL_FIELDS}
+                # 早期缓存的回答可能仍带有 <think> 块
+                result.update(LLMClient.make_result(cached["content"], cached.get("reasoning", "")))
+                if stream and on_delta:
+                    on_delta(result["content"])
+                result["cached"] = True
+                if budget_report:
+                    result["budget_report"] = budget_report
+                elapsed = time.monotonic() - call_started
+                stats = {"usage": cached.get("usage"), "payload_bytes": 0, "retries": 0,
+                         "first_byte_at": call_started + elapsed}
+                LLMClient.attach_metrics(result, model_name, payload, stats, call_started, call_started, labels)
+                return result
 
-        for attempt in range(MAX_RETRIES + 1):
+        hedge_delay = None
+        if LLMClient.HEDGING_ENABLED and cancel_token is not None:
+            hedge_delay = LatencyTracker.shared().hedge_delay(model_name)
+        stats = {}
+        send_started = time.monotonic()
+        if hedge_delay is not None:
+            result = LLMClient.send_hedged(api_key, payload, stream, on_delta, key_scheduler,
+                                           cancel_token, hedge_delay, stats=stats)
+        else:
+            result = LLMClient.send_request(api_key, payload, stream, on_delta, key_scheduler=key_scheduler,
+                                            cancel_token=cancel_token, stats=stats)
+        LLMClient.attach_metrics(result, model_name, payload, stats, call_started, send_started, labels)
+        Tracer.annotate(prepare_ms=round(result["metrics"]["prepare"] * 1000, 1),
+                        payload_bytes=stats.get("payload_bytes", 0), error=result.get("error"))
+        # 回放磁带时得到的是录制的测试数据，不写入持久缓存
+        if cache_key and "error" not in result and result.get("content") and Cassette.mode() != "replay":
+            # usage 随缓存保存，命中时作为“原始用量”展示，不计入本次调用
+            stored = {k: v for k, v in result.items() if k not in LLMClient.PER_CALL_FIELDS}
+            stored["usage"] = result.get("usage")
+            ResponseCache.put(cache_key, model_name, stored)
+        if budget_report:
+            result["budget_report"] = budget_report
+        return result
+
+    @staticmethod
+    def attach_metrics(result, model_name, payload, stats, call_started, send_started, labels=None):
+        """
+        汇总本次调用的用量与延迟，写入 result["usage"] / result["metrics"] 并记入 Telemetry
+        ttfb / latency 从发出请求算起（含重试与退避）；prepare 为附件处理与消息组装耗时
+        命中缓存的调用没有访问接口：用量记为 0，原始用量放在 cached_usage 中
+        """
+        now = time.monotonic()
+        usage = None
+        if "error" not in result:
+            usage = normalize_usage(stats.get("usage"), payload, result.get("content", ""),
+                                    stats.get("reasoning_text_tokens", 0))
+            if result.get("cached"):
+                result["cached_usage"] = usage
+                usage = {"prompt_tokens": 0, "completion_tokens": 0, "reasoning_tokens": 0, "total_tokens": 0,
+                         "estimated": False}
+            result["usage"] = usage
+        first_byte_at = stats.get("first_byte_at")
+        metrics = {
+            "usage": usage or {},
+            "ttfb": (first_byte_at - send_started) if first_byte_at else None,
+            "latency": now - send_started,
+            "prepare": send_started - call_started,
+            "retries": stats.get("retries", 0),
+            "payload_bytes": stats.get("payload_bytes", 0),
+            "cached": bool(result.get("cached")),
+            "cached_usage": result.get("cached_usage"),
+            "hedged": bool(result.get("hedged")),
+            "error": result.get("error"),
+            "cancelled": bool(result.get("cancelled"))
+        }
+        result["metrics"] = metrics
+        Telemetry.shared().record(model_name, metrics, labels)
+        return metrics
+
+    @staticmethod
+    def read_timeout_for(model, stream):
+        if LLMClient.ADAPTIVE_TIMEOUTS:
+            return LatencyTracker.shared().timeout_for(model, stream)
+        return LLMClient.TIMEOUT_SECONDS
+
+    @staticmethod
+    def send_hedged(api_key, payload, stream, on_delta, key_scheduler, cancel_token, hedge_delay, stats=None):
+        """
+        对冲请求：主请求超过 hedge_delay 秒仍无首字节时，再发一个相同请求（调度器会优先选空闲的 Key），
+        先收到任意数据块（含推理内容，与延迟统计的首字节口径一致）的一方胜出，另一方立即取消断开
+        """
+        lock = threading.Lock()
+        winner = [None]
+        decided = threading.Event()
+        tokens = [CancelToken(), CancelToken()]
+        results = [None, None]
+        finished = [threading.Event(), threading.Event()]
+        branch_stats = [{}, {}]
+        stream_payload = dict(payload, stream=True)
+
+        def claim(idx):
+            """首个收到数据块（或成功结束）的请求胜出，取消另一个"""
+            with lock:
+                if winner[0] is None:
+                    winner[0] = idx
+                    decided.set()
+                    tokens[1 - idx].cancel()
+                return winner[0] == idx
+
+        def run(idx):
+            def gated_delta(text):
+                if claim(idx) and stream and on_delta:
+                    on_delta(text)
+            res = LLMClient.send_request(api_key, stream_payload, True, gated_delta,
+                                         key_scheduler=key_scheduler, cancel_token=tokens[idx],
+                                         stats=branch_stats[idx], on_first_chunk=lambda: claim(idx))
+            if "error" not in res:
+                claim(idx)
+            results[idx] = res
+            finished[idx].set()
+            if finished[0].is_set() and (finished[1].is_set() or not started[1]):
+                decided.set()
+
+        # 外部取消时同时取消两路请求
+        cancel_all = lambda: [t.cancel() for t in tokens]
+        cancel_token.register(cancel_all)
+        started = [True, False]
+        try:
+            threading.Thread(target=run, args=(0,), daemon=True).start()
+            if not decided.wait(hedge_delay) and not finished[0].is_set() and not cancel_token.cancelled:
+                print(f"{payload.get('model')} 超过 {hedge_delay:.1f}s 无响应，发起对冲请求")
+                started[1] = True
+                threading.Thread(target=run, args=(1,), daemon=True).start()
+            # 等到决出胜者，或所有已发出的请求都结束
+            while not cancel_token.cancelled:
+                if winner[0] is not None:
+                    finished[winner[0]].wait()
+                    break
+                if finished[0].is_set() and (not started[1] or finished[1].is_set()):
+                    break
+                decided.wait(0.5)
+        finally:
+            cancel_token.unregister(cancel_all)
+
+        if cancel_token.cancelled:
+            cancel_all()
+            return dict(LLMClient.CANCELLED_RESULT)
+        idx = winner[0] if winner[0] is not None else 0
+        result = results[idx] or results[1 - idx] or {"error": "对冲请求均未返回结果"}
+        if stats is not None:
+            stats.update(branch_stats[idx])
+        if started[1]:
+            result["hedged"] = True
+            result["hedge_winner"] = "hedge" if idx == 1 else "primary"
+        return result
+
+    @staticmethod
+    @traced("llm.send_request")
+    def send_request(api_key, payload, stream=False, on_delta=None, retry_policy=None, key_scheduler=None,
+                     cancel_token=None, stats=None, on_first_chunk=None):
+        """
+        发送已构造好的请求体（含重试与熔断），返回 {"content": ...} 或 {"error": ...}
+        stats 不为空时写入重试次数、请求体大小、首字节时刻与接口返回的 usage
+        收到首个数据块时回调 on_first_chunk()（流式为首个 SSE 数据块，非流式为响应体解析完成）
+        """
+        if cancel_token:
+            # 可取消的请求一律走 SSE：响应头立即返回，逐段读取时可随时断开
+            if not stream:
+                payload = dict(payload, stream=True)
+                stream, on_delta = True, None
+        policy = retry_policy or LLMClient.RETRY_POLICY
+        breaker = LLMClient.CIRCUIT_BREAKER
+        model = payload.get("model", "")
+
+        allowed, remaining, probe = breaker.allow(model)
+        if not allowed:
+            return {"error": f"模型 {model} 近期连续失败，已暂时熔断，约 {int(remaining) + 1} 秒后自动恢复"}
+        try:
+            return LLMClient._send_with_retries(api_key, payload, stream, on_delta, policy, breaker, model,
+                                                key_scheduler, cancel_token, stats, on_first_chunk)
+        finally:
+            if probe:
+                breaker.end_probe(model)  # 试探请求被取消或以非故障结果结束时，允许下一个请求继续试探
+
+    @staticmethod
+    def _send_with_retries(api_key, payload, stream, on_delta, policy, breaker, model, key_scheduler, cancel_token,
+                           stats, on_first_chunk):
+        """send_request 的重试循环；熔断器按整次调用记录失败，而不是每次尝试都记一次"""
+        estimated_tokens = KeyScheduler.estimate_tokens(payload) if key_scheduler else 0
+        # 请求体只序列化一次，重试时复用
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        if stats is None:
+            stats = {}
+        stats["payload_bytes"] = len(body)
+
+        def wait(seconds):
+            """退避等待；被取消时返回 True"""
+            if cancel_token:
+                return cancel_token.wait(seconds)
+            time.sleep(seconds)
+            return False
+
+        attempt = 0
+        while True:
+            stats["retries"] = attempt
+            stats.pop("usage", None)
+            if cancel_token and cancel_token.cancelled:
+                return dict(LLMClient.CANCELLED_RESULT)
+            key = None
+            if key_scheduler:
+                key = key_scheduler.acquire(
+                    estimated_tokens, cancel_check=(lambda: cancel_token.cancelled) if cancel_token else None,
+                    model=model)
+            if cancel_token and cancel_token.cancelled:
+                if key is not None:
+                    key_scheduler.release(key)
+                return dict(LLMClient.CANCELLED_RESULT)
+            scheduled = key is not None
+            if not scheduled:
+                key = api_key
+            headers = {
+                "Authorization": f"Bearer {key}",
+                "Content-Type": "application/json"
+            }
+            started_at = time.monotonic()
+            first_byte_at = [None]
+            def mark_first_byte():
+                first_byte_at[0] = stats["first_byte_at"] = time.monotonic()
+                if on_first_chunk:
+                    on_first_chunk()
             try:
-                # 尝试发送请求
-                response = requests.post(LLMClient.BASE_URL, headers=headers, json=payload, timeout=TIMEOUT_SECONDS)
+                # 尝试发送请求（读超时按该模型的历史延迟自适应）
+                session = HttpSessionPool.get_session(LLMClient.BASE_URL)
+                # 等待响应头期间也要能取消：登记本次请求的连接，取消时直接断开
+                with Tracer.span("http.post", model=model, attempt=attempt, bytes=len(body)) as sp, \
+                        HttpSessionPool.track() as inflight:
+                    if cancel_token:
+                        cancel_token.register(inflight.abort)
+                    try:
+                        response = Cassette.request(session, "POST", LLMClient.BASE_URL, data=body, headers=headers,
+                                                    timeout=(LLMClient.CONNECT_TIMEOUT, LLMClient.read_timeout_for(model, stream)),
+                                                    stream=bool(stream))
+                    finally:
+                        if cancel_token:
+                            cancel_token.unregister(inflight.abort)
+                    sp.set(status=response.status_code)
+                if cancel_token and cancel_token.cancelled:
+                    abort_response(response)
+                    return dict(LLMClient.CANCELLED_RESULT)
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    breaker.record_success(model)
+                    if scheduled:
+                        key_scheduler.report_success(key)
+                    if stream:
+                        # 流式模式：已开始输出后不再重试，避免重复内容
+                        abort = lambda: abort_response(response)
+                        if cancel_token:
+                            cancel_token.register(abort)
+                        try:
+                            result = LLMClient.read_stream(response, on_delta, cancel_token, mark_first_byte, stats)
+                            if "error" not in result:
+                                LatencyTracker.shared().record(
+                                    model, (first_byte_at[0] or time.monotonic()) - started_at,
+                                    time.monotonic() - started_at)
+                            return result
+                        finally:
+                            if cancel_token:
+                                cancel_token.unregister(abort)
+                            response.close()
+                    with Tracer.span("llm.parse_response"):
+                        data = response.json()
+                    mark_first_byte()
                     if 'choices' in data and len(data['choices']) > 0:
-                        return {"content": data['choices'][0]['message']['content']}
+                        stats["usage"] = data.get("usage")
+                        message = data['choices'][0]['message']
+                        # 非流式只有总耗时：不作为首字节样本，以免抬高自适应超时与对冲阈值所依据的 TTFB 分位数
+                        LatencyTracker.shared().record(model, None, time.monotonic() - started_at)
+                        details = (data.get("usage") or {}).get("completion_tokens_details") or {}
+                        reasoning_model = bool(message.get('reasoning_content') or details.get("reasoning_tokens"))
+                        return LLMClient.make_result(message.get('content'), message.get('reasoning_content') or "",
+                                                     stats, reasoning_model)
                     else:
                         return {"error": f"API 结构异常: {data}"}
-                else:
-                    # 如果是 5xx 服务端错误，可以重试；如果是 4xx 客户端错误，直接返回
-                    if 500 <= response.status_code < 600:
-                        if attempt < MAX_RETRIES:
-                            time.sleep(2) # 歇两秒再试
+
+                status = response.status_code
+                retry_after = RetryPolicy.parse_retry_after(response.headers.get("Retry-After"))
+                if scheduled:
+                    if status == 429:
+                        key_scheduler.report_rate_limited(key, retry_after)
+                    elif status in (401, 402, 403):
+                        # 403 可能只是该 Key 无权使用此模型；仍有其他可用 Key 时立即换 Key 重试，
+                        # 否则该 Key 保留在轮换中，直接返回鉴权错误
+                        rotated = key_scheduler.report_exhausted(key, model if status == 403 else None)
+                        if rotated and attempt < policy.max_retries:
+                            response.close()
+                            attempt += 1
                             continue
-                    return {"error": f"API Error {response.status_code}: {response.text}"}
+                # 429 与 5xx 按策略退避重试；其他 4xx 客户端错误直接返回
+                if policy.should_retry(attempt, status):
+                    # 多 Key 时 429 换 Key 即可，无需按该 Key 的 Retry-After 整体等待
+                    if status == 429 and scheduled and len(key_scheduler.keys()) > 1:
+                        retry_after = None
+                    delay = policy.backoff(attempt, retry_after)
+                    response.close()
+                    print(f"API {status}，{delay:.1f} 秒后重试 (第 {attempt + 1}/{policy.max_retries} 次)")
+                    if wait(delay):
+                        return dict(LLMClient.CANCELLED_RESULT)
+                    attempt += 1
+                    continue
+                if status >= 500:
+                    breaker.record_failure(model)
+                return {"error": f"API Error {status}: {response.text}"}
 
             except (Timeout, ConnectionError) as e:
+                if cancel_token and cancel_token.cancelled:
+                    return dict(LLMClient.CANCELLED_RESULT)
                 # 捕获超时或连接错误
-                print(f"Request failed (Attempt {attempt+1}/{MAX_RETRIES + 1}): {e}")
-                if attempt < MAX_RETRIES:
-                    time.sleep(3) # 遇到网络问题，多歇一会
+                print(f"Request failed (Attempt {attempt+1}/{policy.max_retries + 1}): {e}")
+                if policy.should_retry(attempt):
+                    if wait(policy.backoff(attempt)):
+                        return dict(LLMClient.CANCELLED_RESULT)
+                    attempt += 1
                     continue
-                else:
-                    return {"error": f"请求超时或网络连接失败 (已尝试{MAX_RETRIES+1}次): {str(e)}"}
+                breaker.record_failure(model)
+                return {"error": f"请求超时或网络连接失败 (已尝试{attempt+1}次): {str(e)}"}
             except RequestException as e:
+                if cancel_token and cancel_token.cancelled:
+                    return dict(LLMClient.CANCELLED_RESULT)
                 # 其他请求异常
                 return {"error": f"请求异常: {str(e)}"}
             except Exception as e:
-                return {"error": f"未知异常: {str(e)}"}
\ No newline at end of file
+                if cancel_token and cancel_token.cancelled:
+                    return dict(LLMClient.CANCELLED_RESULT)
+                return {"error": f"未知异常: {str(e)}"}
+            finally:
+                if scheduled:
+                    # 用接口返回的实际用量修正该 Key 的 Token 桶
+                    used = (stats.get("usage") or {}).get("total_tokens")
+                    key_scheduler.release(key, used, estimated_tokens)
@@ -0,0 +1,264 @@
+"""
+压测工具：对本地模拟服务（或任意兼容接口）驱动 LLMClient / 工作任务 / 完整的 搜索→选手→裁判 流程，
+报告吞吐量与延迟分位数
+
+    python load_bench.py --mode client --requests 200 --concurrency 16 --stream
+    python load_bench.py --mode arena --rounds 10 --contestants 5 --search --ttfb 1.0 --token-rate 40
+    python load_bench.py --url http://127.0.0.1:8765/v1 --mode client   # 使用已在运行的服务
+    python load_bench.py --mode arena --cassette-mode replay --cassette cassettes/arena.jsonl.gz --time-scale 0
+
+不指定 --url 时在进程内启动 mock_server.MockServer，模拟选项与 mock_server.py 相同
+"""
+import json
+import time
+import argparse
+import threading
+from llm_client import LLMClient
+from search_tool import SearchTool
+from executor import TaskExecutor
+from cancel_token import CancelToken
+from http_session import HttpSessionPool
+from cassette import Cassette
+from mock_server import MockServer, add_option_args, options_from_args
+
+# 工作任务模式需要 PyQt6 (信号)；缺失时只能使用 client 模式
+try:
+    from PyQt6.QtCore import Qt
+    from workers import ArenaWorker, JudgeWorker, SearchWorker
+    HAS_QT = True
+except ImportError:
+    HAS_QT = False
+
+MOCK_KEY = "sk-mock"
+JUDGE_PROMPT = "你是一名公正的裁判，请比较各模型的回答并给出最佳融合答案。"
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def describe(name, values):
+    if not values:
+        return {"name": name, "count": 0}
+    return {
+        "name": name, "count": len(values),
+        "p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+        "max": max(values), "mean": sum(values) / len(values)
+    }
+
+
+def wait_signal(signal):
+    """把 Qt 信号转成阻塞等待：直接连接，在发射线程中回调，不依赖事件循环"""
+    box, done = [], threading.Event()
+    def on_emit(*args):
+        box.append(args)
+        done.set()
+    signal.connect(on_emit, Qt.ConnectionType.DirectConnection)
+    return box, done
+
+
+def run_client(args, prompt):
+    """直接并发调用 LLMClient.chat_completion"""
+    pool = TaskExecutor(args.concurrency, name="bench")
+    results = []
+    lock = threading.Lock()
+
+    def one(i):
+        started = time.monotonic()
+        res = LLMClient.chat_completion(
+            MOCK_KEY, f"bench/model-{i % args.models}", [{"role": "user", "content": prompt}],
+            stream=args.stream, on_delta=(lambda _t: None) if args.stream else None,
+            use_cache=False, cancel_token=CancelToken(), labels={"bench": True}, max_tokens=1024)
+        with lock:
+            results.append((time.monotonic() - started, res))
+
+    started = time.monotonic()
+    handles = [pool.submit(one, i) for i in range(args.requests)]
+    for h in handles:
+        h.wait()
+    wall = time.monotonic() - started
+    pool.shutdown()
+    return wall, results
+
+
+def run_workers(args, prompt):
+    """通过 ArenaWorker（共享线程池、信号）并发调用"""
+    results = []
+    started = time.monotonic()
+    waits = []
+    for i in range(args.requests):
+        worker = ArenaWorker(MOCK_KEY, {"name": f"bench/model-{i % args.models}", "max_tokens": 1024},
+                             prompt, stream=args.stream, use_cache=False)
+        box, done = wait_signal(worker.finished_signal)
+        t0 = time.monotonic()
+        worker.start()
+        waits.append((worker, box, done, t0))
+    for worker, box, done, t0 in waits:
+        done.wait(args.timeout)
+        if box:
+            _, _, res = box[0]
+            results.append((res.get("metrics", {}).get("latency", time.monotonic() - t0), res))
+    return time.monotonic() - started, results
+
+
+def run_arena(args, prompt):
+    """完整流程：可选搜索 → N 个选手并发 → 裁判，每轮串行执行"""
+    rounds = []
+    started = time.monotonic()
+    for r in range(args.rounds):
+        phase = {}
+        t0 = time.monotonic()
+        search_context = ""
+        if args.search:
+            worker = SearchWorker(prompt, 5, "")
+            box, done = wait_signal(worker.finished_signal)
+            worker.start()
+            done.wait(args.timeout)
+            search_context = box[0][0] if box else ""
+        phase["search"] = time.monotonic() - t0
+
+        t1 = time.monotonic()
+        answers, waits = {}, []
+        for i in range(args.contestants):
+            worker = ArenaWorker(MOCK_KEY, {"name": f"bench/model-{i}", "max_tokens": 1024}, prompt,
+                                 stream=args.stream, use_cache=False, search_context=search_context,
+                                 labels={"bench_round": r})
+            box, done = wait_signal(worker.finished_signal)
+            worker.start()
+            waits.append((box, done))
+        for box, done in waits:
+            done.wait(args.timeout)
+            if box:
+                answers[box[0][0]] = box[0][1]
+        phase["contestants"] = time.monotonic() - t1
+
+        t2 = time.monotonic()
+        judge = JudgeWorker(MOCK_KEY, "bench/judge", JUDGE_PROMPT, prompt, answers,
+                            stream=args.stream, use_cache=False, labels={"bench_round": r})
+        box, done = wait_signal(judge.result_signal)
+        judge.start()
+        done.wait(args.timeout)
+        phase["judge"] = time.monotonic() - t2
+        phase["round"] = time.monotonic() - t0
+        phase["ok"] = bool(box) and not box[0][0].startswith("裁判模型调用出错")
+        rounds.append(phase)
+    return time.monotonic() - started, rounds
+
+
+def report_calls(wall, results):
+    latencies = [lat for lat, _ in results]
+    metrics = [res.get("metrics", {}) for _, res in results]
+    ttfbs = [m["ttfb"] for m in metrics if m.get("ttfb") is not None]
+    errors = [res["error"] for _, res in results if "error" in res]
+    completion = sum(m.get("usage", {}).get("completion_tokens", 0) for m in metrics)
+    return {
+        "calls": len(results),
+        "wall_seconds": wall,
+        "throughput_rps": len(results) / wall if wall else None,
+        "output_tokens_per_second": completion / wall if wall else None,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "retries": sum(m.get("retries", 0) for m in metrics),
+        "hedged": sum(1 for m in metrics if m.get("hedged")),
+        "latency": describe("latency", latencies),
+        "ttfb": describe("ttfb", ttfbs),
+    }
+
+
+def report_rounds(wall, rounds):
+    return {
+        "rounds": len(rounds),
+        "wall_seconds": wall,
+        "rounds_per_minute": len(rounds) * 60 / wall if wall else None,
+        "failed_rounds": sum(1 for r in rounds if not r["ok"]),
+        "phases": [describe(name, [r[name] for r in rounds]) for name in ("search", "contestants", "judge", "round")],
+    }
+
+
+def print_report(report):
+    for key, value in report.items():
+        if isinstance(value, dict) and "count" in value:
+            print_stat(value)
+        elif key == "phases":
+            for stat in value:
+                print_stat(stat)
+        elif isinstance(value, float):
+            print(f"{key:>26}: {value:.3f}")
+        else:
+            print(f"{key:>26}: {value}")
+
+
+def print_stat(stat):
+    if not stat.get("count"):
+        print(f"{stat['name']:>26}: -")
+        return
+    print(f"{stat['name']:>26}: p50 {stat['p50'] * 1000:8.1f} ms | p95 {stat['p95'] * 1000:8.1f} ms | "
+          f"p99 {stat['p99'] * 1000:8.1f} ms | max {stat['max'] * 1000:8.1f} ms  (n={stat['count']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Arena 压测工具")
+    parser.add_argument("--mode", choices=["client", "workers", "arena"], default="client")
+    parser.add_argument("--url", default="", help="使用已运行的兼容服务；不指定时启动进程内模拟服务")
+    parser.add_argument("--requests", type=int, default=100, help="client / workers 模式的请求总数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--models", type=int, default=5, help="请求轮流使用的模型名个数")
+    parser.add_argument("--rounds", type=int, default=5, help="arena 模式的轮数")
+    parser.add_argument("--contestants", type=int, default=5, help="arena 模式每轮的选手数")
+    parser.add_argument("--search", action="store_true", help="arena 模式每轮先执行联网搜索")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--prompt-chars", type=int, default=500)
+    parser.add_argument("--no-hedge", action="store_true", help="关闭对冲请求")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出报告")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cassette-mode", choices=["off", "record", "replay"], default="off")
+    parser.add_argument("--cassette", default="", help="磁带文件路径")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="回放时间倍率")
+    add_option_args(parser)
+    args = parser.parse_args()
+
+    if args.mode != "client" and not HAS_QT:
+        parser.error("workers / arena 模式需要 PyQt6")
+
+    Cassette.configure(args.cassette_mode, args.cassette, args.time_scale)
+    server = None
+    if args.url or args.cassette_mode == "replay":
+        LLMClient.configure_endpoint(args.url)
+    else:
+        server = MockServer(seed=args.seed, **options_from_args(args)).start()
+        LLMClient.configure_endpoint(server.api_url)
+        SearchTool.configure_endpoint(server.search_url)
+    LLMClient.HEDGING_ENABLED = not args.no_hedge
+    HttpSessionPool.configure(max(16, args.concurrency, args.contestants))
+    TaskExecutor.shared().set_max_workers(max(args.concurrency, args.contestants))
+
+    prompt = ("请详细比较以下方案的性能差异。" * (args.prompt_chars // 14 + 1))[:args.prompt_chars]
+    try:
+        if args.mode == "client":
+            report = report_calls(*run_client(args, prompt))
+        elif args.mode == "workers":
+            report = report_calls(*run_workers(args, prompt))
+        else:
+            report = report_rounds(*run_arena(args, prompt))
+        if server:
+            report["server"] = server.stats()
+    finally:
+        if server:
+            server.stop()
+        HttpSessionPool.close_all()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
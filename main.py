@@ -7,13 +7,30 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QProgressBar, QTabWidget, QComboBox, QMessageBox,
                              QScrollArea, QInputDialog, QToolButton, QFileDialog,
                              QListWidget, QAbstractItemView, QSpinBox) 
-from PyQt6.QtGui import QAction, QDesktopServices, QColor, QIcon
-from PyQt6.QtCore import Qt, QUrl
+from PyQt6.QtGui import QAction, QDesktopServices, QColor, QIcon, QTextCursor
+from PyQt6.QtCore import Qt, QUrl, QTimer
 
 from config_manager import ConfigManager
 from options_dialog import OptionsDialog
 from param_dialog import ModelParamsDialog
 from workers import ArenaWorker, JudgeWorker, SearchWorker
+from executor import TaskExecutor
+from llm_client import LLMClient
+from telemetry import Telemetry
+from tracing import Tracer
+from cassette import Cassette
+from judge_prompt import JudgePrompt
+from arena_engine import ArenaEngine
+from agreement import measure_agreement
+from runtime import Runtime
+
+# 裁判启动时机 (显示名, 模式)
+JUDGE_POLICIES = [
+    ("全部完成后裁判", "all"),
+    ("收到 K 个回答即裁判", "quorum"),
+    ("T 秒后用已有回答裁判", "deadline"),
+    ("先用 K 个回答裁判，全部到齐后更新", "incremental"),
+]
 
 AVAILABLE_MODELS = [
     "deepseek-ai/DeepSeek-R1",
@@ -29,11 +46,25 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.cfg_mgr = ConfigManager()
         
+        # 接口地址、线程池、连接池、缓存等进程级组件
+        Runtime.configure(self.cfg_mgr)
+        
         self.active_workers = [] 
         self.results_buffer = {}
         self.total_contestants = 0
+        # 裁判时机相关的单轮状态
+        self.run_id = 0
+        self.judge_started = False
+        self.judge_running = False
+        self.judged_count = 0
+        self.judge_agreement = None  # 最近一次裁判的回答一致度
+        self.deadline_passed = False
+        self.trace_start_us = 0
         self.uploaded_files = [] 
         self.model_params_map = {} 
+        self.stream_views = {}  # 流式输出：模型名 -> 对应的 QTextEdit
+        # 多 Key 调度：选手与裁判请求分摊到所有已配置的 Key
+        self.key_scheduler = Runtime.make_key_scheduler(self.cfg_mgr)
         self.judge_params = {"temperature": 0.2, "top_p": 0.9, "max_tokens": 2048, "frequency_penalty": 0.0}
 
         self.init_ui()
@@ -85,7 +116,7 @@ class MainWindow(QMainWindow):
         key_layout = QHBoxLayout()
         key_layout.setSpacing(2)
         self.api_key_combo = QComboBox()
-        self.api_key_combo.setToolTip("选择或添加 API Key")
+        self.api_key_combo.setToolTip("选择或添加 API Key（配置多个 Key 时，请求会自动分摊到所有 Key）")
         self.api_key_combo.currentIndexChanged.connect(self.on_api_key_changed)
         key_layout.addWidget(self.api_key_combo)
         btn_add_key = QToolButton()
@@ -168,6 +199,17 @@ class MainWindow(QMainWindow):
         self.btn_judge_gear = QToolButton(); self.btn_judge_gear.setText("⚙")
         self.btn_judge_gear.clicked.connect(lambda: self.open_param_dialog(self.judge_selector.currentData(), is_judge=True) if self.judge_selector.currentData() else None)
         header_layout.addWidget(self.btn_judge_gear)
+        
+        # 裁判时机：不必等最慢的模型
+        self.judge_policy_combo = QComboBox()
+        for label, mode in JUDGE_POLICIES:
+            self.judge_policy_combo.addItem(label, mode)
+        self.judge_policy_combo.setToolTip("何时开始裁判。迟到的回答仍会显示在“原始回答”中。")
+        self.judge_policy_combo.currentIndexChanged.connect(self.on_judge_policy_changed)
+        header_layout.addWidget(self.judge_policy_combo)
+        self.spin_policy_value = QSpinBox(); self.spin_policy_value.setRange(1, 600)
+        header_layout.addWidget(self.spin_policy_value)
+        self.on_judge_policy_changed()
         right_layout.addLayout(header_layout)
 
         # 2. 输入区域
@@ -179,7 +221,7 @@ class MainWindow(QMainWindow):
         j_layout.addWidget(QLabel("<b>裁判指令 (System Prompt):</b>"))
         self.judge_input = QTextEdit()
         # 【修改】更新默认 Prompt，不再强制 JSON，让裁判自然发挥
-        self.judge_input.setPlainText("你是一个公正的AI裁判。请对比各模型回答，详细指出它们的优缺点，最后整合生成一个最完美的答案。")
+        self.judge_input.setPlainText(JudgePrompt.DEFAULT_SYSTEM_PROMPT)
         self.judge_input.setMaximumHeight(80)
         j_layout.addWidget(self.judge_input)
         input_split.addWidget(judge_frame)
@@ -202,6 +244,12 @@ class MainWindow(QMainWindow):
         
         tool_layout.addWidget(QFrame(frameShape=QFrame.Shape.VLine))
         
+        self.chk_use_cache = QCheckBox("♻️ 复用缓存"); self.chk_use_cache.setChecked(True)
+        self.chk_use_cache.setToolTip("输入完全相同的模型调用直接复用上次的回答；取消勾选则本次全部重新请求。")
+        tool_layout.addWidget(self.chk_use_cache)
+        
+        tool_layout.addWidget(QFrame(frameShape=QFrame.Shape.VLine))
+        
         self.btn_upload = QPushButton("📎 添加文件"); self.btn_upload.clicked.connect(self.upload_file_action)
         tool_layout.addWidget(self.btn_upload)
         self.btn_remove_file = QPushButton("❌ 移除"); self.btn_remove_file.clicked.connect(self.remove_file_action)
@@ -247,6 +295,11 @@ class MainWindow(QMainWindow):
         self.stop_btn.clicked.connect(self.stop_arena)
         ctrl_layout.addWidget(self.stop_btn)
         
+        self.rejudge_btn = QPushButton("⚖️ 重新裁判"); self.rejudge_btn.setMinimumHeight(40)
+        self.rejudge_btn.setToolTip("保留本轮各模型的回答，仅重新调用裁判（可先更换裁判模型或裁判指令）")
+        self.rejudge_btn.clicked.connect(self.rejudge_action)
+        ctrl_layout.addWidget(self.rejudge_btn)
+        
         self.export_btn = QPushButton("📂 导出结果"); self.export_btn.setMinimumHeight(40)
         self.export_btn.clicked.connect(self.export_results)
         ctrl_layout.addWidget(self.export_btn)
@@ -263,6 +316,14 @@ class MainWindow(QMainWindow):
         self.tab_raw = QTextEdit(); self.tab_raw.setReadOnly(True)
         self.result_tabs.addTab(self.tab_raw, "📝 原始回答") # Index 1
         
+        # 流式输出：每个选手一个子标签页，边生成边追加
+        self.tab_stream = QTabWidget()
+        self.result_tabs.addTab(self.tab_stream, "⚡ 实时输出") # Index 2
+
+        # 思考模型的推理过程：与正文分开保存，默认折叠在单独的标签页中
+        self.tab_reasoning = QTabWidget()
+        self.result_tabs.addTab(self.tab_reasoning, "💭 推理过程") # Index 3
+        
         right_layout.addWidget(self.result_tabs)
 
         right_panel.setLayout(right_layout)
@@ -287,6 +348,7 @@ class MainWindow(QMainWindow):
             keys = self.cfg_mgr.get_api_keys()
         else:
             keys = []
+        self.key_scheduler.set_keys(keys)
             
         for k in keys:
             self.api_key_combo.addItem(self.mask_key(k), k)
@@ -349,8 +411,15 @@ class MainWindow(QMainWindow):
             return
 
         self.set_ui_busy(True)
+        # 只保留仍在运行的任务引用，避免列表在多轮之间无限增长
+        self.active_workers = [w for w in self.active_workers if w.isRunning()]
         # 【修改】只清理剩下的两个 Tab
         self.tab_raw.clear(); self.tab_verdict.clear()
+        self.tab_stream.clear(); self.stream_views = {}
+        self.tab_reasoning.clear()
+        self.trace_start_us = Tracer.now_us()
+        if Cassette.mode() != "off":
+            self.tab_raw.append(f"[磁带模式: {Cassette.mode()}]\n")
         
         if self.btn_search.isChecked():
             self.start_search_phase(user_prompt)
@@ -369,86 +438,275 @@ class MainWindow(QMainWindow):
         self.tab_raw.append(f"{result_text}\n\n")
         self.start_contest_phase(user_prompt, search_context=result_text)
 
+    def on_judge_policy_changed(self, *_):
+        """K (个) 与 T (秒) 共用一个数值框，按模式切换含义"""
+        mode = self.judge_policy_combo.currentData()
+        self.spin_policy_value.setVisible(mode != "all")
+        if mode == "deadline":
+            self.spin_policy_value.setSuffix(" 秒")
+            if self.spin_policy_value.value() < 10: self.spin_policy_value.setValue(60)
+        else:
+            self.spin_policy_value.setSuffix(" 个")
+            if self.spin_policy_value.value() > len(AVAILABLE_MODELS): self.spin_policy_value.setValue(2)
+
     def start_contest_phase(self, user_prompt, search_context):
         self.start_btn.setText("模型思考中...")
-        final_prompt = user_prompt
-        if search_context:
-            final_prompt = f"{user_prompt}\n\n【联网搜索参考资料】\n{search_context}"
 
         self.results_buffer = {}
         self.total_contestants = len(self.selected_workers_data)
         self.progress_bar.setRange(0, self.total_contestants + 1)
         self.progress_bar.setValue(0)
         
+        self.run_id += 1
+        self.judge_started = False
+        self.judge_running = False
+        self.judged_count = 0
+        self.deadline_passed = False
+        if self.judge_policy_combo.currentData() == "deadline":
+            run_id = self.run_id
+            QTimer.singleShot(self.spin_policy_value.value() * 1000, lambda: self.on_judge_deadline(run_id))
+        
         vision_models = self.cfg_mgr.get_vision_models()
         
         current_api_key = self.api_key_combo.currentData()
+        stream = self.cfg_mgr.get_stream_output()
+        if stream:
+            self.result_tabs.setCurrentIndex(2)
 
         for model_conf in self.selected_workers_data:
             worker = ArenaWorker(
                 current_api_key, 
                 model_conf, 
-                final_prompt, 
+                user_prompt, 
+                search_context=search_context,
                 file_paths=self.uploaded_files,
-                vision_models=vision_models
+                vision_models=vision_models,
+                stream=stream,
+                use_cache=self.chk_use_cache.isChecked(),
+                key_scheduler=self.key_scheduler,
+                labels={"run": self.run_id}
             )
             worker.finished_signal.connect(self.on_contestant_finish)
+            worker.delta_signal.connect(self.on_contestant_delta)
             self.active_workers.append(worker)
             worker.start()
 
+    def get_stream_view(self, model_name):
+        """获取（必要时创建）某个模型的实时输出框"""
+        view = self.stream_views.get(model_name)
+        if view is None:
+            view = QTextEdit(); view.setReadOnly(True)
+            self.tab_stream.addTab(view, model_name.split("/")[-1])
+            self.stream_views[model_name] = view
+        return view
+
+    def append_to_view(self, view, text):
+        cursor = view.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+        view.setTextCursor(cursor)
+
+    def on_contestant_delta(self, model_name, delta):
+        self.append_to_view(self.get_stream_view(model_name), delta)
+
     def on_contestant_finish(self, model_name, content, full_response):
-        self.results_buffer[model_name] = content
+        reasoning = full_response.get("reasoning")
+        self.results_buffer[model_name] = JudgePrompt.judge_answer(content, reasoning)
         short = model_name.split("/")[-1]
         self.tab_raw.append(f"=== {short} ===\n{content}\n\n")
+        if reasoning:
+            view = QTextEdit(); view.setReadOnly(True)
+            view.setPlainText(reasoning)
+            self.tab_reasoning.addTab(view, short)
+            self.tab_raw.append(f"[推理过程] 已折叠（{len(reasoning)} 字），见“推理过程”标签页\n\n")
+        if full_response.get("budget_report"):
+            # 上下文超出模型窗口时，告知裁剪了哪些内容
+            cut_lines = "\n".join(f"  - {line}" for line in full_response["budget_report"])
+            self.tab_raw.append(f"[上下文预算] {short} 的输入超出上下文窗口，已裁剪：\n{cut_lines}\n\n")
+        if full_response.get("metrics"):
+            self.tab_raw.append(f"[统计] {short}: {Telemetry.format_metrics(full_response['metrics'])}\n\n")
         self.progress_bar.setValue(len(self.results_buffer))
         
-        if len(self.results_buffer) == self.total_contestants:
+        if self.judge_running:
+            # 增量模式下，裁判结束后会检查是否需要用新到的回答更新结论
+            return
+        if not self.judge_started:
+            if self.should_start_judge():
+                self.start_judge_phase()
+                return
+        elif (self.judge_policy_combo.currentData() == "incremental"
+              and len(self.results_buffer) > self.judged_count
+              and len(self.results_buffer) == self.total_contestants):
+            self.start_judge_phase(refine=True)
+            return
+        self.check_run_complete()
+
+    def should_start_judge(self):
+        """按当前裁判时机判断是否可以开始裁判"""
+        received = len(self.results_buffer)
+        if received >= self.total_contestants:
+            return True
+        if not self.judge_selector.currentData():
+            return False  # 不启用裁判时只需等全部回答
+        mode = self.judge_policy_combo.currentData()
+        if mode in ("quorum", "incremental"):
+            return received >= min(self.spin_policy_value.value(), self.total_contestants)
+        if mode == "deadline":
+            return self.deadline_passed and received > 0
+        return False
+
+    def on_judge_deadline(self, run_id):
+        """超时：用已经收到的回答开始裁判；一个都没有则等第一个回答"""
+        if run_id != self.run_id or self.judge_started:
+            return
+        self.deadline_passed = True
+        if self.results_buffer:
             self.start_judge_phase()
 
-    def start_judge_phase(self):
+    def check_run_complete(self):
+        """裁判已完成且所有选手都已返回时，结束本轮"""
+        if self.judge_started and not self.judge_running and len(self.results_buffer) >= self.total_contestants:
+            self.set_ui_busy(False)
+            self.progress_bar.setValue(self.total_contestants + 1)
+            self.on_run_complete()
+
+    def on_run_complete(self):
+        self.show_run_stats()
+        self.export_run_trace()
+
+    def export_run_trace(self):
+        """开启追踪时，把本轮的各阶段 Span 写成 Chrome Trace 文件"""
+        if not Tracer.is_enabled():
+            return
+        Tracer.record("arena.run", self.trace_start_us, run=self.run_id, contestants=self.total_contestants)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.cfg_mgr.base_dir, "traces", f"run_{stamp}_{self.run_id}.json")
+        try:
+            count = Tracer.export_chrome(path, since_us=self.trace_start_us, metadata={"run": self.run_id})
+            self.tab_raw.append(f"[追踪] 已写出 {count} 个阶段记录: {path}\n")
+        except OSError as e:
+            self.tab_raw.append(f"[追踪] 写出失败: {e}\n")
+
+    def show_run_stats(self):
+        """本轮所有调用（选手 + 裁判）的用量与耗时汇总"""
+        summary = Telemetry.shared().summary(run=self.run_id)
+        if summary["total"]["calls"]:
+            self.tab_raw.append(f"=== 本轮统计 ===\n{Telemetry.format_summary(summary)}\n")
+
+    def start_judge_phase(self, refine=False):
         current_api_key = self.api_key_combo.currentData()
         judge_model = self.judge_selector.currentData()
 
+        self.judge_started = True
         if not judge_model:
             self.set_ui_busy(False)
             self.progress_bar.setValue(self.total_contestants + 1)
+            self.on_run_complete()
             # 【修改】使用 tab_verdict 显示提示，并跳转到 tab_raw (index 1)
-            self.tab_verdict.setPlainText("[裁判未启用]\n仅展示各模型的原始回答，请切换到“原始回答”标签页查看。")
+            notice = "[裁判未启用]\n仅展示各模型的原始回答，请切换到“原始回答”标签页查看。"
+            agreement = measure_agreement(ArenaEngine.real_answers(self.results_buffer))
+            if agreement:
+                notice += f"\n\n各回答一致度: {agreement['score']:.2f}（均值 {agreement['mean']:.2f}）"
+            self.tab_verdict.setPlainText(notice)
             self.result_tabs.setCurrentIndex(1) 
             return
             
-        self.start_btn.setText("裁判思考中...")
+        self.start_btn.setText("裁判更新中..." if refine else "裁判思考中...")
+        # 更新结论时保留先前的裁判结果，完成后再整体替换
+        stream = self.cfg_mgr.get_stream_output() and not refine
+        if stream:
+            self.tab_verdict.clear()
+            self.result_tabs.setCurrentIndex(0)
+        if refine:
+            self.tab_verdict.append("\n\n[已收到全部回答，裁判正在更新结论...]")
+        
+        # 传入快照：之后到达的回答不会影响正在进行的裁判
+        snapshot = dict(self.results_buffer)
+        self.judged_count = len(snapshot)
+        self.judge_running = True
+        self.judge_agreement = None
         
         judge_worker = JudgeWorker(
             current_api_key, 
             judge_model,
             self.judge_input.toPlainText(),
             self.user_input.toPlainText(),
-            self.results_buffer
+            snapshot,
+            stream=stream,
+            use_cache=self.chk_use_cache.isChecked(),
+            key_scheduler=self.key_scheduler,
+            labels={"run": self.run_id}
         )
         judge_worker.result_signal.connect(self.on_judge_finish)
+        judge_worker.delta_signal.connect(lambda d: self.append_to_view(self.tab_verdict, d))
+        judge_worker.agreement_signal.connect(self.on_judge_agreement)
+        judge_worker.report_signal.connect(
+            lambda lines: self.tab_raw.append("[裁判输入]\n" + "\n".join(f"  - {l}" for l in lines) + "\n"))
         self.active_workers.append(judge_worker)
         judge_worker.start()
 
+    def rejudge_action(self):
+        """只重新运行裁判，复用已有的选手回答"""
+        if not self.results_buffer or self.stop_btn.isEnabled():
+            return
+        if not self.judge_selector.currentData():
+            QMessageBox.warning(self, "提示", "请先选择一个裁判模型。")
+            return
+        self.set_ui_busy(True)
+        self.total_contestants = len(self.results_buffer)
+        self.progress_bar.setRange(0, self.total_contestants + 1)
+        self.progress_bar.setValue(self.total_contestants)
+        self.tab_verdict.clear()
+        self.run_id += 1
+        self.trace_start_us = Tracer.now_us()
+        self.start_judge_phase()
+
+    def on_judge_agreement(self, agreement):
+        self.judge_agreement = agreement
+
     def on_judge_finish(self, result_text):
         """【修改】直接接收字符串文本，不再处理 JSON"""
-        self.set_ui_busy(False)
-        self.progress_bar.setValue(self.total_contestants + 1)
-        
-        # 直接显示裁判返回的文本
+        self.judge_running = False
+        
+        # 直接显示裁判返回的文本；未等齐全部回答时注明依据
+        if self.judged_count < self.total_contestants:
+            result_text = f"[裁判依据 {self.judged_count}/{self.total_contestants} 个已到达的回答]\n\n{result_text}"
+        if self.judge_agreement:
+            mode = {"skip": "，已跳过裁判", "brief": "，裁判简短确认"}.get(self.judge_agreement["action"], "")
+            result_text = f"[回答一致度 {self.judge_agreement['score']:.2f}{mode}]\n\n{result_text}"
         self.tab_verdict.setPlainText(result_text)
+        judge_calls = Telemetry.shared().records(run=self.run_id, role="judge")
+        if judge_calls:
+            self.tab_raw.append(f"[统计] 裁判: {Telemetry.format_metrics(judge_calls[-1])}\n\n")
         
         # 自动切换到裁判分析页 (index 0)
         self.result_tabs.setCurrentIndex(0)
+        
+        if (self.judge_policy_combo.currentData() == "incremental"
+                and len(self.results_buffer) > self.judged_count
+                and len(self.results_buffer) == self.total_contestants):
+            # 裁判期间其余回答已到齐：用全部回答更新结论
+            self.start_judge_phase(refine=True)
+            return
+        if len(self.results_buffer) < self.total_contestants:
+            self.start_btn.setText("等待其余模型回答...")
+        self.check_run_complete()
 
     def stop_arena(self):
+        self.run_id += 1  # 使本轮的超时定时器失效
+        self.judge_running = False
         for w in self.active_workers:
             if hasattr(w, 'stop'): w.stop()
             try: w.finished_signal.disconnect() 
             except: pass
             try: w.result_signal.disconnect()
             except: pass
-            if isinstance(w, SearchWorker) and w.isRunning(): w.terminate() 
+            try: w.delta_signal.disconnect()
+            except: pass
+            try: w.report_signal.disconnect()
+            except: pass
+            try: w.agreement_signal.disconnect()
+            except: pass
         
         self.active_workers.clear()
         self.set_ui_busy(False)
@@ -456,6 +714,7 @@ class MainWindow(QMainWindow):
 
     def set_ui_busy(self, busy):
         self.start_btn.setEnabled(not busy)
+        self.rejudge_btn.setEnabled(not busy)
         self.stop_btn.setEnabled(busy)
         self.progress_bar.setVisible(busy)
         if not busy: self.start_btn.setText("开始竞技 (Start Arena)")
@@ -490,7 +749,19 @@ class MainWindow(QMainWindow):
 
     def open_options(self):
         dlg = OptionsDialog(self.cfg_mgr, self)
-        if dlg.exec(): self.apply_theme()
+        if dlg.exec():
+            self.apply_theme()
+            self.apply_image_options()
+            TaskExecutor.shared().set_max_workers(self.cfg_mgr.get_max_concurrency())
+            Tracer.configure(self.cfg_mgr.get_trace_runs())
+            JudgePrompt.INCLUDE_REASONING = self.cfg_mgr.get_judge_include_reasoning()
+            ArenaEngine.configure_tournament(**self.cfg_mgr.get_judge_tournament())
+            ArenaEngine.configure_shortcut(**self.cfg_mgr.get_judge_shortcut())
+            if not os.environ.get("AI_ARENA_BASE_URL"):
+                LLMClient.configure_endpoint(self.cfg_mgr.get_api_base_url())
+
+    def apply_image_options(self):
+        Runtime.apply_image_options(self.cfg_mgr)
 
     def open_param_dialog(self, name, is_judge=False):
         params = self.judge_params if is_judge else self.model_params_map.get(name, {})
@@ -598,6 +869,11 @@ class MainWindow(QMainWindow):
             self.btn_search.setChecked(last["search_enabled"])
         if "search_max_results" in last:
             self.spin_search_count.setValue(int(last["search_max_results"]))
+        if "judge_policy" in last:
+            idx = self.judge_policy_combo.findData(last["judge_policy"])
+            if idx >= 0: self.judge_policy_combo.setCurrentIndex(idx)
+        if "judge_policy_value" in last:
+            self.spin_policy_value.setValue(int(last["judge_policy_value"]))
 
     def closeEvent(self, e):
         geo = self.geometry()
@@ -616,10 +892,13 @@ class MainWindow(QMainWindow):
             "model_params_map": self.model_params_map, 
             "user_prompt": self.user_input.toPlainText(),
             "search_enabled": self.btn_search.isChecked(),
-            "search_max_results": self.spin_search_count.value()
+            "search_max_results": self.spin_search_count.value(),
+            "judge_policy": self.judge_policy_combo.currentData(),
+            "judge_policy_value": self.spin_policy_value.value()
         }
         
         self.cfg_mgr.set_last_session(session_data)
+        Runtime.shutdown()
         super().closeEvent(e)
         
     def adjust_color(self, hex_color, amount=10):
@@ -0,0 +1,289 @@
+"""
+热点路径微基准（离线运行，不访问网络），结果与 bench_baselines.json 中记录的基线对比
+
+    python micro_bench.py                      # 运行全部并与基线对比
+    python micro_bench.py --filter search      # 只运行名称包含 search 的项
+    python micro_bench.py --check              # 有项目慢于基线超过阈值时以非零状态退出
+    python micro_bench.py --update-baseline    # 用本次结果覆盖基线
+    python micro_bench.py --pages saved_bing/  # 用保存下来的真实 Bing 结果页 (*.html) 测试解析
+
+基线与机器相关：换机器或 Python 版本后请先 --update-baseline 再比较
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import timeit
+from llm_client import LLMClient, HAS_DOCX, HAS_PIL
+from attachment_cache import AttachmentCache
+from search_tool import SearchTool
+from judge_prompt import JudgePrompt
+from agreement import measure_agreement
+from config_manager import ConfigManager
+from mock_server import build_search_page
+
+if HAS_DOCX:
+    from docx import Document
+if HAS_PIL:
+    from PIL import Image
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baselines.json")
+VISION_MODEL = "Qwen/Qwen2-VL-72B-Instruct"
+BENCHMARKS = []
+ARGS = None
+
+
+def benchmark(name):
+    """注册一个基准：被装饰函数接收临时目录，返回要计时的无参函数；返回字符串表示跳过原因"""
+    def decorator(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return decorator
+
+
+def sample_text(n_chars, seed=0):
+    rng = random.Random(seed)
+    words = ["性能", "模型", "回答", "上下文", "延迟", "吞吐", "arena", "judge", "token", "stream", "cache", "参数"]
+    out, size = [], 0
+    while size < n_chars:
+        w = rng.choice(words)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)[:n_chars]
+
+
+# --- 文档解析 ---
+def make_docx(path, paragraphs):
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"第 {i + 1} 段：" + sample_text(300, i))
+    doc.save(path)
+
+
+@benchmark("parse_document.docx_small")
+def bench_docx_small(workdir):
+    if not HAS_DOCX:
+        return "缺少 python-docx"
+    path = os.path.join(workdir, "small.docx")
+    make_docx(path, 20)
+    return lambda: LLMClient.parse_document(path)
+
+
+@benchmark("parse_document.docx_large")
+def bench_docx_large(workdir):
+    if not HAS_DOCX:
+        return "缺少 python-docx"
+    path = os.path.join(workdir, "large.docx")
+    make_docx(path, 3000)
+    return lambda: LLMClient.parse_document(path)
+
+
+# --- 图片编码与消息组装 ---
+def make_images(workdir, count=6, size=(1600, 1200)):
+    paths = []
+    rng = random.Random(1)
+    for i in range(count):
+        if HAS_PIL:
+            path = os.path.join(workdir, f"image_{i}.jpg")
+            img = Image.effect_noise(size, 40 + i).convert("RGB")
+            img.save(path, "JPEG", quality=92)
+        else:
+            path = os.path.join(workdir, f"image_{i}.bin")
+            with open(path, "wb") as f:
+                f.write(bytes(rng.getrandbits(8) for _ in range(300_000)))
+        paths.append(path)
+    return paths
+
+
+@benchmark("image.encode_image_x6")
+def bench_encode_image(workdir):
+    paths = make_images(workdir)
+    return lambda: [LLMClient.encode_image(p) for p in paths]
+
+
+@benchmark("messages.multi_image_cold")
+def bench_messages_cold(workdir):
+    if not HAS_PIL:
+        return "缺少 Pillow"
+    paths = make_images(workdir)
+    messages = [{"role": "user", "content": "请比较这些图片的异同。"}]
+
+    def run():
+        AttachmentCache.clear()  # 冷启动：每次都重新压缩与编码
+        return LLMClient.build_messages(VISION_MODEL, messages, paths, [VISION_MODEL], sample_text(4000))
+    return run
+
+
+@benchmark("messages.multi_image_warm")
+def bench_messages_warm(workdir):
+    if not HAS_PIL:
+        return "缺少 Pillow"
+    paths = make_images(workdir)
+    messages = [{"role": "user", "content": "请比较这些图片的异同。"}]
+    AttachmentCache.clear()
+    LLMClient.build_messages(VISION_MODEL, messages, paths, [VISION_MODEL])
+    return lambda: LLMClient.build_messages(VISION_MODEL, messages, paths, [VISION_MODEL], sample_text(4000))
+
+
+# --- 搜索结果页解析 ---
+def synthetic_bing_page(query, seed):
+    """仿真实 Bing 页面体积：结果列表外加大段脚本与样式"""
+    filler = "".join(f"<script>var _w{i}={json.dumps(sample_text(2000, seed + i))};</script>" for i in range(60))
+    style = "<style>" + ".b_algo{margin:0}" * 2000 + "</style>"
+    page = build_search_page(query, 30)
+    return page.replace("<head>", "<head>" + style + filler, 1)
+
+
+def load_pages(pages_dir):
+    if pages_dir:
+        pages = []
+        for name in sorted(os.listdir(pages_dir)):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(pages_dir, name), "r", encoding="utf-8", errors="replace") as f:
+                    pages.append(f.read())
+        if pages:
+            return pages
+    return [synthetic_bing_page(f"查询 {i}", i * 100) for i in range(3)]
+
+
+@benchmark("search.parse_results")
+def bench_search_parse(workdir):
+    pages = load_pages(ARGS.pages)
+    return lambda: [SearchTool.parse_results(html, "查询", 10) for html in pages]
+
+
+# --- 裁判提示词组装 ---
+@benchmark("judge.build_messages_8x20k")
+def bench_judge_prompt(workdir):
+    answers = {f"Vendor/Model-{i}": sample_text(20000, i) for i in range(8)}
+    system_prompt = "你是一名公正的裁判。" * 20
+    return lambda: JudgePrompt.build_messages(system_prompt, sample_text(2000), answers)
+
+
+@benchmark("judge.compress_6x_overlap")
+def bench_judge_compress(workdir):
+    """分段的长回答，其中一部分段落在各回答间重复：覆盖去重与抽取式摘要"""
+    shared = [f"共有段落 {i}：" + sample_text(400, 1000 + i) for i in range(6)]
+    answers = {}
+    for m in range(6):
+        own = [f"模型 {m} 第 {i} 段：" + sample_text(600, m * 100 + i) for i in range(40)]
+        answers[f"Vendor/Model-{m}"] = "\n\n".join(own[:20] + shared + own[20:])
+    return lambda: JudgePrompt.build_messages("你是一名公正的裁判。", sample_text(500), answers,
+                                              judge_model="deepseek-ai/DeepSeek-V3", max_tokens=4096)
+
+
+@benchmark("judge.agreement_8x4k")
+def bench_agreement(workdir):
+    """回答一致度：8 个约 4000 字的回答两两比较"""
+    answers = {f"Vendor/Model-{i}": sample_text(4000, i % 3) for i in range(8)}
+    return lambda: measure_agreement(answers)
+
+
+# --- 配置保存 ---
+@benchmark("config.save_config_500_presets")
+def bench_save_config(workdir):
+    cfg = ConfigManager()
+    cfg.config_file = os.path.join(workdir, "config.json")  # 不覆盖真实配置
+    cfg.config = json.loads(json.dumps(cfg.default_config))
+    cfg.config["presets"] = [
+        {
+            "name": f"预设 {i}",
+            "judge_model": "deepseek-ai/DeepSeek-V3",
+            "judge_prompt": sample_text(1500, i),
+            "selected_models": [f"Vendor/Model-{j}" for j in range(6)],
+            "model_params_map": {f"Vendor/Model-{j}": {"temperature": 0.7, "top_p": 0.9, "max_tokens": 4096}
+                                 for j in range(6)},
+        }
+        for i in range(500)
+    ]
+    cfg.config["user_prompt_presets"] = [{"name": f"问题 {i}", "content": sample_text(800, i)} for i in range(200)]
+    return cfg.save_config
+
+
+def measure(fn, repeat):
+    """自动确定每组调用次数（每组至少约 0.2 秒），取 repeat 组的中位数，返回单次耗时 (毫秒)"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return statistics.median(samples) * 1000, min(samples) * 1000, number
+
+
+def load_baselines():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f).get("benchmarks", {})
+
+
+def save_baselines(results):
+    data = {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "benchmarks": {name: {"median_ms": round(r["median_ms"], 4)} for name, r in results.items()}
+    }
+    with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+        f.write("\n")
+
+
+def main():
+    global ARGS
+    parser = argparse.ArgumentParser(description="AI Arena 热点路径微基准")
+    parser.add_argument("--filter", default="", help="只运行名称包含该子串的基准")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.2, help="慢于基线超过该比例视为回退")
+    parser.add_argument("--check", action="store_true", help="出现回退时以状态码 1 退出")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--pages", default="", help="保存的 Bing 结果页目录 (*.html)")
+    parser.add_argument("--json", action="store_true")
+    ARGS = parser.parse_args()
+
+    baselines = load_baselines()
+    results, regressions = {}, []
+    workdir = tempfile.mkdtemp(prefix="arena_bench_")
+    try:
+        for name, setup in BENCHMARKS:
+            if ARGS.filter and ARGS.filter not in name:
+                continue
+            fn = setup(workdir)
+            if isinstance(fn, str):
+                print(f"{name:<36} 跳过: {fn}")
+                continue
+            median_ms, best_ms, number = measure(fn, ARGS.repeat)
+            base = baselines.get(name, {}).get("median_ms")
+            ratio = median_ms / base if base else None
+            status = ""
+            if ratio is not None:
+                if ratio > 1 + ARGS.threshold:
+                    status = "回退"
+                    regressions.append(name)
+                elif ratio < 1 - ARGS.threshold:
+                    status = "变快"
+            results[name] = {"median_ms": median_ms, "best_ms": best_ms, "number": number,
+                             "baseline_ms": base, "ratio": ratio}
+            if not ARGS.json:
+                base_text = f"基线 {base:10.3f} ms  x{ratio:5.2f}" if base else "无基线"
+                print(f"{name:<36} {median_ms:10.3f} ms  (最快 {best_ms:.3f})  {base_text}  {status}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if ARGS.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    if ARGS.update_baseline:
+        merged = {name: {"median_ms": v["median_ms"]} for name, v in baselines.items()}
+        merged.update(results)
+        save_baselines(merged)
+        print(f"基线已更新: {BASELINE_FILE}")
+    if regressions:
+        print(f"慢于基线 {ARGS.threshold:.0%} 以上: {', '.join(regressions)}")
+        if ARGS.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+本地模拟服务：兼容 SiliconFlow 的 /v1/chat/completions 接口与 Bing 搜索结果页
+用于在不消耗 Token、不依赖网络的情况下做性能测试与压测
+
+    python mock_server.py --port 8765 --ttfb 0.5 --token-rate 80 --rate-limit-rate 0.05
+    set AI_ARENA_BASE_URL=http://127.0.0.1:8765/v1
+    set AI_ARENA_SEARCH_URL=http://127.0.0.1:8765/search
+
+单个请求可用请求头 X-Mock-Options (JSON) 覆盖任意选项，例如 {"ttfb": 2, "error_rate": 1}
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_OPTIONS = {
+    "ttfb": 0.3,                # 首字节延迟 (秒)
+    "jitter": 0.1,              # 首字节延迟的随机波动 (秒)
+    "token_rate": 60.0,         # 生成速度 (tokens/秒)，0 表示不限速
+    "completion_tokens": 200,   # 每个回答的 Token 数
+    "reasoning_tokens": 0,      # 先输出的推理内容 Token 数 (reasoning_content)
+    "chunk_tokens": 4,          # 流式每个数据块包含的 Token 数
+    "error_rate": 0.0,          # 返回 500 的概率
+    "rate_limit_rate": 0.0,     # 返回 429 的概率
+    "retry_after": 1,           # 429 时的 Retry-After (秒)
+    "echo": False,              # 回答开头回显请求摘要（模型名、消息数、请求体大小、问题）
+    "search_latency": 0.2,      # 搜索页延迟 (秒)
+    "search_results": 10,       # 搜索页结果条数
+}
+
+_WORDS = ["模型", "回答", "性能", "测试", "延迟", "吞吐", "the", "quick", "arena", "token", "judge", "stream"]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持长连接，流式响应使用分块传输
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def options_for_request(self):
+        opts = dict(self.server.options)
+        override = self.headers.get("X-Mock-Options")
+        if override:
+            try:
+                opts.update(json.loads(override))
+            except ValueError:
+                pass
+        return opts
+
+    # --- 搜索页 ---
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        if parsed.path == "/stats":
+            return self.send_json(200, self.server.snapshot())
+        if parsed.path != "/search":
+            return self.send_json(404, {"error": "not found"})
+        opts = self.options_for_request()
+        self.server.count("search")
+        query = urllib.parse.parse_qs(parsed.query).get("q", [""])[0]
+        time.sleep(max(0.0, float(opts["search_latency"])))
+        body = build_search_page(query, int(opts["search_results"])).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.write(body)
+
+    def do_HEAD(self):
+        # 连接预热用
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    # --- 对话接口 ---
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not urllib.parse.urlparse(self.path).path.endswith("/chat/completions"):
+            return self.send_json(404, {"error": "not found"})
+        opts = self.options_for_request()
+        self.server.count("requests", bytes_in=len(raw))
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            return self.send_json(400, {"error": {"message": "invalid json"}})
+
+        rng = self.server.rng
+        if rng.random() < float(opts["rate_limit_rate"]):
+            self.server.count("rate_limited")
+            return self.send_json(429, {"error": {"message": "rate limited"}},
+                                  {"Retry-After": str(opts["retry_after"])})
+        if rng.random() < float(opts["error_rate"]):
+            self.server.count("errors")
+            return self.send_json(500, {"error": {"message": "injected error"}})
+
+        time.sleep(max(0.0, float(opts["ttfb"]) + rng.uniform(-1, 1) * float(opts["jitter"])))
+        prompt_tokens = max(1, len(raw) // 4)
+        answer = build_answer(payload, len(raw), opts, rng)
+        reasoning = [rng.choice(_WORDS) + " " for _ in range(int(opts["reasoning_tokens"]))]
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(answer) + len(reasoning),
+            "total_tokens": prompt_tokens + len(answer) + len(reasoning),
+            "completion_tokens_details": {"reasoning_tokens": len(reasoning)}
+        }
+        if payload.get("stream"):
+            self.stream_answer(payload, reasoning, answer, usage, opts)
+        else:
+            rate = float(opts["token_rate"])
+            if rate > 0:
+                time.sleep((len(answer) + len(reasoning)) / rate)
+            message = {"role": "assistant", "content": "".join(answer)}
+            if reasoning:
+                message["reasoning_content"] = "".join(reasoning)
+            self.send_json(200, {
+                "id": "mock", "object": "chat.completion", "model": payload.get("model", ""),
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                "usage": usage
+            })
+        self.server.count("completed")
+
+    def stream_answer(self, payload, reasoning, answer, usage, opts):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        step = max(1, int(opts["chunk_tokens"]))
+        rate = float(opts["token_rate"])
+        model = payload.get("model", "")
+        pieces = [("reasoning_content", reasoning[i:i + step]) for i in range(0, len(reasoning), step)]
+        pieces += [("content", answer[i:i + step]) for i in range(0, len(answer), step)]
+        for field, tokens in pieces:
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {field: "".join(tokens)}, "finish_reason": None}]}
+            if not self.write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"):
+                self.server.count("disconnected")  # 客户端已取消
+                return
+            if rate > 0:
+                time.sleep(len(tokens) / rate)
+        final = {"id": "mock", "object": "chat.completion.chunk", "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        self.write_chunk(f"data: {json.dumps(final)}\n\n")
+        self.write_chunk("data: [DONE]\n\n")
+        self.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text):
+        data = text.encode("utf-8")
+        return self.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def write(self, data):
+        try:
+            self.wfile.write(data)
+            self.wfile.flush()
+            return True
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            self.close_connection = True
+            return False
+
+    def send_json(self, status, obj, headers=None):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.write(body)
+
+
+def build_answer(payload, body_bytes, opts, rng):
+    """生成回答的 Token 列表；echo 时开头附上请求摘要"""
+    tokens = []
+    if opts.get("echo"):
+        messages = payload.get("messages", [])
+        question = ""
+        for msg in messages:
+            if msg.get("role") == "user":
+                content = msg.get("content")
+                if isinstance(content, list):
+                    content = " ".join(p.get("text", "") for p in content if p.get("type") == "text")
+                question = content or ""
+        summary = (f"[echo model={payload.get('model', '')} messages={len(messages)} "
+                   f"bytes={body_bytes}] {question[:200]}\n")
+        tokens.append(summary)
+    tokens.extend(rng.choice(_WORDS) + " " for _ in range(int(opts["completion_tokens"])))
+    return tokens
+
+
+def build_search_page(query, n):
+    """仿 Bing 结果页结构（#b_results > li.b_algo），供 SearchTool.parse_results 解析"""
+    esc = query.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    items = [f'<div class="b_ans">关于 {esc} 的精选答案：这是模拟服务返回的摘要内容，用于测试解析。</div>']
+    for i in range(n):
+        items.append(
+            f'<li class="b_algo"><h2><a href="https://example.com/{i}">{esc} - 结果 {i + 1}</a></h2>'
+            f'<div class="b_caption"><p>第 {i + 1} 条模拟摘要：{esc} 的相关介绍与说明。</p></div></li>')
+    return (f"<html><head><title>{esc} - 搜索</title></head><body>"
+            f"<ol id=\"b_results\">{''.join(items)}</ol></body></html>")
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端取消 / 关闭空闲长连接属于正常情况，不打印堆栈
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError, ConnectionAbortedError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockServer:
+    """在后台线程中运行的模拟服务；可作为上下文管理器使用"""
+    def __init__(self, host="127.0.0.1", port=0, verbose=False, seed=None, **options):
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise ValueError(f"未知的模拟选项: {', '.join(sorted(unknown))}")
+        self.httpd = _QuietHTTPServer((host, port), MockHandler)
+        self.httpd.options = dict(DEFAULT_OPTIONS, **options)
+        self.httpd.verbose = verbose
+        self.httpd.rng = random.Random(seed)
+        self.httpd.stats = {}
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.count = lambda name, bytes_in=0: self._count(name, bytes_in)
+        self.httpd.snapshot = self.stats
+        self._thread = None
+
+    def _count(self, name, bytes_in):
+        with self.httpd.stats_lock:
+            self.httpd.stats[name] = self.httpd.stats.get(name, 0) + 1
+            if bytes_in:
+                self.httpd.stats["bytes_in"] = self.httpd.stats.get("bytes_in", 0) + bytes_in
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.url}/v1/chat/completions"
+
+    @property
+    def search_url(self):
+        return f"{self.url}/search"
+
+    def set_options(self, **options):
+        self.httpd.options.update(options)
+
+    def stats(self):
+        with self.httpd.stats_lock:
+            return dict(self.httpd.stats)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def add_option_args(parser):
+    """把 DEFAULT_OPTIONS 中的每一项注册为命令行参数 (--token-rate 等)"""
+    for name, default in DEFAULT_OPTIONS.items():
+        flag = "--" + name.replace("_", "-")
+        if isinstance(default, bool):
+            parser.add_argument(flag, action="store_true", default=default)
+        else:
+            parser.add_argument(flag, type=type(default), default=default)
+
+
+def options_from_args(args):
+    return {name: getattr(args, name) for name in DEFAULT_OPTIONS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SiliconFlow / Bing 本地模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    add_option_args(parser)
+    args = parser.parse_args()
+    server = MockServer(args.host, args.port, verbose=args.verbose, seed=args.seed, **options_from_args(args))
+    print(f"模拟服务已启动: {server.url}")
+    print(f"  AI_ARENA_BASE_URL={server.url}/v1")
+    print(f"  AI_ARENA_SEARCH_URL={server.search_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
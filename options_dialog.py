@@ -1,6 +1,6 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
                              QPushButton, QSpinBox, QColorDialog, QDialogButtonBox, 
-                             QLineEdit, QFrame)
+                             QLineEdit, QFrame, QCheckBox, QComboBox, QDoubleSpinBox)
 from PyQt6.QtCore import Qt
 
 class OptionsDialog(QDialog):
@@ -48,6 +48,71 @@ class OptionsDialog(QDialog):
         self.cookie_input.setPlaceholderText("在此粘贴 cn.bing.com 的 Cookie (MUID=...; ...)")
         self.cookie_input.setText(self.bing_cookie)
         layout.addWidget(self.cookie_input)
+        layout.addWidget(QLabel("API 接口地址 (留空使用 SiliconFlow 官方地址):"))
+        self.base_url_input = QLineEdit()
+        self.base_url_input.setPlaceholderText("https://api.siliconflow.cn/v1")
+        self.base_url_input.setText(self.cfg_mgr.get_api_base_url())
+        layout.addWidget(self.base_url_input)
+        
+        # 输出
+        line2 = QFrame(); line2.setFrameShape(QFrame.Shape.HLine); line2.setFrameShadow(QFrame.Shadow.Sunken)
+        layout.addWidget(line2)
+        
+        layout.addWidget(QLabel("<b>输出设置 (Output Settings)</b>"))
+        self.chk_stream = QCheckBox("流式输出 (边生成边显示，首字更快)")
+        self.chk_stream.setChecked(self.cfg_mgr.get_stream_output())
+        layout.addWidget(self.chk_stream)
+        self.spin_concurrency = QSpinBox(); self.spin_concurrency.setRange(1, 64)
+        self.spin_concurrency.setValue(self.cfg_mgr.get_max_concurrency())
+        self.spin_concurrency.setToolTip("同时进行的模型/搜索请求数上限，超出的请求排队等待")
+        layout.addLayout(self.create_row("最大并发请求数:", self.spin_concurrency))
+        self.chk_trace = QCheckBox("记录每轮运行追踪 (写入 traces/ 目录，可用 Perfetto 打开)")
+        self.chk_trace.setChecked(self.cfg_mgr.get_trace_runs())
+        layout.addWidget(self.chk_trace)
+        self.chk_judge_reasoning = QCheckBox("裁判评审时包含思考模型的推理过程 (会显著增加裁判输入)")
+        self.chk_judge_reasoning.setChecked(self.cfg_mgr.get_judge_include_reasoning())
+        layout.addWidget(self.chk_judge_reasoning)
+        tournament = self.cfg_mgr.get_judge_tournament()
+        self.chk_tournament = QCheckBox("淘汰赛裁判 (选手较多时分组并发评审，逐轮合并后再总评)")
+        self.chk_tournament.setChecked(bool(tournament["enabled"]))
+        layout.addWidget(self.chk_tournament)
+        self.spin_fan_out = QSpinBox(); self.spin_fan_out.setRange(2, 16)
+        self.spin_fan_out.setValue(int(tournament["fan_out"]))
+        layout.addLayout(self.create_row("每组回答数:", self.spin_fan_out))
+        self.spin_depth = QSpinBox(); self.spin_depth.setRange(1, 6)
+        self.spin_depth.setValue(int(tournament["max_depth"]))
+        self.spin_depth.setToolTip("串行裁判调用的最多轮数，含最后的总评；为 1 时等同于不分组")
+        layout.addLayout(self.create_row("最多评审轮数:", self.spin_depth))
+        shortcut = self.cfg_mgr.get_judge_shortcut()
+        self.chk_shortcut = QCheckBox("各回答高度一致时简化裁判 (本地计算一致度，不额外调用模型)")
+        self.chk_shortcut.setChecked(bool(shortcut["enabled"]))
+        layout.addWidget(self.chk_shortcut)
+        self.spin_shortcut_threshold = QDoubleSpinBox(); self.spin_shortcut_threshold.setRange(0.5, 1.0)
+        self.spin_shortcut_threshold.setSingleStep(0.01); self.spin_shortcut_threshold.setDecimals(2)
+        self.spin_shortcut_threshold.setValue(float(shortcut["threshold"]))
+        self.spin_shortcut_threshold.setToolTip("各回答两两相似度的最低值达到该值时视为一致")
+        layout.addLayout(self.create_row("一致度阈值:", self.spin_shortcut_threshold))
+        self.combo_shortcut_mode = QComboBox()
+        self.combo_shortcut_mode.addItem("简短确认 (裁判输出更短)", "brief")
+        self.combo_shortcut_mode.addItem("跳过裁判 (直接采用共识回答)", "skip")
+        self.combo_shortcut_mode.setCurrentIndex(max(0, self.combo_shortcut_mode.findData(shortcut["mode"])))
+        layout.addLayout(self.create_row("一致时:", self.combo_shortcut_mode))
+        
+        # 图片压缩
+        layout.addWidget(QLabel("<b>图片上传压缩 (Image Upload)</b>"))
+        img_opts = self.cfg_mgr.get_image_upload()
+        self.spin_img_edge = QSpinBox(); self.spin_img_edge.setRange(256, 8192); self.spin_img_edge.setSingleStep(256)
+        self.spin_img_edge.setValue(int(img_opts["max_edge"]))
+        layout.addLayout(self.create_row("最长边 (px):", self.spin_img_edge))
+        self.spin_img_quality = QSpinBox(); self.spin_img_quality.setRange(20, 95)
+        self.spin_img_quality.setValue(int(img_opts["quality"]))
+        layout.addLayout(self.create_row("压缩质量:", self.spin_img_quality))
+        self.combo_img_fmt = QComboBox(); self.combo_img_fmt.addItems(["JPEG", "WEBP"])
+        self.combo_img_fmt.setCurrentText(str(img_opts["format"]).upper())
+        layout.addLayout(self.create_row("编码格式:", self.combo_img_fmt))
+        self.spin_img_kb = QSpinBox(); self.spin_img_kb.setRange(64, 20480); self.spin_img_kb.setSingleStep(256)
+        self.spin_img_kb.setValue(int(img_opts["max_kb"]))
+        layout.addLayout(self.create_row("单张上限 (KB):", self.spin_img_kb))
         
         layout.addStretch()
         
@@ -108,4 +173,15 @@ class OptionsDialog(QDialog):
     def save_all(self):
         self.cfg_mgr.set_theme(self.bg_color, self.text_color, self.spin_font.value())
         self.cfg_mgr.set_bing_cookie(self.cookie_input.text())
+        self.cfg_mgr.set_api_base_url(self.base_url_input.text())
+        self.cfg_mgr.set_stream_output(self.chk_stream.isChecked())
+        self.cfg_mgr.set_max_concurrency(self.spin_concurrency.value())
+        self.cfg_mgr.set_trace_runs(self.chk_trace.isChecked())
+        self.cfg_mgr.set_judge_include_reasoning(self.chk_judge_reasoning.isChecked())
+        self.cfg_mgr.set_judge_tournament(self.chk_tournament.isChecked(), self.spin_fan_out.value(),
+                                          self.spin_depth.value())
+        self.cfg_mgr.set_judge_shortcut(self.chk_shortcut.isChecked(), self.spin_shortcut_threshold.value(),
+                                        self.combo_shortcut_mode.currentData())
+        self.cfg_mgr.set_image_upload(self.spin_img_edge.value(), self.spin_img_quality.value(),
+                                      self.combo_img_fmt.currentText(), self.spin_img_kb.value())
         self.accept()
\ No newline at end of file
@@ -0,0 +1,98 @@
+import re
+
+class PromptBudgeter:
+    """
+    上下文预算：发送前在本地估算各部分的 Token 数，
+    超出模型上下文窗口时按优先级从低到高截断或丢弃，并报告裁剪了什么
+    """
+    # 各模型的上下文窗口 (Token)，按子串匹配模型名，靠前的优先
+    MODEL_CONTEXT_LIMITS = [
+        ("DeepSeek-R1", 65536),
+        ("DeepSeek-V3", 65536),
+        ("deepseek-vl2", 4096),
+        ("Kimi-K2", 131072),
+        ("Qwen3-VL", 131072),
+        ("Qwen3", 32768),
+        ("Qwen2.5-72B", 32768),
+        ("Qwen2-VL", 32768),
+        ("Llama-3.2", 131072),
+    ]
+    DEFAULT_CONTEXT_LIMIT = 32768
+    SAFETY_MARGIN = 0.9         # 估算有误差，只用窗口的 90%
+    DEFAULT_OUTPUT_RESERVE = 2048
+    MIN_KEEP_TOKENS = 200       # 截断后不足该长度则整体丢弃
+
+    # 中日韩字符大约 1 字 1 Token，其余按约 4 字符 1 Token 估算
+    _CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+    @staticmethod
+    def estimate_tokens(text):
+        if not text:
+            return 0
+        cjk = len(PromptBudgeter._CJK_RE.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    @staticmethod
+    def context_limit(model_name):
+        lowered = (model_name or "").lower()
+        for pattern, limit in PromptBudgeter.MODEL_CONTEXT_LIMITS:
+            if pattern.lower() in lowered:
+                return limit
+        return PromptBudgeter.DEFAULT_CONTEXT_LIMIT
+
+    @staticmethod
+    def input_budget(model_name, max_tokens=None, fixed_tokens=0):
+        """可用于输入文本的 Token 预算 = 窗口 × 安全系数 - 输出预留 - 固定开销（图片等）"""
+        reserve = int(max_tokens) if max_tokens else PromptBudgeter.DEFAULT_OUTPUT_RESERVE
+        limit = int(PromptBudgeter.context_limit(model_name) * PromptBudgeter.SAFETY_MARGIN)
+        return max(0, limit - reserve - fixed_tokens)
+
+    @staticmethod
+    def truncate_to_tokens(text, max_tokens):
+        """按估算比例截取文本开头，使其不超过 max_tokens"""
+        tokens = PromptBudgeter.estimate_tokens(text)
+        if tokens <= max_tokens:
+            return text
+        cut = int(len(text) * max_tokens / tokens)
+        # 比例估算可能略超，逐步收缩
+        while cut > 0 and PromptBudgeter.estimate_tokens(text[:cut]) > max_tokens:
+            cut = int(cut * 0.95)
+        return text[:cut]
+
+    @staticmethod
+    def fit(parts, budget):
+        """
+        parts: [{"name", "text", "priority"}]，priority 越大越重要
+        返回 (裁剪后的文本列表，与 parts 顺序一致, 裁剪报告列表)
+        同优先级内先处理最长的部分；截断后不足 MIN_KEEP_TOKENS 的整体丢弃
+        """
+        tokens = [PromptBudgeter.estimate_tokens(p["text"]) for p in parts]
+        texts = [p["text"] for p in parts]
+        total = sum(tokens)
+        report = []
+        if total <= budget:
+            return texts, report
+
+        order = sorted(range(len(parts)), key=lambda i: (parts[i].get("priority", 0), -tokens[i]))
+        for i in order:
+            overflow = total - budget
+            if overflow <= 0:
+                break
+            name = parts[i]["name"]
+            keep = tokens[i] - overflow
+            if keep >= PromptBudgeter.MIN_KEEP_TOKENS:
+                texts[i] = PromptBudgeter.truncate_to_tokens(texts[i], keep - 30) + f"\n...({name} 超出上下文预算，已截断)..."
+                new_tokens = PromptBudgeter.estimate_tokens(texts[i])
+                report.append(f"{name}: 截断 {tokens[i]} → {new_tokens} tokens")
+            elif parts[i].get("priority", 0) >= max(p.get("priority", 0) for p in parts):
+                # 最高优先级（用户问题）不丢弃，只尽量截断
+                texts[i] = PromptBudgeter.truncate_to_tokens(texts[i], max(1, keep))
+                new_tokens = PromptBudgeter.estimate_tokens(texts[i])
+                report.append(f"{name}: 截断 {tokens[i]} → {new_tokens} tokens")
+            else:
+                texts[i] = f"\n\n[系统提示: {name} 超出上下文预算，已省略]"
+                new_tokens = PromptBudgeter.estimate_tokens(texts[i])
+                report.append(f"{name}: 已省略 ({tokens[i]} tokens)")
+            total += new_tokens - tokens[i]
+            tokens[i] = new_tokens
+        return texts, report
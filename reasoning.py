@@ -0,0 +1,121 @@
+import re
+
+# 开头的 <think>...</think> 块
+_THINK_BLOCK_RE = re.compile(r'^\s*<think>(.*?)</think>\s*', re.DOTALL)
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def split_think(text, reasoning_model=False):
+    """
+    把回答开头的推理块与正文分开，返回 (正文, 推理内容)
+    支持 <think>...</think>；未闭合的 <think> 视为整段都是推理
+    只有闭标签的写法（部分推理模型省略开标签）：闭标签位于开头时去掉它；
+    出现在正文中间时，仅当接口表明这是推理模型（reasoning_model）且之前没有开标签才作为分隔，
+    否则原样保留——普通回答可能只是在讲解这个标签
+    """
+    if not text:
+        return text or "", ""
+    match = _THINK_BLOCK_RE.match(text)
+    if match:
+        return text[match.end():], match.group(1).strip()
+    stripped = text.lstrip()
+    if stripped.startswith(THINK_OPEN):
+        return "", stripped[len(THINK_OPEN):].strip()  # 输出被截断，推理尚未结束
+    if stripped.startswith(THINK_CLOSE):
+        return stripped[len(THINK_CLOSE):].lstrip(), ""
+    if reasoning_model:
+        reasoning, sep, content = text.partition(THINK_CLOSE)
+        if sep and THINK_OPEN not in reasoning:
+            return content.lstrip(), reasoning.strip()
+    return text, ""
+
+
+class ThinkStreamSplitter:
+    """
+    流式版本：逐段喂入 content 增量，返回其中属于正文的部分，推理部分累积在 reasoning 中
+    判定规则与 split_think 相同；reasoning_model 须在首段正文之前确定（见 mark_reasoning_model），
+    此时闭标签之前的内容先按推理缓存，流结束仍未见到闭标签则整段归为正文
+    标签可能被拆在两个数据块之间，不确定时先缓存
+    """
+    def __init__(self, reasoning_model=False):
+        # start: 尚未确定；think: <think> 块内；maybe_think: 推理模型、尚未见到闭标签；content: 正文
+        self.state = "start"
+        self.reasoning_model = reasoning_model
+        self.reasoning = []
+        self._buf = ""
+        self._after_tag = False  # 刚越过标签：正文开头的空白可能落在后续数据块中，一并去掉
+
+    def mark_reasoning_model(self):
+        """接口表明是推理模型（例如先返回了 reasoning_content）；正文开始之后不再改变判定"""
+        if self.state == "start" and not self._buf:
+            self.reasoning_model = True
+
+    def feed(self, text):
+        self._buf += text
+        out = []
+        while self._buf:
+            if self.state == "start":
+                head = self._buf.lstrip()
+                if head.startswith(THINK_OPEN):
+                    self._buf = head[len(THINK_OPEN):]
+                    self.state = "think"
+                elif head.startswith(THINK_CLOSE):
+                    self._buf = head[len(THINK_CLOSE):]
+                    self.state = "content"
+                    self._after_tag = True
+                elif not head or THINK_OPEN.startswith(head) or THINK_CLOSE.startswith(head):
+                    break  # 可能是被拆开的标签，等下一段
+                else:
+                    self.state = "maybe_think" if self.reasoning_model else "content"
+            elif self.state == "think":
+                idx = self._buf.find(THINK_CLOSE)
+                if idx >= 0:
+                    self.reasoning.append(self._buf[:idx])
+                    self._buf = self._buf[idx + len(THINK_CLOSE):]
+                    self.state = "content"
+                    self._after_tag = True
+                    continue
+                keep = self._partial_suffix(self._buf, THINK_CLOSE)
+                self.reasoning.append(self._buf[:len(self._buf) - keep])
+                self._buf = self._buf[len(self._buf) - keep:]
+                break
+            elif self.state == "maybe_think":
+                # 整段缓存直到出现闭标签；先出现开标签则不是推理块，全部作为正文
+                close = self._buf.find(THINK_CLOSE)
+                opened = self._buf.find(THINK_OPEN)
+                if opened >= 0 and (close < 0 or opened < close):
+                    self.state = "content"
+                    continue
+                if close >= 0:
+                    self.reasoning.append(self._buf[:close])
+                    self._buf = self._buf[close + len(THINK_CLOSE):]
+                    self.state = "content"
+                    self._after_tag = True
+                    continue
+                break
+            else:
+                if self._after_tag:
+                    self._buf = self._buf.lstrip()
+                    if not self._buf:
+                        break
+                    self._after_tag = False
+                out.append(self._buf)
+                self._buf = ""
+        return "".join(out)
+
+    def flush(self):
+        """流结束：缓存中剩余的内容按当前状态归类"""
+        rest, self._buf = self._buf, ""
+        if self.state == "think":
+            self.reasoning.append(rest)
+            return ""
+        return rest
+
+    @staticmethod
+    def _partial_suffix(text, tag):
+        """text 末尾与 tag 开头重合的最长长度"""
+        for n in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:n]):
+                return n
+        return 0
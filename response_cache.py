@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+class ResponseCache:
+    """
+    模型回答的磁盘缓存：键为 (实际模型名, 消息, 附件摘要, 采样参数) 的哈希
+    同一问题重复运行（例如只换了裁判或裁判指令）时，选手直接复用上次的回答
+    每条记录一个 JSON 文件，按存活时间和总大小淘汰
+    """
+    _lock = threading.Lock()
+    _directory = None          # 未配置目录时缓存关闭
+    _max_bytes = 200 * 1024 * 1024
+    _max_age_seconds = 7 * 24 * 3600
+    _puts_since_prune = 0
+    PRUNE_EVERY = 20           # 每写入若干条检查一次淘汰
+
+    @classmethod
+    def configure(cls, directory, max_mb=200, max_age_days=7):
+        with cls._lock:
+            cls._directory = directory
+            cls._max_bytes = max(1, int(max_mb)) * 1024 * 1024
+            cls._max_age_seconds = max(0.0, float(max_age_days)) * 24 * 3600
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            cls.prune()
+
+    @classmethod
+    def is_enabled(cls):
+        return bool(cls._directory)
+
+    @staticmethod
+    def make_key(model_name, messages, attachment_digests, params, extra=None, endpoint=None):
+        """
+        对请求的有效输入做规范化 JSON 序列化后取 SHA-256
+        endpoint 为接口地址：模拟服务或代理上得到的回答不能在真实接口上复用，反之亦然
+        """
+        material = {
+            "endpoint": endpoint,
+            "model": model_name,
+            "messages": messages,
+            "attachments": list(attachment_digests or []),
+            "params": params,
+            "extra": extra
+        }
+        blob = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _path(cls, key):
+        return os.path.join(cls._directory, f"{key}.json")
+
+    @classmethod
+    def get(cls, key):
+        """命中且未过期时返回缓存的响应 dict，否则返回 None"""
+        if not cls._directory:
+            return None
+        path = cls._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cls._max_age_seconds and time.time() - record.get("created", 0) > cls._max_age_seconds:
+            try: os.remove(path)
+            except OSError: pass
+            return None
+        try:
+            os.utime(path, None)  # 记录最近使用时间，淘汰时优先保留常用条目
+        except OSError:
+            pass
+        return record.get("response")
+
+    @classmethod
+    def put(cls, key, model_name, response):
+        if not cls._directory:
+            return
+        record = {"created": time.time(), "model": model_name, "response": response}
+        path = cls._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入回答缓存失败: {e}")
+            try: os.remove(tmp_path)
+            except OSError: pass
+            return
+
+        with cls._lock:
+            cls._puts_since_prune += 1
+            need_prune = cls._puts_since_prune >= cls.PRUNE_EVERY
+            if need_prune:
+                cls._puts_since_prune = 0
+        if need_prune:
+            cls.prune()
+
+    @classmethod
+    def prune(cls):
+        """删除过期条目；总大小超限时按最近使用时间从旧到新删除"""
+        directory = cls._directory
+        if not directory or not os.path.isdir(directory):
+            return
+        now = time.time()
+        files = []
+        for name in os.listdir(directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if cls._max_age_seconds and now - st.st_mtime > cls._max_age_seconds:
+                try: os.remove(path)
+                except OSError: pass
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        if total <= cls._max_bytes:
+            return
+        files.sort()
+        for _, size, path in files:
+            if total <= cls._max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    @classmethod
+    def clear(cls):
+        directory = cls._directory
+        if not directory or not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                try: os.remove(os.path.join(directory, name))
+                except OSError: pass
@@ -0,0 +1,133 @@
+import re
+import math
+from collections import Counter
+
+# 可选：NumPy 用于向量化打分，缺失时退回纯 Python 实现
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+_WORD_RE = re.compile(r'[a-z0-9_]+')
+_CJK_RUN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+
+
+def tokenize(text):
+    """英文/数字按单词切分，中文按相邻二字 (bigram) 切分，单字句保留单字"""
+    text = text.lower()
+    tokens = _WORD_RE.findall(text)
+    for run in _CJK_RUN_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def chunk_lines(lines, chunk_chars=1500):
+    """按行累积成块，每块约 chunk_chars 字符；超长的单行会被硬切分"""
+    buf, size = [], 0
+    for line in lines:
+        while len(line) > chunk_chars:
+            if buf:
+                yield "".join(buf)
+                buf, size = [], 0
+            yield line[:chunk_chars]
+            line = line[chunk_chars:]
+        if size + len(line) > chunk_chars and buf:
+            yield "".join(buf)
+            buf, size = [], 0
+        buf.append(line)
+        size += len(line)
+    if buf:
+        yield "".join(buf)
+
+
+def iter_file_chunks(file_path, chunk_chars=1500):
+    """流式读取文本文件并分块，不把整个文件读入内存；UTF-8 失败时退回 Latin-1"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return list(chunk_lines(f, chunk_chars))
+    except UnicodeDecodeError:
+        with open(file_path, 'r', encoding='latin-1') as f:
+            return list(chunk_lines(f, chunk_chars))
+
+
+def chunk_text(text, chunk_chars=1500):
+    return list(chunk_lines(text.splitlines(keepends=True), chunk_chars))
+
+
+class BM25Index:
+    """
+    内存中的 BM25 倒排索引
+    每个词的倒排表以 (文档下标数组, 词频数组) 存储，查询时按词向量化累加得分
+    """
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(chunks)
+
+        postings = {}
+        doc_lens = []
+        for doc_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+
+        self.avg_len = (sum(doc_lens) / self.n_docs) if self.n_docs else 0.0
+        if HAS_NUMPY:
+            self.doc_lens = np.asarray(doc_lens, dtype=np.float32)
+            self.postings = {
+                t: (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+                for t, (ids, tfs) in postings.items()
+            }
+        else:
+            self.doc_lens = doc_lens
+            self.postings = postings
+
+    def idf(self, term):
+        df = len(self.postings[term][0])
+        return math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+    def scores(self, query):
+        """返回每个块对 query 的 BM25 得分"""
+        terms = [t for t in set(tokenize(query)) if t in self.postings]
+        avg = self.avg_len or 1.0
+        if HAS_NUMPY:
+            scores = np.zeros(self.n_docs, dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lens / avg)
+            for term in terms:
+                ids, tfs = self.postings[term]
+                scores[ids] += self.idf(term) * tfs * (self.k1 + 1) / (tfs + norm[ids])
+            return scores
+        scores = [0.0] * self.n_docs
+        for term in terms:
+            idf = self.idf(term)
+            ids, tfs = self.postings[term]
+            for doc_id, tf in zip(ids, tfs):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_id] / avg)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def top_k(self, query, k):
+        """取得分最高的 k 个块的下标，按原文顺序返回（保持上下文连贯）"""
+        if self.n_docs <= k:
+            return list(range(self.n_docs))
+        scores = self.scores(query)
+        if HAS_NUMPY:
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = [int(i) for i in best if scores[i] > 0]
+        else:
+            best = sorted(range(self.n_docs), key=lambda i: scores[i], reverse=True)[:k]
+            best = [i for i in best if scores[i] > 0]
+        if not best:
+            best = list(range(k))  # 没有任何命中时退回文档开头
+        return sorted(best)
+
+    def size_bytes(self):
+        return sum(len(c) for c in self.chunks) * 2
@@ -0,0 +1,105 @@
+import time
+import random
+import threading
+import email.utils
+
+class RetryPolicy:
+    """
+    重试策略：指数退避 + 全随机抖动 (full jitter)，支持 429 与 Retry-After
+    抖动让多个并发线程错开重试时刻，避免同时冲击服务端
+    """
+    RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=30.0, max_retry_after=120.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, attempt, status_code=None):
+        """attempt 从 0 开始；status_code 为 None 表示网络错误/超时"""
+        if attempt >= self.max_retries:
+            return False
+        return status_code is None or status_code in self.RETRYABLE_STATUS
+
+    def backoff(self, attempt, retry_after=None):
+        """第 attempt 次失败后应等待的秒数"""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            # 服务端给出的等待时间优先，再加少量抖动
+            delay = min(self.max_retry_after, retry_after) + random.uniform(0, self.base_delay)
+        return delay
+
+    @staticmethod
+    def parse_retry_after(value):
+        """解析 Retry-After 头：秒数或 HTTP 日期；无法解析返回 None"""
+        if not value:
+            return None
+        value = str(value).strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            dt = email.utils.parsedate_to_datetime(value)
+            return max(0.0, dt.timestamp() - time.time())
+        except (TypeError, ValueError, IndexError):
+            return None
+
+
+class CircuitBreaker:
+    """
+    按模型熔断：连续失败（按调用计，一次调用内的重试只算一次）达到阈值后在冷却期内直接拒绝请求，
+    避免已经故障的模型在每一轮都耗满超时；冷却结束后只放行一个试探请求，其余请求在试探结束前继续拒绝
+    """
+    def __init__(self, failure_threshold=3, cooldown_seconds=60.0, max_cooldown_seconds=600.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self._lock = threading.Lock()
+        self._states = {}  # model -> {"failures", "open_until", "cooldown", "probing"}
+
+    def allow(self, model):
+        """返回 (是否放行, 剩余冷却秒数, 是否为试探请求)；试探请求结束后须调用 end_probe"""
+        with self._lock:
+            st = self._states.get(model)
+            if not st or not st["open_until"]:
+                return True, 0.0, False
+            remaining = st["open_until"] - time.time()
+            if remaining > 0:
+                return False, remaining, False
+            if st["probing"]:
+                return False, 0.0, False
+            st["probing"] = True
+            return True, 0.0, True
+
+    def end_probe(self, model):
+        """试探请求结束但未记录成功或失败（被取消、客户端错误等）：允许下一个请求试探"""
+        with self._lock:
+            st = self._states.get(model)
+            if st:
+                st["probing"] = False
+
+    def record_success(self, model):
+        with self._lock:
+            self._states.pop(model, None)
+
+    def record_failure(self, model):
+        with self._lock:
+            st = self._states.setdefault(model, {"failures": 0, "open_until": 0.0, "cooldown": self.cooldown_seconds,
+                                                 "probing": False})
+            st["probing"] = False
+            st["failures"] += 1
+            if st["failures"] >= self.failure_threshold:
+                # 试探失败时冷却时间翻倍
+                if st["open_until"]:
+                    st["cooldown"] = min(self.max_cooldown_seconds, st["cooldown"] * 2)
+                st["open_until"] = time.time() + st["cooldown"]
+
+    def reset(self, model=None):
+        with self._lock:
+            if model is None:
+                self._states.clear()
+            else:
+                self._states.pop(model, None)
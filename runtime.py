@@ -0,0 +1,90 @@
+import os
+from llm_client import LLMClient
+from search_tool import SearchTool
+from executor import TaskExecutor
+from http_session import HttpSessionPool
+from attachment_cache import AttachmentCache
+from response_cache import ResponseCache
+from key_scheduler import KeyScheduler
+from latency_tracker import LatencyTracker
+from tracing import Tracer
+from cassette import Cassette
+from judge_prompt import JudgePrompt
+from arena_engine import ArenaEngine
+
+class Runtime:
+    """
+    按 ConfigManager 的配置初始化进程级共享组件（接口地址、线程池、连接池、各类缓存、延迟记录、追踪、磁带）
+    图形界面与无界面入口（批处理、服务）共用，保证行为一致
+    """
+    @staticmethod
+    def configure(cfg_mgr, prewarm=True):
+        # 接口地址可指向本地模拟服务或代理；环境变量优先于配置文件
+        LLMClient.configure_endpoint(os.environ.get("AI_ARENA_BASE_URL") or cfg_mgr.get_api_base_url())
+        SearchTool.configure_endpoint(os.environ.get("AI_ARENA_SEARCH_URL") or cfg_mgr.get_search_url())
+        # 所有模型/搜索调用共用一个有界线程池
+        TaskExecutor.shared().set_max_workers(cfg_mgr.get_max_concurrency())
+        # 共享连接池：按配置设置大小，并在后台预热到 API / 搜索主机的连接
+        HttpSessionPool.configure(max(cfg_mgr.get_http_pool_size(), cfg_mgr.get_max_concurrency()))
+        # 磁带须先于预热生效：录制/回放时不访问真实网络，也不预热
+        Runtime.apply_cassette(cfg_mgr)
+        if prewarm and Cassette.mode() == "off":
+            warm_urls = [LLMClient.BASE_URL]
+            if cfg_mgr.get_bing_cookie():
+                warm_urls.append(SearchTool.SEARCH_URL)
+            HttpSessionPool.prewarm_async(warm_urls)
+        AttachmentCache.configure(max_bytes=cfg_mgr.get_attachment_cache_mb() * 1024 * 1024)
+        Runtime.apply_image_options(cfg_mgr)
+        r_opts = cfg_mgr.get_retrieval()
+        LLMClient.configure_retrieval(r_opts["enabled"], r_opts["min_chars"], r_opts["chunk_chars"], r_opts["top_k"])
+        cache_opts = cfg_mgr.get_response_cache()
+        if cache_opts.get("enabled", True):
+            ResponseCache.configure(os.path.join(cfg_mgr.base_dir, "cache", "responses"),
+                                    cache_opts.get("max_mb", 200), cache_opts.get("max_age_days", 7))
+        # 各模型的历史延迟：用于自适应超时与对冲请求，跨会话累积
+        latency_opts = cfg_mgr.get_latency()
+        LLMClient.ADAPTIVE_TIMEOUTS = bool(latency_opts.get("adaptive_timeout", True))
+        LLMClient.HEDGING_ENABLED = bool(latency_opts.get("hedge_requests", True))
+        LatencyTracker.shared().configure(os.path.join(cfg_mgr.base_dir, "cache", "latency.json"))
+        JudgePrompt.configure_compression(**cfg_mgr.get_judge_compression())
+        JudgePrompt.INCLUDE_REASONING = cfg_mgr.get_judge_include_reasoning()
+        ArenaEngine.configure_tournament(**cfg_mgr.get_judge_tournament())
+        ArenaEngine.configure_shortcut(**cfg_mgr.get_judge_shortcut())
+        Tracer.configure(cfg_mgr.get_trace_runs())
+
+    @staticmethod
+    def apply_image_options(cfg_mgr):
+        opts = cfg_mgr.get_image_upload()
+        LLMClient.configure_images(max_edge=opts["max_edge"], quality=opts["quality"],
+                                   fmt=opts["format"], max_bytes=int(opts["max_kb"]) * 1024)
+
+    @staticmethod
+    def apply_cassette(cfg_mgr):
+        """磁带模式：录制或回放 HTTP 交换（路径相对于程序目录）"""
+        opts = cfg_mgr.get_cassette()
+        path = opts.get("path") or ""
+        if path and not os.path.isabs(path):
+            path = os.path.join(cfg_mgr.base_dir, path)
+        try:
+            Cassette.configure(opts.get("mode", "off"), path, opts.get("time_scale", 1.0))
+        except ValueError as e:
+            print(f"磁带模式配置无效: {e}")
+            return
+        if Cassette.mode() != "off":
+            print(f"磁带模式: {Cassette.mode()} ({path})")
+
+    @staticmethod
+    def make_key_scheduler(cfg_mgr, extra_keys=None):
+        """多 Key 调度：配置中的 Key 加上环境变量 SILICONFLOW_API_KEYS（逗号分隔）与 extra_keys"""
+        keys = list(cfg_mgr.get_api_keys())
+        env_keys = os.environ.get("SILICONFLOW_API_KEYS", "")
+        for key in [k.strip() for k in env_keys.split(",")] + list(extra_keys or []):
+            if key and key not in keys:
+                keys.append(key)
+        limits = cfg_mgr.get_key_limits()
+        return KeyScheduler(keys, limits["rpm"], limits["tpm"])
+
+    @staticmethod
+    def shutdown():
+        LatencyTracker.shared().save()
+        HttpSessionPool.close_all()
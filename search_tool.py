@@ -1,37 +1,82 @@
-import requests
 from bs4 import BeautifulSoup
 import urllib.parse
+from http_session import HttpSessionPool
+from cancel_token import abort_response
+from tracing import traced
+from cassette import Cassette
 
 class SearchTool:
+    DEFAULT_SEARCH_URL = "https://cn.bing.com/search"
+    SEARCH_URL = DEFAULT_SEARCH_URL
+
+    @staticmethod
+    def configure_endpoint(search_url=None):
+        """设置搜索页地址（例如本地模拟服务），为空时恢复 Bing 国内版"""
+        SearchTool.SEARCH_URL = (search_url or "").strip() or SearchTool.DEFAULT_SEARCH_URL
+        return SearchTool.SEARCH_URL
+
     @staticmethod
-    def search(query, max_results=5, cookie=None):
+    @traced("search.bing")
+    def search(query, max_results=5, cookie=None, cancel_token=None):
         """
         使用 Bing 国内版进行联网搜索
+        cancel_token 被取消时立即断开连接并返回空字符串
         """
         if not query:
             return ""
 
         optimized_query = query.strip()
         encoded_query = urllib.parse.quote(optimized_query, encoding='utf-8')
-        url = f"https://cn.bing.com/search?q={encoded_query}"
+        url = f"{SearchTool.SEARCH_URL}?q={encoded_query}"
+        origin = "/".join(SearchTool.SEARCH_URL.split("/")[:3]) + "/"
 
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Referer": "https://cn.bing.com/"
+            "Referer": origin
         }
         
         if cookie:
             headers["Cookie"] = cookie
         
-        results_text = f"【联网搜索结果 (关键词: {optimized_query})】:\n"
-        
         try:
-            response = requests.get(url, headers=headers, timeout=10, verify=True)
+            response = Cassette.request(HttpSessionPool.get_session(url), "GET", url, headers=headers, timeout=10,
+                                        verify=True, stream=cancel_token is not None)
             if response.status_code != 200:
+                response.close()
                 return f"[联网搜索失败: HTTP {response.status_code}]"
 
-            soup = BeautifulSoup(response.text, 'html.parser')
+            if cancel_token is None:
+                html = response.text
+            else:
+                # 分块读取，每块之间检查是否已取消
+                abort = lambda: abort_response(response)
+                cancel_token.register(abort)
+                try:
+                    body = []
+                    for block in response.iter_content(chunk_size=16384):
+                        if cancel_token.cancelled:
+                            return ""
+                        body.append(block)
+                finally:
+                    cancel_token.unregister(abort)
+                    response.close()
+                html = b"".join(body).decode(response.encoding or 'utf-8', errors='replace')
+        except Exception as e:
+            if cancel_token is not None and cancel_token.cancelled:
+                return ""
+            return f"[联网搜索出错: {str(e)}]"
+
+        return SearchTool.parse_results(html, optimized_query, max_results)
+
+    @staticmethod
+    @traced("search.parse_html")
+    def parse_results(html, optimized_query, max_results=5):
+        """从 Bing 结果页 HTML 中提取精选答案与常规结果"""
+        results_text = f"【联网搜索结果 (关键词: {optimized_query})】:\n"
+        
+        try:
+            soup = BeautifulSoup(html, 'html.parser')
             count = 0
             
             # 策略 A: 精选答案
@@ -0,0 +1,171 @@
+import time
+import threading
+from collections import deque
+from prompt_budget import PromptBudgeter
+
+def normalize_usage(usage, payload=None, content="", reasoning_text_tokens=0):
+    """
+    统一 usage 字段：prompt / completion / reasoning / total
+    接口未返回 usage 时（部分流式响应）按本地估算补齐，并标记 estimated
+    """
+    usage = usage or {}
+    details = usage.get("completion_tokens_details") or {}
+    prompt = usage.get("prompt_tokens")
+    completion = usage.get("completion_tokens")
+    reasoning = details.get("reasoning_tokens", usage.get("reasoning_tokens"))
+    estimated = prompt is None or completion is None
+    if prompt is None:
+        prompt = 0
+        for msg in (payload or {}).get("messages", []):
+            content_part = msg.get("content")
+            if isinstance(content_part, list):
+                prompt += sum(PromptBudgeter.estimate_tokens(p.get("text", "")) for p in content_part
+                              if p.get("type") == "text")
+            else:
+                prompt += PromptBudgeter.estimate_tokens(content_part or "")
+    if completion is None:
+        completion = PromptBudgeter.estimate_tokens(content) + reasoning_text_tokens
+    if reasoning is None:
+        reasoning = reasoning_text_tokens
+    return {
+        "prompt_tokens": int(prompt),
+        "completion_tokens": int(completion),
+        "reasoning_tokens": int(reasoning or 0),
+        "total_tokens": int(usage.get("total_tokens") or prompt + completion),
+        "estimated": estimated
+    }
+
+
+class Telemetry:
+    """
+    每次模型调用的用量与延迟记录：Token（输入/输出/推理）、首字节时间、总耗时、重试次数、请求体大小
+    进程内保留最近 MAX_RECORDS 条，可按标签（如轮次 run、角色 role）筛选汇总
+    """
+    MAX_RECORDS = 2000
+    SUM_FIELDS = ("prompt_tokens", "completion_tokens", "reasoning_tokens", "total_tokens")
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=self.MAX_RECORDS)
+        self._listeners = []
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def add_listener(self, callback):
+        """每条新记录都会回调 callback(record)，在调用所在线程执行"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def record(self, model, metrics, labels=None):
+        entry = dict(metrics)
+        entry["model"] = model
+        entry["timestamp"] = time.time()
+        entry.update(labels or {})
+        with self._lock:
+            self._records.append(entry)
+            listeners = list(self._listeners)
+        for cb in listeners:
+            try:
+                cb(entry)
+            except Exception as e:
+                print(f"遥测回调执行失败: {e}")
+        return entry
+
+    def records(self, **labels):
+        """返回与所有给定标签相匹配的记录，例如 records(run=3, role="judge")"""
+        with self._lock:
+            items = list(self._records)
+        return [r for r in items if all(r.get(k) == v for k, v in labels.items())]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    @staticmethod
+    def aggregate(records):
+        """汇总若干条记录：Token 求和，延迟取平均 / 最大值"""
+        total = {f: 0 for f in Telemetry.SUM_FIELDS}
+        total.update({"calls": 0, "errors": 0, "cached": 0, "cached_tokens": 0, "retries": 0, "payload_bytes": 0,
+                      "estimated": False})
+        ttfbs, latencies = [], []
+        for r in records:
+            total["calls"] += 1
+            total["errors"] += 1 if r.get("error") else 0
+            total["cached"] += 1 if r.get("cached") else 0
+            total["cached_tokens"] += (r.get("cached_usage") or {}).get("total_tokens", 0)
+            total["retries"] += r.get("retries", 0)
+            total["payload_bytes"] += r.get("payload_bytes", 0)
+            total["estimated"] = total["estimated"] or bool(r.get("usage", {}).get("estimated"))
+            for f in Telemetry.SUM_FIELDS:
+                total[f] += r.get("usage", {}).get(f, 0)
+            if r.get("ttfb") is not None:
+                ttfbs.append(r["ttfb"])
+            if r.get("latency") is not None:
+                latencies.append(r["latency"])
+        total["avg_ttfb"] = sum(ttfbs) / len(ttfbs) if ttfbs else None
+        total["avg_latency"] = sum(latencies) / len(latencies) if latencies else None
+        total["max_latency"] = max(latencies) if latencies else None
+        return total
+
+    def summary(self, **labels):
+        """按模型分组的汇总 + 总计：{"models": {model: {...}}, "total": {...}}"""
+        records = self.records(**labels)
+        by_model = {}
+        for r in records:
+            by_model.setdefault(r["model"], []).append(r)
+        return {
+            "models": {m: self.aggregate(rs) for m, rs in by_model.items()},
+            "total": self.aggregate(records)
+        }
+
+    @staticmethod
+    def format_metrics(metrics):
+        """单次调用的一行摘要，用于界面显示"""
+        usage = metrics.get("usage", {})
+        mark = "≈" if usage.get("estimated") else ""
+        parts = [f"输入 {mark}{usage.get('prompt_tokens', 0)} / 输出 {mark}{usage.get('completion_tokens', 0)} tokens"]
+        if usage.get("reasoning_tokens"):
+            parts[0] += f" (推理 {usage['reasoning_tokens']})"
+        if metrics.get("cached"):
+            saved = (metrics.get("cached_usage") or {}).get("total_tokens")
+            parts.append(f"命中缓存（原始用量 {saved} tokens，未计入）" if saved else "命中缓存")
+        else:
+            if metrics.get("ttfb") is not None:
+                parts.append(f"首字节 {metrics['ttfb']:.2f}s")
+            if metrics.get("latency") is not None:
+                parts.append(f"总耗时 {metrics['latency']:.2f}s")
+            if metrics.get("retries"):
+                parts.append(f"重试 {metrics['retries']} 次")
+            if metrics.get("hedged"):
+                parts.append("已对冲")
+        parts.append(f"请求体 {metrics.get('payload_bytes', 0) / 1024:.1f} KB")
+        return " · ".join(parts)
+
+    @staticmethod
+    def format_summary(summary):
+        """整轮汇总的多行文本"""
+        lines = []
+        for model, agg in summary["models"].items():
+            latency = f"{agg['max_latency']:.2f}s" if agg["max_latency"] is not None else "-"
+            lines.append(f"  - {model.split('/')[-1]}: {agg['calls']} 次调用，"
+                         f"输入 {agg['prompt_tokens']} / 输出 {agg['completion_tokens']} tokens，最长耗时 {latency}")
+        t = summary["total"]
+        lines.append(f"  合计: {t['calls']} 次调用，{t['total_tokens']} tokens"
+                     f"{'（含估算）' if t['estimated'] else ''}，重试 {t['retries']} 次，"
+                     f"请求体 {t['payload_bytes'] / 1024:.1f} KB")
+        if t["cached"]:
+            lines.append(f"  缓存命中 {t['cached']} 次，节省约 {t['cached_tokens']} tokens（未计入合计）")
+        return "\n".join(lines)
@@ -0,0 +1,55 @@
+"""
+推理块拆分的回归测试：split_think 与 ThinkStreamSplitter 对同一段输出必须给出相同的正文
+
+    python -m unittest test_reasoning
+"""
+import unittest
+from reasoning import split_think, ThinkStreamSplitter
+
+
+def stream_split(text, reasoning_model=False, size=3):
+    """按 size 个字符一段喂给流式拆分器，返回 (显示的正文, 推理内容)"""
+    splitter = ThinkStreamSplitter(reasoning_model)
+    shown = [splitter.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    shown.append(splitter.flush())
+    return "".join(shown), "".join(splitter.reasoning).strip()
+
+
+class SplitThinkTest(unittest.TestCase):
+    CASES = [
+        # (说明, 原始输出, 是否推理模型, 正文, 推理)
+        ("普通回答", "答案是 42。", False, "答案是 42。", ""),
+        ("开头的完整推理块", "<think>先算一下</think>\n\n答案是 42。", False, "答案是 42。", "先算一下"),
+        ("被截断的推理块", "  <think>还在想", False, "", "还在想"),
+        ("开头的闭标签", "</think>\n答案是 42。", False, "答案是 42。", ""),
+        ("正文中提到闭标签", "DeepSeek 用 </think> 结束推理。", False,
+         "DeepSeek 用 </think> 结束推理。", ""),
+        ("推理模型省略开标签", "先算一下\n</think>\n\n答案是 42。", True, "答案是 42。", "先算一下"),
+        ("推理模型但闭标签前有开标签", "讲解 <think> 与 </think> 两个标签", True,
+         "讲解 <think> 与 </think> 两个标签", ""),
+        ("推理模型但没有闭标签", "答案是 42。", True, "答案是 42。", ""),
+    ]
+
+    def test_split_think(self):
+        for name, text, reasoning_model, content, reasoning in self.CASES:
+            with self.subTest(name):
+                self.assertEqual(split_think(text, reasoning_model), (content, reasoning))
+
+    def test_stream_matches_split_think(self):
+        for name, text, reasoning_model, content, reasoning in self.CASES:
+            for size in (1, 2, 3, 7, len(text)):
+                with self.subTest(name, size=size):
+                    self.assertEqual(stream_split(text, reasoning_model, size), (content, reasoning))
+
+    def test_mark_reasoning_model_only_before_content(self):
+        splitter = ThinkStreamSplitter()
+        splitter.mark_reasoning_model()
+        self.assertTrue(splitter.reasoning_model)
+        splitter = ThinkStreamSplitter()
+        splitter.feed("答案")
+        splitter.mark_reasoning_model()
+        self.assertFalse(splitter.reasoning_model)
+
+
+if __name__ == "__main__":
+    unittest.main()
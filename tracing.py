@@ -0,0 +1,178 @@
+import os
+import json
+import functools
+import time
+import itertools
+import threading
+from collections import deque
+
+class _NoopSpan:
+    """追踪关闭时的空 Span，开销仅一次属性判断"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """一段计时区间；with 结束时记入 Tracer。可在区间内用 set() 追加属性"""
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "tid", "start_us", "dur_us")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(Tracer._ids)
+        self.parent_id = None
+        self.tid = threading.get_ident()
+        self.start_us = 0
+        self.dur_us = 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = Tracer._stack()
+        self.parent_id = stack[-1].span_id if stack else None
+        stack.append(self)
+        self.start_us = Tracer.now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.dur_us = Tracer.now_us() - self.start_us
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        stack = Tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        Tracer._finish(self)
+        return False
+
+
+class Tracer:
+    """
+    轻量级分阶段追踪：搜索、文档解析、图片编码、请求发送、响应解析、裁判等各记一个 Span
+    同一线程内自动嵌套（parent_id）；关闭时 span() 返回空对象，几乎无开销
+    export_chrome() 写出 Chrome Trace JSON，可直接拖入 Perfetto / chrome://tracing 查看
+    """
+    MAX_SPANS = 20000
+    _lock = threading.Lock()
+    _enabled = False
+    _spans = deque(maxlen=MAX_SPANS)
+    _thread_names = {}
+    _local = threading.local()
+    _ids = itertools.count(1)
+    _origin = time.perf_counter_ns()
+
+    @classmethod
+    def configure(cls, enabled):
+        with cls._lock:
+            cls._enabled = bool(enabled)
+
+    @classmethod
+    def is_enabled(cls):
+        return cls._enabled
+
+    @classmethod
+    def now_us(cls):
+        return (time.perf_counter_ns() - cls._origin) // 1000
+
+    @classmethod
+    def _stack(cls):
+        stack = getattr(cls._local, "stack", None)
+        if stack is None:
+            stack = cls._local.stack = []
+        return stack
+
+    @classmethod
+    def span(cls, name, **attrs):
+        """用法: with Tracer.span("llm.send", model=...) as sp: ..."""
+        if not cls._enabled:
+            return _NOOP
+        return Span(name, attrs)
+
+    @classmethod
+    def annotate(cls, **attrs):
+        """给当前线程最内层的 Span 追加属性（未开启追踪时忽略）"""
+        if cls._enabled:
+            stack = cls._stack()
+            if stack:
+                stack[-1].attrs.update(attrs)
+
+    @classmethod
+    def record(cls, name, start_us, end_us=None, **attrs):
+        """直接记入一段跨回调的区间（例如整轮运行），不参与线程内嵌套"""
+        if not cls._enabled:
+            return
+        span = Span(name, attrs)
+        span.start_us = start_us
+        span.dur_us = (cls.now_us() if end_us is None else end_us) - start_us
+        cls._finish(span)
+
+    @classmethod
+    def _finish(cls, span):
+        with cls._lock:
+            cls._spans.append(span)
+            if span.tid not in cls._thread_names:
+                cls._thread_names[span.tid] = threading.current_thread().name
+
+    @classmethod
+    def spans(cls, since_us=0):
+        with cls._lock:
+            return [s for s in cls._spans if s.start_us >= since_us]
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._spans.clear()
+
+    @classmethod
+    def to_chrome_events(cls, spans):
+        """转换为 Chrome Trace Event 格式（完整事件 ph=X，时间单位微秒）"""
+        pid = os.getpid()
+        events = []
+        with cls._lock:
+            names = dict(cls._thread_names)
+        for tid in sorted({s.tid for s in spans}):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": names.get(tid, str(tid))}})
+        for s in sorted(spans, key=lambda s: s.start_us):
+            args = {k: (v if isinstance(v, (int, float, bool, str)) or v is None else str(v))
+                    for k, v in s.attrs.items()}
+            args["span_id"] = s.span_id
+            if s.parent_id is not None:
+                args["parent_id"] = s.parent_id
+            events.append({"name": s.name, "cat": s.name.split(".")[0], "ph": "X",
+                           "ts": s.start_us, "dur": s.dur_us, "pid": pid, "tid": s.tid, "args": args})
+        return events
+
+    @classmethod
+    def export_chrome(cls, path, since_us=0, metadata=None):
+        """写出 since_us 之后开始的所有 Span；返回写出的 Span 数"""
+        spans = cls.spans(since_us)
+        data = {"traceEvents": cls.to_chrome_events(spans), "displayTimeUnit": "ms",
+                "otherData": metadata or {}}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return len(spans)
+
+
+def traced(name):
+    """装饰器：函数每次调用记一个 Span；放在 @staticmethod 之下使用"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not Tracer._enabled:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,62 +1,105 @@
-from PyQt6.QtCore import QThread, pyqtSignal
-from llm_client import LLMClient
-from search_tool import SearchTool
+from PyQt6.QtCore import QObject, pyqtSignal
+from arena_engine import ArenaEngine
+from cancel_token import CancelToken
+from executor import TaskExecutor
+from tracing import Tracer, traced
+from judge_prompt import JudgePrompt
+
+class PooledWorker(QObject):
+    """
+    在共享有界线程池 (TaskExecutor) 中运行的任务，替代每个任务一个 QThread
+    保留 start()/stop()/isRunning() 接口；信号从池线程发射，由 Qt 排队投递到界面线程
+    """
+    PRIORITY = TaskExecutor.PRIORITY_NORMAL
+
+    def __init__(self, priority=None):
+        super().__init__()
+        self.priority = self.PRIORITY if priority is None else priority
+        self._handle = None
+        self._is_cancelled = False
+        self.cancel_token = CancelToken()
+
+    def start(self):
+        self._handle = TaskExecutor.shared().submit(self.run, priority=self.priority)
+
+    def isRunning(self):
+        return self._handle is not None and not self._handle.done()
+
+    def wait(self, timeout=None):
+        return self._handle.wait(timeout) if self._handle else True
 
-class SearchWorker(QThread):
-    """【新增】独立的搜索线程，防止界面卡死"""
+    def run(self):
+        """在池线程中执行的任务体，由子类覆盖；基类不做任何事"""
+        pass
+
+    def stop(self):
+        self._is_cancelled = True
+        if self._handle:
+            self._handle.cancel()  # 尚在排队则直接出队
+        self.cancel_token.cancel()
+
+class SearchWorker(PooledWorker):
+    """【新增】独立的搜索任务，防止界面卡死"""
     finished_signal = pyqtSignal(str)
+    PRIORITY = TaskExecutor.PRIORITY_HIGH
     
-    def __init__(self, query, max_results, cookie):
-        super().__init__()
+    def __init__(self, query, max_results, cookie, priority=None):
+        super().__init__(priority)
         self.query = query
         self.max_results = max_results
         self.cookie = cookie
-        self._is_cancelled = False
 
+    @traced("phase.search")
     def run(self):
         if self._is_cancelled: return
         try:
-            result = SearchTool.search(self.query, self.max_results, self.cookie)
+            engine = ArenaEngine(search_results=self.max_results, cookie=self.cookie)
+            result = engine.search(self.query, cancel_token=self.cancel_token)
             if not self._is_cancelled:
                 self.finished_signal.emit(result)
         except Exception as e:
             if not self._is_cancelled:
                 self.finished_signal.emit(f"[搜索出错] {str(e)}")
 
-    def stop(self):
-        self._is_cancelled = True
-
-class ArenaWorker(QThread):
-    """参赛选手线程"""
+class ArenaWorker(PooledWorker):
+    """参赛选手任务"""
     finished_signal = pyqtSignal(str, str, dict) 
+    delta_signal = pyqtSignal(str, str)  # (模型名, 增量文本)，仅流式模式发射
 
-    def __init__(self, api_key, model_config, user_prompt, file_paths=None, vision_models=None): 
-        super().__init__()
+    def __init__(self, api_key, model_config, user_prompt, file_paths=None, vision_models=None, stream=False,
+                 use_cache=True, key_scheduler=None, search_context="", priority=None, labels=None): 
+        super().__init__(priority)
         self.api_key = api_key
         self.model_config = model_config.copy()
         self.original_name = self.model_config.pop('name') 
         self.user_prompt = user_prompt
+        self.search_context = search_context
         self.file_paths = file_paths or []
         self.vision_models = vision_models or []
-        self._is_cancelled = False
+        self.stream = stream
+        self.use_cache = use_cache
+        self.key_scheduler = key_scheduler
+        self.labels = dict(labels or {}, role="contestant")
 
+    def _emit_delta(self, text):
+        if not self._is_cancelled:
+            self.delta_signal.emit(self.original_name, text)
+
+    @traced("phase.contestant")
     def run(self):
         if self._is_cancelled: return
-
-        messages = [{"role": "user", "content": self.user_prompt}]
-        
-        effective_name = self.model_config.get("custom_model_name")
-        if not effective_name:
-            effective_name = self.original_name
+        Tracer.annotate(model=self.original_name)
 
         # 调用 API
-        response = LLMClient.chat_completion(
-            self.api_key, 
-            effective_name, 
-            messages, 
-            file_paths=self.file_paths,
-            vision_models=self.vision_models,
-            **self.model_config 
+        engine = ArenaEngine(self.api_key, self.key_scheduler, self.vision_models, self.stream, self.use_cache)
+        response = engine.contestant(
+            dict(self.model_config, name=self.original_name),
+            self.user_prompt,
+            attachments=self.file_paths,
+            search_context=self.search_context,
+            on_delta=self._emit_delta,
+            cancel_token=self.cancel_token,
+            labels=self.labels
         )
         
         if self._is_cancelled: return
@@ -71,66 +114,54 @@ class ArenaWorker(QThread):
             
         self.finished_signal.emit(self.original_name, final_content, response)
 
-    def stop(self):
-        self._is_cancelled = True
-        # requests 是阻塞的，简单的 stop 无法中断 socket
-        # 但设置 flag 后，下载回来不会发射信号
-
-class JudgeWorker(QThread):
-    """裁判线程"""
+class JudgeWorker(PooledWorker):
+    """裁判任务"""
     # 【修改点 1】信号类型改为 str，直接传输文本，不再传输字典
     result_signal = pyqtSignal(str) 
-
-    def __init__(self, api_key, judge_model, judge_system_prompt, user_prompt, model_results):
-        super().__init__()
+    delta_signal = pyqtSignal(str)  # 流式模式下的增量文本
+    report_signal = pyqtSignal(list)  # 裁判输入的压缩与淘汰赛分组说明
+    agreement_signal = pyqtSignal(dict)  # 各回答的一致度与采取的裁判方式
+    PRIORITY = TaskExecutor.PRIORITY_JUDGE
+
+    def __init__(self, api_key, judge_model, judge_system_prompt, user_prompt, model_results, stream=False,
+                 use_cache=True, key_scheduler=None, priority=None, labels=None):
+        super().__init__(priority)
         self.api_key = api_key
         self.judge_model = judge_model
         self.judge_system_prompt = judge_system_prompt
         self.user_prompt = user_prompt
         self.model_results = model_results
-        self.judge_params = {"temperature": 0.2, "max_tokens": 4096} # 稍微调大token，因为不再是紧凑的json
-        self._is_cancelled = False
+        self.judge_params = dict(JudgePrompt.DEFAULT_PARAMS)
+        self.stream = stream
+        self.use_cache = use_cache
+        self.key_scheduler = key_scheduler
+        self.labels = dict(labels or {}, role="judge")
 
+    def _emit_delta(self, text):
+        if not self._is_cancelled:
+            self.delta_signal.emit(text)
+
+    @traced("phase.judge")
     def run(self):
         if self._is_cancelled: return
-
-        contestant_text = ""
-        # 限制长度防止上下文爆炸
-        MAX_CHAR_PER_MODEL = 6000 
-        
-        for name, text in self.model_results.items():
-            if len(text) > MAX_CHAR_PER_MODEL:
-                display_text = text[:MAX_CHAR_PER_MODEL] + "\n...(已截断)..."
-            else:
-                display_text = text
-            contestant_text += f"\n=== 模型 [{name}] 的回答 ===\n{display_text}\n"
-
-        final_user_content = (
-            f"用户原始问题：\n{self.user_prompt}\n\n"
-            f"以下是各参赛模型的回答，请根据 System Prompt 的要求进行评审、对比优缺点，并给出一个最佳的融合答案：\n"
-            f"{contestant_text}"
-        )
-
-        # 【修改点 2】删除了 json_instruction 变量，不再强制 JSON 格式
-        
-        messages = [
-            {"role": "system", "content": self.judge_system_prompt},
-            {"role": "user", "content": final_user_content}
-        ]
-
-        effective_name = self.judge_params.get("custom_model_name")
-        if not effective_name:
-            effective_name = self.judge_model
-
-        response = LLMClient.chat_completion(
-            self.api_key, 
-            effective_name,
-            messages, 
-            file_paths=None, 
-            **self.judge_params 
+        Tracer.annotate(model=self.judge_model, contestants=len(self.model_results))
+
+        engine = ArenaEngine(self.api_key, self.key_scheduler, stream=self.stream, use_cache=self.use_cache,
+                             judge_prompt=self.judge_system_prompt, judge_params=self.judge_params)
+        response = engine.judge(
+            self.judge_model,
+            self.user_prompt,
+            self.model_results,
+            on_delta=self._emit_delta,
+            cancel_token=self.cancel_token,
+            labels=self.labels
         )
         
         if self._is_cancelled: return
+        if response.get("judge_input_report"):
+            self.report_signal.emit(response["judge_input_report"])
+        if response.get("agreement"):
+            self.agreement_signal.emit(response["agreement"])
 
         # 【修改点 3】不再解析 JSON，直接获取 content 文本
         if "error" in response:
@@ -140,7 +171,4 @@ class JudgeWorker(QThread):
             raw_content = response.get("content", "[裁判未返回任何内容]")
             self.result_signal.emit(raw_content)
 
-    # extract_json 方法已删除
-
-    def stop(self):
-        self._is_cancelled = True
\ No newline at end of file
+    # extract_json 方法已删除
\ No newline at end of file